@@ -2,10 +2,11 @@
 Flask Web Application for Trip Finance Tracker
 """
 
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, send_file
 from flask_cors import CORS
 import json
 import os
+import zlib
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -14,11 +15,19 @@ load_dotenv()
 from models.trip import Trip
 from models.expense import Expense
 from models.traveler import Traveler
+from models import codec
 from services.expense_service import ExpenseService
+from services.debt_ledger import normalize_split
+from services.expense_import import read_csv_rows, parse_expenses
 from services.report_service import ReportService
+from services.trip_registry import TripRegistry
 from utils.currency_converter import CurrencyConverter
 from utils.trip_logger import TripLogger
 from utils.database import get_database
+from utils.artifact_cache import ArtifactCache
+from utils.export_jobs import ExportJobQueue, ExportQueueFull
+from utils.response_cache import ResponseCache
+from utils.write_behind import WriteBehindQueue
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-this-in-production')
@@ -29,17 +38,102 @@ if os.environ.get('VERCEL'):
     app.config['SESSION_TYPE'] = 'filesystem'
 
 # Global instances
-expense_service = ExpenseService()
-report_service = ReportService()
 currency_converter = CurrencyConverter()
+report_service = ReportService(converter=currency_converter)
 trip_logger = TripLogger()
 db = get_database()
 
+# Rendered report JSON, reused until the trip (or the exchange rates) change
+report_cache = ResponseCache()
+
+# Coalesces rapid mutations of a trip into one database write
+persistence = WriteBehindQueue(db)
+
 # Data directory - use /tmp for Vercel serverless
 DATA_DIR = '/tmp/data' if os.environ.get('VERCEL') else 'data'
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
+# Export files per trip content version, shared by the streaming routes and the job queue
+artifact_cache = ArtifactCache(os.path.join(DATA_DIR, 'exports', 'artifacts'))
+
+# Exports run off the request path on a bounded pool; files are kept for download by job id
+export_jobs = ExportJobQueue(os.path.join(DATA_DIR, 'exports'), artifact_cache)
+
+
+def load_trip_service(trip_id):
+    """Rehydrate a trip from the database, falling back to the file system
+    
+    Changes that could not be written yet are applied on top, so a failed flush never
+    loses them to the stale copy in the database.
+    """
+    # Don't read back a trip whose latest changes are still queued
+    persistence.flush(trip_id)
+    trip_data = db.load_trip(trip_id)
+    if not trip_data:
+        filename = f"{DATA_DIR}/{trip_id}.json"
+        if os.path.exists(filename):
+            with open(filename, 'r') as f:
+                data = codec.loads(f.read())
+            if data.get('trip'):
+                trip_data = dict(data['trip'], expenses=data.get('expenses', []))
+    
+    unsaved = persistence.unsaved_changes(trip_id)
+    if unsaved is not None:
+        trip_data = unsaved.apply(trip_data)
+    if not trip_data:
+        return None
+    
+    service = ExpenseService()
+    service.set_trip(Trip.from_dict(trip_data))
+    service.expenses = codec.decode_expenses(trip_data.get('expenses', []))
+    return service
+
+
+# Live trips shared by all requests handled by this worker
+trip_registry = TripRegistry(loader=load_trip_service)
+
+
+def json_response(body, status=200):
+    """Send JSON that was already encoded by models.codec"""
+    return app.response_class(body, status=status, mimetype='application/json')
+
+
+def conditional_response(etag, render):
+    """Answer 304 when the client already has this version, else the JSON from render()"""
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = json_response(render())
+    response.set_etag(etag)
+    # Let browsers keep the body but revalidate it on every poll
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def cached_report(expense_service, report, build):
+    """Answer with a report rendered at most once per trip version and exchange-rate revision"""
+    # Reports only use the rates at hand; missing or stale ones are fetched in the background
+    currency_converter.refresh_if_stale()
+    revision = currency_converter.revision
+    etag = f"{expense_service.etag}-{revision}"
+    
+    def render():
+        body = report_cache.get(expense_service.trip.id, report, etag)
+        if body is None:
+            body = codec.dumps(build())
+            if currency_converter.revision == revision:
+                # Rates that landed mid-build would leave the body keyed by the wrong revision
+                report_cache.put(expense_service.trip.id, report, etag, body)
+        return body
+    
+    return conditional_response(etag, render)
+
+
+def get_current_service():
+    """Get the ExpenseService for the trip in the user's session"""
+    return trip_registry.get(session.get('current_trip_id'))
+
 
 @app.route('/')
 def index():
@@ -53,8 +147,16 @@ def get_status():
     return jsonify({
         'success': True,
         'database_enabled': db.enabled,
-        'database_type': 'Supabase' if db.enabled else 'None (fallback mode)',
-        'message': 'Database connected' if db.enabled else 'Running in fallback mode - data will not persist across sessions'
+        'database_type': db.name if db.enabled else 'None (fallback mode)',
+        'message': 'Database connected' if db.enabled else 'Running in fallback mode - data will not persist across sessions',
+        'database_stats': db.stats() if db.enabled else None,
+        'trip_registry': trip_registry.stats(),
+        'persistence': persistence.stats(),
+        'export_jobs': export_jobs.stats(),
+        'export_cache': artifact_cache.stats(),
+        'report_cache': report_cache.stats(),
+        'activity_log': trip_logger.stats(),
+        'exchange_rates': currency_converter.stats()
     })
 
 
@@ -71,15 +173,14 @@ def create_trip():
             currency=data['currency']
         )
         
-        # Clear old trip data for fresh start
-        expense_service.expenses = []
+        # Register a fresh service for the new trip
+        expense_service = ExpenseService()
         expense_service.set_trip(trip)
+        trip_registry.put(expense_service)
         session['current_trip_id'] = trip.id
         
-        # Auto-save to database immediately
-        trip_data = trip.to_dict()
-        expenses_data = []
-        db.save_trip(trip_data, expenses_data)
+        # Auto-save to database
+        persistence.save_trip(trip.to_dict())
         
         # Log trip creation
         trip_logger.log_trip_created(trip.to_dict())
@@ -95,26 +196,13 @@ def create_trip():
 @app.route('/api/trip', methods=['GET'])
 def get_trip():
     """Get current trip"""
-    # First check memory
-    if expense_service.trip:
+    expense_service = get_current_service()
+    if expense_service:
         return jsonify({
             'success': True,
             'trip': expense_service.trip.to_dict()
         })
     
-    # Try to load from database if we have a session trip_id
-    trip_id = session.get('current_trip_id')
-    if trip_id:
-        trip_data = db.load_trip(trip_id)
-        if trip_data:
-            trip = Trip.from_dict(trip_data)
-            expense_service.set_trip(trip)
-            expense_service.expenses = [Expense.from_dict(exp) for exp in trip_data.get('expenses', [])]
-            return jsonify({
-                'success': True,
-                'trip': trip.to_dict()
-            })
-    
     return jsonify({'success': False, 'error': 'No active trip'}), 404
 
 
@@ -122,18 +210,9 @@ def get_trip():
 def add_traveler():
     """Add a traveler to the trip"""
     try:
-        # For serverless, load trip from database if not in memory
-        if not expense_service.trip:
-            trip_id = session.get('current_trip_id')
-            if trip_id:
-                trip_data = db.load_trip(trip_id)
-                if trip_data:
-                    trip = Trip.from_dict(trip_data)
-                    expense_service.set_trip(trip)
-                    expense_service.expenses = [Expense.from_dict(exp) for exp in trip_data.get('expenses', [])]
-            
-            if not expense_service.trip:
-                return jsonify({'success': False, 'error': 'No active trip. Please create a trip first.'}), 400
+        expense_service = get_current_service()
+        if not expense_service:
+            return jsonify({'success': False, 'error': 'No active trip. Please create a trip first.'}), 400
         
         data = request.json
         traveler = Traveler(
@@ -141,12 +220,11 @@ def add_traveler():
             email=data.get('email', '')
         )
         
-        expense_service.trip.add_traveler(traveler)
+        expense_service.add_traveler(traveler)
+        trip_registry.touch(expense_service.trip.id)
         
-        # Auto-save to database
-        trip_data = expense_service.trip.to_dict()
-        expenses_data = [exp.to_dict() for exp in expense_service.expenses]
-        db.save_trip(trip_data, expenses_data)
+        # Auto-save trip details to database, expenses are stored separately
+        persistence.save_trip(expense_service.trip.to_dict())
         
         # Log traveler addition
         trip_logger.log_traveler_added(expense_service.trip.id, traveler.to_dict())
@@ -162,18 +240,8 @@ def add_traveler():
 @app.route('/api/travelers', methods=['GET'])
 def get_travelers():
     """Get all travelers"""
-    # Load trip from database if not in memory
-    if not expense_service.trip:
-        trip_id = session.get('current_trip_id')
-        if trip_id:
-            trip_data = db.load_trip(trip_id)
-            if trip_data:
-
-                trip = Trip.from_dict(trip_data)
-                expense_service.set_trip(trip)
-                expense_service.expenses = [Expense.from_dict(exp) for exp in trip_data.get('expenses', [])]
-    
-    if not expense_service.trip:
+    expense_service = get_current_service()
+    if not expense_service:
         return jsonify({'success': False, 'error': 'No active trip'}), 400
     
     return jsonify({
@@ -186,34 +254,29 @@ def get_travelers():
 def add_expense():
     """Add a new expense"""
     try:
-        # Load trip from database if not in memory
-        if not expense_service.trip:
-            trip_id = session.get('current_trip_id')
-            if trip_id:
-                trip_data = db.load_trip(trip_id)
-                if trip_data:
-                    trip = Trip.from_dict(trip_data)
-                    expense_service.set_trip(trip)
-                    expense_service.expenses = [Expense.from_dict(exp) for exp in trip_data.get('expenses', [])]
-        
-        if not expense_service.trip:
+        expense_service = get_current_service()
+        if not expense_service:
             return jsonify({'success': False, 'error': 'No active trip'}), 400
         
         data = request.json
+        split_with = data.get('split_with') or []
+        # Reject malformed splits up front: a list of names or a {name: share} mapping
+        normalize_split(split_with)
+        
         expense = Expense(
             description=data['description'],
             amount=float(data['amount']),
             currency=data.get('currency', expense_service.trip.currency),
             category=data['category'],
-            paid_by=data['paid_by']
+            paid_by=data['paid_by'],
+            split_with=split_with
         )
         
         expense_service.add_expense(expense)
+        trip_registry.touch(expense_service.trip.id)
         
-        # Auto-save to database
-        trip_data = expense_service.trip.to_dict()
-        expenses_data = [exp.to_dict() for exp in expense_service.expenses]
-        db.save_trip(trip_data, expenses_data)
+        # Auto-save just the new expense row to database
+        persistence.add_expense(expense_service.trip.id, expense.to_dict())
         
         # Log expense addition
         trip_logger.log_expense_added(expense_service.trip.id, expense.to_dict())
@@ -226,104 +289,152 @@ def add_expense():
         return jsonify({'success': False, 'error': str(e)}), 400
 
 
-@app.route('/api/expenses', methods=['GET'])
-def get_expenses():
-    """Get all expenses"""
-    # Load trip from database if not in memory
-    if not expense_service.trip:
-        trip_id = session.get('current_trip_id')
-        if trip_id:
-            trip_data = db.load_trip(trip_id)
-            if trip_data:
-
-                trip = Trip.from_dict(trip_data)
-                expense_service.set_trip(trip)
-                expense_service.expenses = [Expense.from_dict(exp) for exp in trip_data.get('expenses', [])]
-    
-    expenses = expense_service.get_all_expenses()
+MAX_BULK_EXPENSES = 10000
+MAX_IMPORT_ERRORS = 100
+
+
+@app.route('/api/trips/<trip_id>/expenses/bulk', methods=['POST'])
+def add_expenses_bulk(trip_id):
+    """Add many expenses from a JSON array or a CSV upload; nothing is added unless every row is valid"""
+    expense_service = trip_registry.get(trip_id)
+    if not expense_service:
+        return jsonify({'success': False, 'error': 'Trip not found'}), 404
+    
+    try:
+        upload = request.files.get('file')
+        if upload is not None:
+            source = 'csv'
+            rows = read_csv_rows(upload.read().decode('utf-8-sig'))
+        elif request.mimetype == 'text/csv':
+            source = 'csv'
+            rows = read_csv_rows(request.get_data(as_text=True))
+        else:
+            source = 'json'
+            data = request.get_json(silent=True)
+            rows = data.get('expenses') if isinstance(data, dict) else data
+            if not isinstance(rows, list):
+                raise ValueError('Send a JSON array of expenses or a CSV file')
+        
+        expenses, errors = parse_expenses(rows, expense_service.trip.currency, MAX_BULK_EXPENSES)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    if errors:
+        return jsonify({
+            'success': False,
+            'error': f'{len(errors)} invalid rows, no expenses were added',
+            'errors': errors[:MAX_IMPORT_ERRORS]
+        }), 400
+    if not expenses:
+        return jsonify({'success': False, 'error': 'No expenses to add'}), 400
+    
+    # One mutation, one database write and one log entry for the whole batch
+    expense_service.add_expenses(expenses)
+    trip_registry.touch(trip_id)
+    expenses_data = [expense.to_dict() for expense in expenses]
+    persistence.add_expenses(trip_id, expenses_data)
+    trip_logger.log_expenses_imported(trip_id, expenses_data, source)
+    
     return jsonify({
         'success': True,
-        'expenses': [exp.to_dict() for exp in expenses]
+        'count': len(expenses),
+        'expense_ids': [expense['id'] for expense in expenses_data]
     })
 
 
+EXPENSE_FILTERS = ('category', 'paid_by', 'currency', 'date_from', 'date_to')
+AMOUNT_FILTERS = ('min_amount', 'max_amount')
+MAX_PAGE_SIZE = 500
+
+
+@app.route('/api/expenses', methods=['GET'])
+def get_expenses():
+    """Get expenses, optionally filtered and a page at a time (?limit=&cursor=)"""
+    expense_service = get_current_service()
+    args = request.args
+    paged = any(name in args for name in ('limit', 'cursor') + EXPENSE_FILTERS + AMOUNT_FILTERS)
+    if not paged:
+        if not expense_service:
+            return json_response('{"success":true,"expenses":[]}')
+        return conditional_response(expense_service.etag, lambda: (
+            '{"success":true,"expenses":' + codec.encode_expenses(expense_service.get_all_expenses()) + '}'))
+    
+    try:
+        filters = {name: args[name] for name in EXPENSE_FILTERS if args.get(name)}
+        for name in AMOUNT_FILTERS:
+            if args.get(name):
+                filters[name] = float(args[name])
+        limit = min(int(args['limit']), MAX_PAGE_SIZE) if args.get('limit') else None
+        if limit is not None and limit < 1:
+            raise ValueError('limit must be positive')
+        cursor = int(args['cursor']) if args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid query: {e}'}), 400
+    
+    if not expense_service:
+        return json_response('{"success":true,"next_cursor":null,"expenses":[]}')
+    
+    def render():
+        expenses, next_cursor = expense_service.query_expenses(after=cursor, limit=limit, **filters)
+        head = codec.dumps({'success': True, 'next_cursor': next_cursor})
+        return head[:-1] + ',"expenses":' + codec.encode_expenses(expenses) + '}'
+    
+    return conditional_response(expense_service.etag, render)
+
+
 @app.route('/api/expenses/<expense_id>', methods=['DELETE'])
 def delete_expense(expense_id):
     """Delete an expense"""
     try:
-        if expense_service.trip:
+        expense_service = get_current_service()
+        # Nothing to persist or log unless the trip actually had this expense
+        if expense_service and expense_service.delete_expense(expense_id) is not None:
+            trip_registry.touch(expense_service.trip.id)
+            
+            # Auto-delete just this expense row from database
+            persistence.delete_expense(expense_service.trip.id, expense_id)
+            
             trip_logger.log_expense_deleted(expense_service.trip.id, expense_id)
         
-        expense_service.expenses = [
-            exp for exp in expense_service.expenses if exp.id != expense_id
-        ]
-        
-        # Auto-save to database
-        if expense_service.trip:
-            trip_data = expense_service.trip.to_dict()
-            expenses_data = [exp.to_dict() for exp in expense_service.expenses]
-            db.save_trip(trip_data, expenses_data)
-        
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
 
-@app.route('/api/reports/summary', methods=['GET'])
-def get_summary():
-    """Get trip summary"""
-    # Load trip from database if not in memory
-    if not expense_service.trip:
-        trip_id = session.get('current_trip_id')
-        if trip_id:
-            trip_data = db.load_trip(trip_id)
-            if trip_data:
-
-                trip = Trip.from_dict(trip_data)
-                expense_service.set_trip(trip)
-                expense_service.expenses = [Expense.from_dict(exp) for exp in trip_data.get('expenses', [])]
-    
-    if not expense_service.trip:
-        return jsonify({'success': False, 'error': 'No active trip'}), 400
-    
+def summary_report(expense_service):
+    """Get the trip totals, in original currencies and in the trip currency"""
     total = expense_service.get_total_expenses()
     num_expenses = len(expense_service.get_all_expenses())
     
-    # Calculate total in original currencies
-    currency_totals = {}
-    for expense in expense_service.get_all_expenses():
-        if expense.currency not in currency_totals:
-            currency_totals[expense.currency] = 0
-        currency_totals[expense.currency] += expense.amount
+    # Total in original currencies
+    currency_totals = expense_service.get_currency_totals()
+    # Total in the trip currency, at the rates of each expense's date
+    converted_total = currency_converter.convert_dated_totals(
+        expense_service.get_daily_currency_totals(), expense_service.trip.currency)
     
-    return jsonify({
-        'success': True,
-        'summary': {
-            'total_expenses': total,
-            'num_expenses': num_expenses,
-            'average_expense': total / num_expenses if num_expenses > 0 else 0,
-            'currency': expense_service.trip.currency,
-            'currency_breakdown': currency_totals
-        }
-    })
-
-
-@app.route('/api/reports/categories', methods=['GET'])
-def get_category_report():
-    """Get category breakdown"""
+    return {
+        'total_expenses': total,
+        'converted_total': converted_total,
+        'num_expenses': num_expenses,
+        'average_expense': total / num_expenses if num_expenses > 0 else 0,
+        'currency': expense_service.trip.currency,
+        'currency_breakdown': currency_totals
+    }
+
+
+def category_report(expense_service):
+    """Get the category breakdown, largest first"""
     category_totals = expense_service.get_category_totals()
     total = expense_service.get_total_expenses()
     
-    # Get category totals by original currency
-    category_currency_breakdown = {}
-    for expense in expense_service.get_all_expenses():
-        cat = expense.category
-        curr = expense.currency
-        if cat not in category_currency_breakdown:
-            category_currency_breakdown[cat] = {}
-        if curr not in category_currency_breakdown[cat]:
-            category_currency_breakdown[cat][curr] = 0
-        category_currency_breakdown[cat][curr] += expense.amount
+    # Category totals by original currency
+    category_currency_breakdown = expense_service.get_category_currency_totals()
+    
+    # Category totals in the trip currency, at the rates of each expense's date
+    converted_totals = {
+        category: currency_converter.convert_dated_totals(daily_totals, expense_service.trip.currency)
+        for category, daily_totals in expense_service.get_category_daily_currency_totals().items()
+    }
     
     categories = []
     for category, amount in category_totals.items():
@@ -331,26 +442,24 @@ def get_category_report():
         categories.append({
             'category': category,
             'amount': amount,
+            'converted_amount': converted_totals.get(category, 0),
             'percentage': round(percentage, 1),
             'currency_breakdown': category_currency_breakdown.get(category, {})
         })
     
-    return jsonify({
-        'success': True,
-        'categories': sorted(categories, key=lambda x: x['amount'], reverse=True)
-    })
+    return sorted(categories, key=lambda x: x['amount'], reverse=True)
 
 
-@app.route('/api/reports/people', methods=['GET'])
-def get_people_report():
-    """Get per-person summary"""
+def people_report(expense_service):
+    """Get what each person paid, largest first"""
     person_totals = expense_service.get_person_totals()
+    person_counts = expense_service.get_person_counts()
     total = expense_service.get_total_expenses()
     
     people = []
     for person, amount in person_totals.items():
         percentage = (amount / total * 100) if total > 0 else 0
-        num_expenses = len(expense_service.get_expenses_by_person(person))
+        num_expenses = person_counts[person]
         people.append({
             'person': person,
             'amount': amount,
@@ -358,57 +467,155 @@ def get_people_report():
             'percentage': round(percentage, 1)
         })
     
-    return jsonify({
+    return sorted(people, key=lambda x: x['amount'], reverse=True)
+
+
+def split_report(expense_service):
+    """Get balances, pairwise debts and the transfers that settle them"""
+    # Fair shares honor each expense's split_with; unsplit expenses are shared by everyone
+    # Everything is converted to the trip currency at each expense's date
+    person_totals = expense_service.get_paid_totals(currency_converter)
+    fair_shares = expense_service.get_fair_shares(currency_converter)
+    
+    balances = []
+    for person, balance in expense_service.get_balances(currency_converter).items():
+        rounded = round(balance, 2)
+        balances.append({
+            'person': person,
+            'paid': round(person_totals.get(person, 0), 2),
+            'fair_share': round(fair_shares.get(person, 0), 2),
+            'balance': balance,
+            'status': 'owed' if rounded > 0 else 'owes' if rounded < 0 else 'settled'
+        })
+    
+    debts = [
+        {'from': debtor, 'to': creditor, 'amount': round(amount, 2)}
+        for (debtor, creditor), amount in sorted(expense_service.get_debts(currency_converter).items())
+    ]
+    settlement = report_service.settlement(expense_service, expense_service.trip)
+    
+    return {
+        'balances': sorted(balances, key=lambda x: x['balance'], reverse=True),
+        'debts': debts,
+        'transfers': settlement['transfers']
+    }
+
+
+@app.route('/api/reports/summary', methods=['GET'])
+def get_summary():
+    """Get trip summary"""
+    expense_service = get_current_service()
+    if not expense_service:
+        return jsonify({'success': False, 'error': 'No active trip'}), 400
+    
+    return cached_report(expense_service, 'summary', lambda: {
         'success': True,
-        'people': sorted(people, key=lambda x: x['amount'], reverse=True)
+        'summary': summary_report(expense_service)
+    })
+
+
+@app.route('/api/reports/categories', methods=['GET'])
+def get_category_report():
+    """Get category breakdown"""
+    expense_service = get_current_service()
+    if not expense_service:
+        return jsonify({'success': False, 'error': 'No active trip'}), 400
+    
+    return cached_report(expense_service, 'categories', lambda: {
+        'success': True,
+        'categories': category_report(expense_service)
+    })
+
+
+@app.route('/api/reports/people', methods=['GET'])
+def get_people_report():
+    """Get per-person summary"""
+    expense_service = get_current_service()
+    if not expense_service:
+        return jsonify({'success': False, 'error': 'No active trip'}), 400
+    
+    return cached_report(expense_service, 'people', lambda: {
+        'success': True,
+        'people': people_report(expense_service)
     })
 
 
 @app.route('/api/reports/split', methods=['GET'])
 def get_split_report():
     """Get expense split calculation"""
-    if not expense_service.trip:
+    expense_service = get_current_service()
+    if not expense_service:
         return jsonify({'success': False, 'error': 'No active trip'}), 400
     
     if not expense_service.trip.travelers:
         return jsonify({'success': False, 'error': 'No travelers to split expenses'}), 400
     
-    person_totals = expense_service.get_person_totals()
-    total = expense_service.get_total_expenses()
-    num_people = len(expense_service.trip.travelers)
-    per_person = total / num_people if num_people > 0 else 0
+    return cached_report(expense_service, 'split', lambda: dict(
+        split_report(expense_service), success=True))
+
+
+@app.route('/api/reports/settlement', methods=['GET'])
+def get_settlement_report():
+    """Get who should pay whom to settle the trip"""
+    expense_service = get_current_service()
+    if not expense_service:
+        return jsonify({'success': False, 'error': 'No active trip'}), 400
     
-    balances = []
-    for traveler in expense_service.trip.travelers:
-        paid = person_totals.get(traveler.name, 0)
-        balance = paid - per_person
+    if not expense_service.trip.travelers:
+        return jsonify({'success': False, 'error': 'No travelers to split expenses'}), 400
+    
+    def build():
+        settlement = report_service.settlement(expense_service, expense_service.trip)
         
-        balances.append({
-            'person': traveler.name,
-            'paid': paid,
-            'fair_share': per_person,
-            'balance': balance,
-            'status': 'owed' if balance > 0 else 'owes' if balance < 0 else 'settled'
-        })
+        return {
+            'success': True,
+            'currency': expense_service.trip.currency,
+            'transfers': settlement['transfers'],
+            'num_transfers': len(settlement['transfers']),
+            'method': settlement['method'],
+            'elapsed_ms': settlement['elapsed_ms']
+        }
     
-    return jsonify({
-        'success': True,
-        'balances': sorted(balances, key=lambda x: x['balance'], reverse=True)
-    })
+    return cached_report(expense_service, 'settlement', build)
+
+
+@app.route('/api/trips/<trip_id>/dashboard', methods=['GET'])
+def get_dashboard(trip_id):
+    """Get everything the dashboard shows - summary, travelers, reports and split - in one response"""
+    expense_service = trip_registry.get(trip_id)
+    if not expense_service:
+        return jsonify({'success': False, 'error': 'Trip not found'}), 404
+    
+    def build():
+        # Every section reads the running totals, so nothing here rescans the expenses
+        trip = expense_service.trip
+        no_split = {'balances': [], 'debts': [], 'transfers': []}
+        return {
+            'success': True,
+            'trip': trip.to_dict(),
+            'summary': summary_report(expense_service),
+            'categories': category_report(expense_service),
+            'people': people_report(expense_service),
+            'split': split_report(expense_service) if trip.travelers else no_split
+        }
+    
+    return cached_report(expense_service, 'dashboard', build)
 
 
 @app.route('/api/save', methods=['POST'])
 def save_trip():
     """Save trip to database"""
     try:
-        if not expense_service.trip:
+        expense_service = get_current_service()
+        if not expense_service:
             return jsonify({'success': False, 'error': 'No active trip'}), 400
         
         # Save to database
         trip_data = expense_service.trip.to_dict()
         expenses_data = [exp.to_dict() for exp in expense_service.expenses]
         
-        success = db.save_trip(trip_data, expenses_data)
+        # An explicit save always waits for the write to land
+        success = persistence.save_trip(trip_data, expenses_data, wait=True)
         
         if not success:
             # Fallback to file system
@@ -431,40 +638,17 @@ def save_trip():
 def load_trip(trip_id):
     """Load trip from database"""
     try:
-        # Try database first
-        trip_data = db.load_trip(trip_id)
-        
-        if not trip_data:
-            # Fallback to file system
-            filename = f"{DATA_DIR}/{trip_id}.json"
-            if not os.path.exists(filename):
-                return jsonify({'success': False, 'error': 'Trip not found'}), 404
-            
-            expense_service.import_from_json(filename)
-        else:
-            # Load from database
-            from models.trip import Trip
-
-            
-            trip = Trip.from_dict(trip_data)
-            expense_service.set_trip(trip)
-            
-            # Load expenses
-            expense_service.expenses = []
-            for exp_data in trip_data.get('expenses', []):
-                expense = Expense.from_dict(exp_data)
-                expense_service.expenses.append(expense)
+        # Served from memory when live, otherwise database then file system
+        expense_service = trip_registry.get(trip_id)
+        if not expense_service:
+            return jsonify({'success': False, 'error': 'Trip not found'}), 404
         
         session['current_trip_id'] = trip_id
         
         # Log trip load
         trip_logger.log_trip_loaded(trip_id, expense_service.trip.name)
         
-        return jsonify({
-            'success': True,
-            'trip': expense_service.trip.to_dict(),
-            'expenses': [exp.to_dict() for exp in expense_service.expenses]
-        })
+        return json_response(codec.encode_trip(expense_service.trip, expense_service.expenses, success=True))
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
@@ -473,7 +657,8 @@ def load_trip(trip_id):
 def list_trips():
     """List all saved trips"""
     try:
-        # Try database first
+        # Try database first, including trips whose creation is still queued
+        persistence.flush()
         trips = db.list_trips()
         
         if not trips:
@@ -519,6 +704,33 @@ def convert_currency():
         return jsonify({'success': False, 'error': str(e)}), 400
 
 
+@app.route('/api/convert/batch', methods=['POST'])
+def convert_currency_batch():
+    """Convert many amounts in one call"""
+    try:
+        data = request.json
+        amounts = [float(amount) for amount in data['amounts']]
+        # Either a single currency code or one per amount
+        from_currencies = data.get('from_currencies', data.get('from_currency'))
+        to_currencies = data.get('to_currencies', data.get('to_currency'))
+        if from_currencies is None or to_currencies is None:
+            return jsonify({'success': False, 'error': 'from_currency and to_currency are required'}), 400
+        
+        converted_amounts = currency_converter.convert_batch(amounts, from_currencies, to_currencies)
+        
+        result = {
+            'success': True,
+            'converted_amounts': converted_amounts,
+            'count': len(converted_amounts)
+        }
+        if isinstance(to_currencies, str):
+            result['to_currency'] = to_currencies
+            result['total'] = round(sum(converted_amounts), 2)
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+
 @app.route('/join/<trip_id>')
 def join_trip(trip_id):
     """Join a trip via invite link"""
@@ -527,87 +739,171 @@ def join_trip(trip_id):
     return render_template('index.html', trip_id=trip_id)
 
 
+# format -> (label, file extension, mimetype, ExpenseService method streaming the file)
+EXPORT_FORMATS = {
+    'excel': ('Excel', 'xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'stream_excel'),
+    'csv': ('CSV', 'csv', 'text/csv', 'stream_csv'),
+    'ndjson': ('NDJSON', 'ndjson', 'application/x-ndjson', 'stream_ndjson')
+}
+MAX_EXPORT_WAIT_SECONDS = 30
+
+
+def export_chunks(expense_service, export_format):
+    """Get an export's chunks from the artifact cache, or stream it while filling the cache"""
+    # Keyed by content, so every worker (and a restarted one) reuses the same files
+    key = (expense_service.trip.id, expense_service.content_version, export_format)
+    chunks = artifact_cache.fetch(key)
+    if chunks is None:
+        # Stream a copy taken together with its key: the response is read lazily, and a
+        # change made meanwhile must not end up in the file cached under the old version
+        content_version, snapshot = expense_service.export_snapshot()
+        key = (expense_service.trip.id, content_version, export_format)
+        method = EXPORT_FORMATS[export_format][3]
+        chunks = artifact_cache.store(key, getattr(snapshot, method)())
+    return chunks
+
+
 @app.route('/api/export/excel/<trip_id>')
 def export_excel(trip_id):
-    """Export trip expenses as Excel"""
+    """Export trip expenses as Excel, streamed as the workbook is written"""
     try:
-        from flask import send_file
-        # Create reports directory if it doesn't exist
-        os.makedirs('reports', exist_ok=True)
+        temp_service = trip_registry.get(trip_id)
+        if not temp_service:
+            return jsonify({'success': False, 'error': 'Trip not found. Please save the trip first.'}), 404
         
-        # Create a temporary expense service to export
-        temp_service = ExpenseService()
-        
-        # Try to load from database first
-        trip_data = db.load_trip(trip_id)
-        
-        if trip_data:
-            # Load from database
-            from models.trip import Trip
-
-            
-            trip = Trip.from_dict(trip_data)
-            temp_service.set_trip(trip)
-            
-            # Load expenses
-            temp_service.expenses = []
-            for exp_data in trip_data.get('expenses', []):
-                expense = Expense.from_dict(exp_data)
-                temp_service.expenses.append(expense)
-        else:
-            # Fallback to file system
-            json_filename = f"{DATA_DIR}/{trip_id}.json"
-            if not os.path.exists(json_filename):
-                return jsonify({'success': False, 'error': 'Trip not found. Please save the trip first.'}), 404
-            
-            temp_service.import_from_json(json_filename)
-        
-        excel_filename = f"reports/{trip_id}_expenses.xlsx"
-        temp_service.export_to_excel(excel_filename)
+        if not temp_service.expenses:
+            return jsonify({'success': False, 'error': 'No expenses to export'}), 400
         
         # Log export
         trip_logger.log_trip_exported(trip_id, 'Excel')
         
-        return send_file(
-            excel_filename,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'{trip_id}_expenses.xlsx'
+        # .xlsx is already a zip archive; gzipping it again only costs time
+        return export_response(
+            export_chunks(temp_service, 'excel'), EXPORT_FORMATS['excel'][2],
+            f'{trip_id}_expenses.xlsx', compress=False
         )
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
 
+def gzip_chunks(chunks, level=6):
+    """Gzip a stream of str/bytes chunks, flushing after each so the client can start decoding"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def export_response(chunks, mimetype, filename, compress=True):
+    """Stream an export as a download, gzipped when compress is set and the client accepts gzip"""
+    headers = {'Content-Disposition': f'attachment; filename={filename}'}
+    if compress:
+        headers['Vary'] = 'Accept-Encoding'
+    if compress and request.accept_encodings['gzip']:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return app.response_class(chunks, mimetype=mimetype, headers=headers)
+
+
+@app.route('/api/export/csv/<trip_id>')
+def export_csv(trip_id):
+    """Export trip expenses as CSV, streamed a batch of rows at a time"""
+    temp_service = trip_registry.get(trip_id)
+    if not temp_service:
+        return jsonify({'success': False, 'error': 'Trip not found. Please save the trip first.'}), 404
+    
+    trip_logger.log_trip_exported(trip_id, 'CSV')
+    return export_response(export_chunks(temp_service, 'csv'), 'text/csv', f'{trip_id}_expenses.csv')
+
+
+@app.route('/api/export/ndjson/<trip_id>')
+def export_ndjson(trip_id):
+    """Export trip expenses as newline-delimited JSON, one expense per line"""
+    temp_service = trip_registry.get(trip_id)
+    if not temp_service:
+        return jsonify({'success': False, 'error': 'Trip not found. Please save the trip first.'}), 404
+    
+    trip_logger.log_trip_exported(trip_id, 'NDJSON')
+    return export_response(export_chunks(temp_service, 'ndjson'), 'application/x-ndjson',
+                           f'{trip_id}_expenses.ndjson')
+
+
+@app.route('/api/export/jobs', methods=['POST'])
+def submit_export_job():
+    """Queue an export of a trip; poll the returned job, then download its file"""
+    data = request.json or {}
+    export_format = data.get('format', 'excel')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': f"Unknown export format: {export_format}"}), 400
+    
+    trip_id = data.get('trip_id') or session.get('current_trip_id')
+    temp_service = trip_registry.get(trip_id)
+    if not temp_service:
+        return jsonify({'success': False, 'error': 'Trip not found. Please save the trip first.'}), 404
+    
+    if export_format == 'excel' and not temp_service.expenses:
+        return jsonify({'success': False, 'error': 'No expenses to export'}), 400
+    
+    label, extension, mimetype, method = EXPORT_FORMATS[export_format]
+    try:
+        # Exports of a trip version already cached or in progress are not run again; the job
+        # renders a copy taken now, so its file matches the version it is cached under
+        content_version, snapshot = temp_service.export_snapshot()
+        job = export_jobs.submit(
+            trip_id, content_version, export_format, f'{trip_id}_expenses.{extension}', mimetype,
+            getattr(snapshot, method)
+        )
+    except ExportQueueFull as e:
+        response = jsonify({'success': False, 'error': f'Export queue is full ({e}), please try again shortly'})
+        response.headers['Retry-After'] = '5'
+        return response, 429
+    
+    trip_logger.log_trip_exported(trip_id, label)
+    
+    return jsonify({'success': True, 'job': job}), 202
+
+
+@app.route('/api/export/jobs/<job_id>', methods=['GET'])
+def get_export_job(job_id):
+    """Get an export job's status; ?wait=<seconds> long-polls until it finishes"""
+    try:
+        wait = min(float(request.args.get('wait', 0)), MAX_EXPORT_WAIT_SECONDS)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'wait must be a number of seconds'}), 400
+    
+    job = export_jobs.wait(job_id, wait) if wait > 0 else export_jobs.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Export job not found'}), 404
+    
+    return jsonify({'success': True, 'job': job})
+
+
+@app.route('/api/export/jobs/<job_id>/download', methods=['GET'])
+def download_export_job(job_id):
+    """Download the file of a finished export job"""
+    job = export_jobs.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Export job not found'}), 404
+    
+    if job['status'] != 'done':
+        return jsonify({'success': False, 'error': f"Export is {job['status']}", 'job': job}), 409
+    
+    path = export_jobs.artifact_path(job)
+    if not os.path.exists(path):
+        return jsonify({'success': False, 'error': 'Export file has expired'}), 410
+    
+    return send_file(path, mimetype=job['mimetype'], as_attachment=True, download_name=job['filename'])
+
+
 @app.route('/api/export/summary/<trip_id>')
 def export_summary(trip_id):
     """Get summary data for export"""
     try:
-        # Try to load from database first
-        trip_data = db.load_trip(trip_id)
-        
-        # Create a temporary expense service
-        temp_service = ExpenseService()
-        
-        if trip_data:
-            # Load from database
-            from models.trip import Trip
-
-            
-            trip = Trip.from_dict(trip_data)
-            temp_service.set_trip(trip)
-            
-            # Load expenses
-            temp_service.expenses = []
-            for exp_data in trip_data.get('expenses', []):
-                expense = Expense.from_dict(exp_data)
-                temp_service.expenses.append(expense)
-        else:
-            # Fallback to file system
-            filename = f"{DATA_DIR}/{trip_id}.json"
-            if not os.path.exists(filename):
-                return jsonify({'success': False, 'error': 'Trip not found. Please save the trip first.'}), 404
-            
-            temp_service.import_from_json(filename)
+        temp_service = trip_registry.get(trip_id)
+        if not temp_service:
+            return jsonify({'success': False, 'error': 'Trip not found. Please save the trip first.'}), 404
         
         # Get summary data
         total = temp_service.get_total_expenses()
@@ -627,6 +923,8 @@ def export_summary(trip_id):
             'success': True,
             'summary': {
                 'total_expenses': total,
+                'converted_total': currency_converter.convert_dated_totals(
+                    temp_service.get_daily_currency_totals(), temp_service.trip.currency),
                 'num_expenses': num_expenses,
                 'average_expense': total / num_expenses if num_expenses > 0 else 0
             },
@@ -652,12 +950,23 @@ def get_all_trips_logs():
 
 @app.route('/api/logs/trip/<trip_id>', methods=['GET'])
 def get_trip_logs(trip_id):
-    """Get logs for a specific trip"""
+    """Get logs for a specific trip, optionally paged newest-first with limit/before"""
     try:
-        history = trip_logger.get_trip_history(trip_id)
+        limit = request.args.get('limit', type=int)
+        before = request.args.get('before', type=int)
+        if limit is None and before is None:
+            include_archived = request.args.get('archived', '0') == '1'
+            return jsonify({
+                'success': True,
+                'history': trip_logger.get_trip_history(trip_id, include_archived=include_archived)
+            })
+        
+        page = trip_logger.get_trip_history_page(trip_id, limit, before)
         return jsonify({
             'success': True,
-            'history': history
+            'history': page['history'],
+            'total': page['total'],
+            'next_before': page['next_before']
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
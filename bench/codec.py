@@ -0,0 +1,100 @@
+"""
+Codec Benchmark - Time trip and expense encoding against plain to_dict + json.dumps
+
+Run from the project root:
+
+    python bench/codec.py
+    python bench/codec.py --expenses 1000 100000 --repeat 10
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import codec
+from models.expense import Expense
+from models.traveler import Traveler
+from models.trip import Trip
+
+DEFAULT_EXPENSES = (100, 10000, 100000)
+CATEGORIES = ('Food', 'Transport', 'Lodging', 'Activities', 'Other')
+
+
+def build_trip(expenses, travelers=8, seed=0):
+    """Get (trip, expenses) with random expenses, a third of them split among a few people"""
+    rng = random.Random(seed)
+    names = [f"Traveler {number}" for number in range(travelers)]
+    trip = Trip("Benchmark", "Nowhere", "2026-01-01", "2026-01-31", "USD",
+                travelers=[Traveler(name) for name in names])
+    rows = [
+        Expense(
+            description=f"Expense {number}",
+            amount=round(rng.uniform(1, 500), 2),
+            currency=rng.choice(('USD', 'EUR', 'THB')),
+            category=rng.choice(CATEGORIES),
+            paid_by=rng.choice(names),
+            date=f"2026-01-{rng.randint(1, 31):02d} 12:00:00",
+            split_with=rng.sample(names, rng.randint(2, 4)) if rng.random() < 0.33 else None
+        )
+        for number in range(expenses)
+    ]
+    return trip, rows
+
+
+def best_of(repeat, func, setup=None):
+    """Get the best milliseconds over repeat calls, running setup (untimed) before each"""
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(count, repeat):
+    trip, expenses = build_trip(count)
+    
+    def forget():
+        for expense in expenses:
+            expense._encoded = None
+    
+    def touch():
+        # One edited expense, as after a typical update
+        expenses[0].amount += 1
+    
+    plain = lambda: json.dumps({'trip': trip.to_dict(), 'expenses': [expense.to_dict() for expense in expenses]})
+    encode = lambda: codec.encode_trip(trip, expenses)
+    return {
+        'plain_ms': best_of(repeat, plain),
+        'cold_ms': best_of(repeat, encode, setup=forget),
+        'cached_ms': best_of(repeat, encode, setup=encode),
+        'one_changed_ms': best_of(repeat, encode, setup=touch),
+        'export_ms': best_of(repeat, lambda: [codec.encode_expense(expense, remember=False) for expense in expenses],
+                             setup=forget)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the trip codec's encode path")
+    parser.add_argument('--expenses', type=int, nargs='+', default=DEFAULT_EXPENSES)
+    parser.add_argument('--repeat', type=int, default=5, help="runs per measurement; the best one is reported")
+    args = parser.parse_args()
+    
+    print(f"JSON backend: {'orjson' if codec.orjson is not None else 'json'}")
+    print(f"{'expenses':>9} {'plain ms':>9} {'cold ms':>9} {'cached ms':>10} {'1 changed ms':>13} {'export ms':>10}")
+    for count in args.expenses:
+        result = run(count, args.repeat)
+        print(f"{count:>9} {result['plain_ms']:>9.2f} {result['cold_ms']:>9.2f} {result['cached_ms']:>10.2f} "
+              f"{result['one_changed_ms']:>13.2f} {result['export_ms']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Settlement Benchmark - Time balances and settle-up plans for large trips
+
+Run from the project root:
+
+    python bench/settlement.py
+    python bench/settlement.py --travelers 300 --expenses 100000 --repeat 5
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.expense import Expense
+from models.traveler import Traveler
+from models.trip import Trip
+from services.expense_service import ExpenseService
+from services.settlement_service import SettlementService
+
+DEFAULT_TRAVELERS = (8, 14, 50, 300, 800)
+DEFAULT_EXPENSES = (1000, 10000, 100000)
+CATEGORIES = ('Food', 'Transport', 'Lodging', 'Activities', 'Other')
+
+
+def build_service(travelers, expenses, seed=0):
+    """Get an ExpenseService with a random trip; about a third of the expenses split among a few people"""
+    rng = random.Random(seed)
+    names = [f"Traveler {number}" for number in range(travelers)]
+    trip = Trip("Benchmark", "Nowhere", "2026-01-01", "2026-01-31", "USD",
+                travelers=[Traveler(name) for name in names])
+    service = ExpenseService()
+    service.set_trip(trip)
+    
+    rows = []
+    for number in range(expenses):
+        split_with = rng.sample(names, min(travelers, rng.randint(2, 4))) if rng.random() < 0.33 else None
+        rows.append(Expense(
+            description=f"Expense {number}",
+            amount=round(rng.uniform(1, 500), 2),
+            currency='USD',
+            category=rng.choice(CATEGORIES),
+            paid_by=rng.choice(names),
+            date=f"2026-01-{rng.randint(1, 31):02d}",
+            split_with=split_with
+        ))
+    service.add_expenses(rows)
+    return service
+
+
+def best_of(repeat, func):
+    """Get (best milliseconds, last result) over repeat calls"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(travelers, expenses, repeat):
+    settlement = SettlementService()
+    started = time.perf_counter()
+    service = build_service(travelers, expenses)
+    load_ms = (time.perf_counter() - started) * 1000
+    
+    balances_ms, balances = best_of(repeat, service.get_balances)
+    settle_ms, plan = best_of(repeat, lambda: settlement.settle(balances))
+    return {
+        'load_ms': load_ms,
+        'balances_ms': balances_ms,
+        'settle_ms': settle_ms,
+        'method': plan['method'],
+        'transfers': len(plan['transfers'])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time settlement for trips of various sizes")
+    parser.add_argument('--travelers', type=int, nargs='+', default=DEFAULT_TRAVELERS)
+    parser.add_argument('--expenses', type=int, nargs='+', default=DEFAULT_EXPENSES)
+    parser.add_argument('--repeat', type=int, default=3, help="runs per measurement; the best one is reported")
+    args = parser.parse_args()
+    
+    print(f"{'travelers':>9} {'expenses':>9} {'load ms':>9} {'balances ms':>12} {'settle ms':>10} "
+          f"{'method':>7} {'transfers':>9}")
+    for travelers in args.travelers:
+        for expenses in args.expenses:
+            result = run(travelers, expenses, args.repeat)
+            print(f"{travelers:>9} {expenses:>9} {result['load_ms']:>9.1f} {result['balances_ms']:>12.2f} "
+                  f"{result['settle_ms']:>10.2f} {result['method']:>7} {result['transfers']:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -16,7 +16,7 @@ from utils.currency_converter import CurrencyConverter
 class TripFinanceTracker:
     def __init__(self):
         self.expense_service = ExpenseService()
-        self.report_service = ReportService()
+        self.report_service = ReportService(converter=CurrencyConverter())
         self.current_trip = None
     
     def display_menu(self):
@@ -60,8 +60,10 @@ class TripFinanceTracker:
         currency = input(f"Currency [{self.current_trip.currency}]: ").upper() or self.current_trip.currency
         category = input("Category (food/transport/accommodation/activities/other): ")
         paid_by = input("Paid by (traveler name): ")
+        split_input = input("Split with (comma-separated names) [everyone]: ")
+        split_with = [name.strip() for name in split_input.split(",") if name.strip()]
         
-        expense = Expense(description, amount, currency, category, paid_by)
+        expense = Expense(description, amount, currency, category, paid_by, split_with=split_with)
         self.expense_service.add_expense(expense)
         print(f"\n✓ Expense added successfully!")
     
@@ -91,7 +93,7 @@ class TripFinanceTracker:
         email = input("Email (optional): ")
         
         traveler = Traveler(name, email)
-        self.current_trip.add_traveler(traveler)
+        self.expense_service.add_traveler(traveler)
         print(f"\n✓ Traveler '{name}' added!")
     
     def view_summary(self):
@@ -116,6 +118,7 @@ class TripFinanceTracker:
         print("1. Category Breakdown")
         print("2. Per Person Summary")
         print("3. Daily Expenses")
+        print("4. Split & Settle Up")
         choice = input("Select report type: ")
         
         if choice == "1":
@@ -127,6 +130,11 @@ class TripFinanceTracker:
         elif choice == "3":
             report = self.report_service.daily_expenses(self.expense_service)
             print(report)
+        elif choice == "4":
+            report = self.report_service.split_calculator(self.expense_service, self.current_trip)
+            print(report)
+            print("\nWho pays whom:")
+            print(self.report_service.settlement_report(self.expense_service, self.current_trip))
     
     def export_data(self):
         """Export trip data"""
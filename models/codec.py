@@ -0,0 +1,75 @@
+"""
+Codec - Encode and decode whole trips in one pass
+"""
+
+import json
+from models.expense import Expense
+from models.trip import Trip
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj):
+    """Serialize to a JSON string, with orjson when it is installed
+
+    orjson refuses strings holding lone surrogates, which the json module escapes, so those
+    fall back to json rather than making a trip unreadable.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode('utf-8')
+        except TypeError:
+            pass
+    return json.dumps(obj)
+
+
+def loads(text):
+    """Parse a JSON string or bytes, falling back to json for escaped lone surrogates"""
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
+
+def encode_expense(expense, remember=True):
+    """Get an expense's JSON, reusing the cached encoding until the expense changes
+
+    One-off passes such as exports pass remember=False so they don't grow the cache.
+    """
+    key = expense.cache_key()
+    cached = expense._encoded
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    text = dumps(expense.to_dict())
+    if remember:
+        expense._encoded = (key, text)
+    return text
+
+
+def encode_expenses(expenses):
+    """Get a JSON array of expenses, stitched from their cached encodings"""
+    return '[' + ','.join(encode_expense(expense) for expense in expenses) + ']'
+
+
+def encode_trip(trip, expenses, **fields):
+    """Get {"trip": ..., "expenses": [...], **fields} as JSON in one pass"""
+    head = dumps(dict(fields, trip=trip.to_dict()))
+    return head[:-1] + ',"expenses":' + encode_expenses(expenses) + '}'
+
+
+def decode_trip(data):
+    """Get (trip, expenses) from a JSON string or an already parsed {"trip", "expenses"} dict"""
+    if isinstance(data, (str, bytes)):
+        data = loads(data)
+    trip = Trip.from_dict(data["trip"]) if data.get("trip") else None
+    return trip, decode_expenses(data.get("expenses", []))
+
+
+def decode_expenses(rows):
+    """Build Expense objects from dicts, lazily so stores can consume them one at a time"""
+    return (Expense.from_dict(row) for row in rows)
@@ -7,6 +7,8 @@ import uuid
 
 
 class Expense:
+    __slots__ = ('id', 'description', 'amount', 'currency', 'category', 'paid_by', 'date', 'split_with', '_encoded')
+    
     def __init__(self, description, amount, currency, category, paid_by, date=None, expense_id=None, split_with=None):
         self.id = expense_id or str(uuid.uuid4())
         self.description = description
@@ -16,6 +18,15 @@ class Expense:
         self.paid_by = paid_by
         self.date = date or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.split_with = split_with or []
+        # (cache_key(), JSON text) kept by models.codec
+        self._encoded = None
+    
+    def cache_key(self):
+        """Snapshot of every field, used to tell whether a cached encoding is still current"""
+        split = self.split_with
+        split_key = tuple(split.items()) if isinstance(split, dict) else tuple(split)
+        return (self.id, self.description, self.amount, self.currency, self.category,
+                self.paid_by, self.date, split_key)
     
     def to_dict(self):
         """Convert expense to dictionary"""
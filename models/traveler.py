@@ -6,6 +6,8 @@ import uuid
 
 
 class Traveler:
+    __slots__ = ('id', 'name', 'email')
+    
     def __init__(self, name, email="", traveler_id=None):
         self.id = traveler_id or str(uuid.uuid4())
         self.name = name
@@ -4,9 +4,12 @@ Trip Model
 
 from datetime import datetime
 import uuid
+from models.traveler import Traveler
 
 
 class Trip:
+    __slots__ = ('id', 'name', 'destination', 'start_date', 'end_date', 'currency', 'travelers', 'created_at')
+    
     def __init__(self, name, destination, start_date, end_date, currency, trip_id=None, travelers=None):
         self.id = trip_id or str(uuid.uuid4())
         self.name = name
@@ -41,7 +44,6 @@ class Trip:
     @classmethod
     def from_dict(cls, data):
         """Create trip from dictionary"""
-        from models.traveler import Traveler
         travelers = [Traveler.from_dict(t) for t in data.get("travelers", [])]
         return cls(
             name=data["name"],
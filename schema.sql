@@ -19,8 +19,28 @@ CREATE TABLE IF NOT EXISTS trips (
 CREATE INDEX IF NOT EXISTS idx_trips_created_at ON trips(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_trips_id ON trips(id);
 
+-- Create expenses table (one row per expense)
+-- trips.expenses is kept only as the legacy blob column for migration
+CREATE TABLE IF NOT EXISTS expenses (
+    id TEXT PRIMARY KEY,
+    seq BIGSERIAL,
+    trip_id TEXT NOT NULL REFERENCES trips(id) ON DELETE CASCADE,
+    description TEXT NOT NULL,
+    amount DOUBLE PRECISION NOT NULL,
+    currency TEXT NOT NULL,
+    category TEXT NOT NULL,
+    paid_by TEXT NOT NULL,
+    date TEXT NOT NULL,
+    split_with TEXT DEFAULT '[]',
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Expenses are always read per trip, in insertion order
+CREATE INDEX IF NOT EXISTS idx_expenses_trip_seq ON expenses(trip_id, seq);
+
 -- Enable Row Level Security (RLS)
 ALTER TABLE trips ENABLE ROW LEVEL SECURITY;
+ALTER TABLE expenses ENABLE ROW LEVEL SECURITY;
 
 -- Drop existing policy if it exists
 DROP POLICY IF EXISTS "Allow all operations on trips" ON trips;
@@ -31,6 +51,13 @@ CREATE POLICY "Allow all operations on trips" ON trips
     USING (true)
     WITH CHECK (true);
 
+DROP POLICY IF EXISTS "Allow all operations on expenses" ON expenses;
+
+CREATE POLICY "Allow all operations on expenses" ON expenses
+    FOR ALL
+    USING (true)
+    WITH CHECK (true);
+
 -- Create or replace the updated_at trigger function
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -49,6 +76,25 @@ CREATE TRIGGER update_trips_updated_at
     FOR EACH ROW 
     EXECUTE FUNCTION update_updated_at_column();
 
--- Verify table was created
-SELECT 'Table created successfully!' as status;
+-- Migrate legacy expense blobs into rows (safe to re-run)
+INSERT INTO expenses (id, trip_id, description, amount, currency, category, paid_by, date, split_with)
+SELECT
+    e.value->>'id',
+    t.id,
+    e.value->>'description',
+    (e.value->>'amount')::DOUBLE PRECISION,
+    e.value->>'currency',
+    e.value->>'category',
+    e.value->>'paid_by',
+    e.value->>'date',
+    COALESCE(e.value->'split_with', '[]'::json)::TEXT
+FROM trips t, json_array_elements(COALESCE(NULLIF(t.expenses, ''), '[]')::json) WITH ORDINALITY AS e(value, position)
+ORDER BY t.id, e.position
+ON CONFLICT (id) DO NOTHING;
+
+UPDATE trips SET expenses = '[]' WHERE expenses IS DISTINCT FROM '[]';
+
+-- Verify tables were created
+SELECT 'Tables created successfully!' as status;
 SELECT COUNT(*) as trip_count FROM trips;
+SELECT COUNT(*) as expense_count FROM expenses;
@@ -4,5 +4,7 @@ Services Package
 
 from services.expense_service import ExpenseService
 from services.report_service import ReportService
+from services.settlement_service import SettlementService
+from services.trip_registry import TripRegistry
 
-__all__ = ['ExpenseService', 'ReportService']
+__all__ = ['ExpenseService', 'ReportService', 'SettlementService', 'TripRegistry']
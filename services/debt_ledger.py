@@ -0,0 +1,201 @@
+"""
+Debt Ledger - Pairwise debts between travelers, honoring each expense's split_with
+"""
+
+import math
+
+
+def normalize_split(split_with):
+    """Validate split_with and get {name: weight}, or {} for "everyone on the trip"
+    
+    split_with is a list of names (equal shares) or a {name: weight} dict (weighted shares).
+    """
+    if not split_with:
+        return {}
+    if isinstance(split_with, dict):
+        weights = {}
+        for name, weight in split_with.items():
+            try:
+                weight = float(weight)
+            except (TypeError, ValueError):
+                raise ValueError(f"Share for {name} is not a number: {weight!r}")
+            if not math.isfinite(weight):
+                raise ValueError(f"Share for {name} is not a number: {weight!r}")
+            if weight < 0:
+                raise ValueError(f"Negative share for {name}")
+            if weight > 0:
+                weights[str(name)] = weight
+        if not weights:
+            raise ValueError("split_with needs at least one positive share")
+        return weights
+    if isinstance(split_with, (list, tuple)):
+        return {str(name): 1.0 for name in split_with}
+    raise ValueError("split_with must be a list of names or a {name: share} mapping")
+
+
+class _Book:
+    """Running totals of the expenses in one currency, on one day or on all days"""
+    
+    __slots__ = ('paid', 'owed', 'pairs', 'shared', 'shared_total', 'entries')
+    
+    def __init__(self):
+        self.paid = {}
+        self.owed = {}
+        self.pairs = {}
+        self.shared = {}
+        self.shared_total = 0.0
+        self.entries = 0
+
+
+class DebtLedger:
+    """Running pairwise debts, updated on every add and delete instead of rescanning expenses
+    
+    Expenses split with specific travelers are booked as debts towards the payer right away.
+    Expenses without split_with are shared by everyone on the trip, so they are pooled per
+    payer and divided among the current travelers at query time.
+    
+    Amounts are kept apart per (currency, day) and only converted when queried, with
+    rate(currency, day) giving the factor into the trip currency; without it they are summed as-is.
+    Each currency also keeps a book over all its days, so queries only look at the day books
+    whose rate differs from the rest of that currency.
+    """
+    
+    def __init__(self):
+        self._totals = {}
+        self._books = {}
+    
+    def apply(self, expense, sign=1):
+        """Add (sign=1) or remove (sign=-1) an expense"""
+        try:
+            weights = normalize_split(expense.split_with)
+        except (TypeError, ValueError) as e:
+            print(f"Invalid split_with on expense {expense.id}, sharing it with everyone: {e}")
+            weights = {}
+        
+        currency = expense.currency
+        day = expense.date[:10]
+        days = self._books.get(currency)
+        if days is None:
+            days = self._books[currency] = {}
+            self._totals[currency] = _Book()
+        book = days.get(day)
+        if book is None:
+            book = days[day] = _Book()
+        
+        amount = expense.amount * sign
+        for target in (book, self._totals[currency]):
+            self._book(target, expense.paid_by, amount, weights, sign)
+        
+        # Drop accumulated float drift once no expense of a book is left
+        if book.entries <= 0:
+            del days[day]
+        if not days:
+            del self._books[currency]
+            del self._totals[currency]
+    
+    def _book(self, book, payer, amount, weights, sign):
+        book.entries += sign
+        self._add(book.paid, payer, amount)
+        if not weights:
+            self._add(book.shared, payer, amount)
+            book.shared_total += amount
+        else:
+            total_weight = sum(weights.values())
+            for name, weight in weights.items():
+                share = amount * weight / total_weight
+                self._add(book.owed, name, share)
+                if name != payer:
+                    self._add_debt(book, name, payer, share)
+    
+    def clear(self):
+        self._totals.clear()
+        self._books.clear()
+    
+    @staticmethod
+    def _add(totals, key, amount):
+        value = totals.get(key, 0.0) + amount
+        if abs(value) < 1e-9:
+            totals.pop(key, None)
+        else:
+            totals[key] = value
+    
+    def _add_debt(self, book, debtor, creditor, amount):
+        """Book debtor owing creditor, netted against what creditor owes debtor"""
+        if debtor < creditor:
+            self._add(book.pairs, (debtor, creditor), amount)
+        else:
+            self._add(book.pairs, (creditor, debtor), -amount)
+    
+    def _converted_books(self, rate):
+        """Yield (factor, book) pairs that together count every expense once at its day's rate
+        
+        Each currency's total is taken at the rate most of its days share; every other day
+        adds its own book at the difference, since all the totals are linear in the amounts.
+        """
+        for currency, total in self._totals.items():
+            if not rate:
+                yield 1.0, total
+                continue
+            by_factor = {}
+            for day, book in self._books[currency].items():
+                by_factor.setdefault(rate(currency, day), []).append(book)
+            base = max(by_factor, key=lambda factor: len(by_factor[factor]))
+            for factor, books in by_factor.items():
+                if factor != base:
+                    for book in books:
+                        yield factor - base, book
+            yield base, total
+    
+    def paid(self, rate=None):
+        """Get {name: total paid}"""
+        paid = {}
+        for factor, book in self._converted_books(rate):
+            for name, amount in book.paid.items():
+                paid[name] = paid.get(name, 0.0) + amount * factor
+        return paid
+    
+    def balances(self, travelers, rate=None):
+        """Get {name: paid - share}; positive means the person is owed money"""
+        shares = self.shares(travelers, rate)
+        balances = {name: -share for name, share in shares.items()}
+        for name, paid in self.paid(rate).items():
+            balances[name] = balances.get(name, 0.0) + paid
+        return balances
+    
+    def shares(self, travelers, rate=None):
+        """Get {name: fair share} of every traveler and split participant"""
+        names = list(travelers)
+        shares = {name: 0.0 for name in names}
+        for factor, book in self._converted_books(rate):
+            if names:
+                equal_share = book.shared_total * factor / len(names)
+                for name in names:
+                    shares[name] += equal_share
+            for name, owed in book.owed.items():
+                shares[name] = shares.get(name, 0.0) + owed * factor
+        return shares
+    
+    def debts(self, travelers, rate=None):
+        """Get the net pairwise debts as {(debtor, creditor): amount}"""
+        names = list(travelers)
+        pairs = {}
+        for factor, book in self._converted_books(rate):
+            for key, amount in book.pairs.items():
+                pairs[key] = pairs.get(key, 0.0) + amount * factor
+            if not names:
+                continue
+            for payer, pooled in book.shared.items():
+                share = pooled * factor / len(names)
+                for name in names:
+                    if name == payer:
+                        continue
+                    key = (name, payer) if name < payer else (payer, name)
+                    pairs[key] = pairs.get(key, 0.0) + (share if name < payer else -share)
+        
+        debts = {}
+        for (first, second), amount in pairs.items():
+            if amount > 1e-9:
+                debts[(first, second)] = amount
+            elif amount < -1e-9:
+                debts[(second, first)] = -amount
+        return debts
@@ -0,0 +1,88 @@
+"""
+Expense Import - Validate bulk expense rows from JSON or CSV before they touch the trip
+"""
+
+import csv
+import io
+import math
+from datetime import datetime
+from models.expense import Expense
+from services.debt_ledger import normalize_split
+
+REQUIRED_FIELDS = ('description', 'amount', 'category', 'paid_by')
+DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d')
+
+
+def read_csv_rows(text):
+    """Get one dict per CSV line, keyed by the lower-cased header (as written by the CSV export)
+    
+    A split_with column holds traveler names separated by ';'.
+    """
+    reader = csv.DictReader(io.StringIO(text.lstrip('\ufeff')))
+    if not reader.fieldnames:
+        raise ValueError("CSV needs a header row")
+    reader.fieldnames = [name.strip().lower().replace(' ', '_') for name in reader.fieldnames]
+    for row in reader:
+        split_with = row.get('split_with')
+        if split_with is not None:
+            row['split_with'] = [name.strip() for name in split_with.split(';') if name.strip()]
+        yield row
+
+
+def parse_expense(row, default_currency):
+    """Build an Expense from one imported row, raising ValueError for anything invalid"""
+    if not isinstance(row, dict):
+        raise ValueError("expected an object with expense fields")
+    missing = [field for field in REQUIRED_FIELDS if row.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    
+    try:
+        amount = float(row['amount'])
+    except (TypeError, ValueError):
+        raise ValueError(f"amount is not a number: {row['amount']!r}")
+    if not math.isfinite(amount):
+        raise ValueError(f"amount is not a number: {row['amount']!r}")
+    
+    expense_date = row.get('date') or None
+    if expense_date is not None:
+        expense_date = str(expense_date).strip()
+        for date_format in DATE_FORMATS:
+            try:
+                datetime.strptime(expense_date, date_format)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"date must be YYYY-MM-DD or YYYY-MM-DD HH:MM:SS: {expense_date!r}")
+    
+    split_with = row.get('split_with') or []
+    normalize_split(split_with)
+    
+    return Expense(
+        description=str(row['description']).strip(),
+        amount=amount,
+        currency=str(row.get('currency') or default_currency).strip().upper(),
+        category=str(row['category']).strip(),
+        paid_by=str(row['paid_by']).strip(),
+        date=expense_date,
+        split_with=split_with
+    )
+
+
+def parse_expenses(rows, default_currency, max_rows=None):
+    """Validate every row, returning (expenses, errors) with errors as [{'row': n, 'error': ...}]
+    
+    Rows are numbered from 1. Nothing is returned as valid unless every row is.
+    """
+    expenses = []
+    errors = []
+    for number, row in enumerate(rows, 1):
+        if max_rows is not None and number > max_rows:
+            errors.append({'row': number, 'error': f"at most {max_rows} expenses can be imported at once"})
+            break
+        try:
+            expenses.append(parse_expense(row, default_currency))
+        except (TypeError, ValueError) as e:
+            errors.append({'row': number, 'error': str(e)})
+    return ([] if errors else expenses), errors
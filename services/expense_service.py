@@ -2,57 +2,407 @@
 Expense Service - Business logic for expense management
 """
 
+import copy
 import json
 import csv
-from models.expense import Expense
+import hashlib
+import heapq
+import io
+import os
+import uuid
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from models import codec
+from services.debt_ledger import DebtLedger
+from services.expense_store import ColumnarExpenseStore, ExpenseList
+from utils import xlsx_stream
+
+CSV_FIELDS = ['date', 'description', 'amount', 'currency',
+              'converted_amount', 'trip_currency', 'category', 'paid_by']
 
 
 class ExpenseService:
-    def __init__(self):
+    def __init__(self, columnar=None):
+        if columnar is None:
+            columnar = os.environ.get('EXPENSE_STORE', 'list') == 'columnar'
+        self.columnar = columnar
+        # Bumped on every mutation; epoch tells this copy of the trip apart from one
+        # loaded earlier or by another worker, whose versions also started at 0
+        self.epoch = uuid.uuid4().hex[:12]
+        self.version = 0
         self.trip = None
         self.expenses = []
     
+    @property
+    def expenses(self):
+        """All expenses of the trip, in insertion order"""
+        return self._expenses
+    
+    @expenses.setter
+    def expenses(self, expenses):
+        """Replace all expenses and rebuild the running totals and indexes"""
+        self._expenses = ColumnarExpenseStore() if self.columnar else ExpenseList()
+        self._next_seq = 0
+        self._reset_totals()
+        self._reset_indexes()
+        for exp in expenses:
+            self._add(exp)
+        self._changed()
+    
+    def _reset_totals(self):
+        """Clear the running totals maintained on add and delete"""
+        self._total = 0.0
+        # XOR of the expense hashes, so it follows adds and deletes without rescanning
+        self._fingerprint = 0
+        self._category_totals = {}
+        self._person_totals = {}
+        self._currency_totals = {}
+        self._category_currency_totals = {}
+        self._daily_totals = {}
+        self._daily_currency_totals = {}
+        self._category_daily_currency_totals = {}
+        self._counts = {}
+        self._ledger = DebtLedger()
+        # field -> {text length: count}, capped at the widest column, for sizing export columns
+        self._text_lengths = {}
+    
+    def _apply_totals(self, exp, sign):
+        """Add (sign=1) or remove (sign=-1) an expense from the running totals"""
+        amount = exp.amount * sign
+        self._total += amount
+        self._fingerprint ^= self._expense_hash(exp)
+        self._bump(self._category_totals, ('category', exp.category), exp.category, amount, sign)
+        self._bump(self._person_totals, ('person', exp.paid_by), exp.paid_by, amount, sign)
+        self._bump(self._currency_totals, ('currency', exp.currency), exp.currency, amount, sign)
+        self._bump(self._daily_totals, ('day', exp.date.split()[0]), exp.date.split()[0], amount, sign)
+        
+        breakdown = self._category_currency_totals.setdefault(exp.category, {})
+        self._bump(breakdown, ('category_currency', exp.category, exp.currency), exp.currency, amount, sign)
+        if not breakdown:
+            del self._category_currency_totals[exp.category]
+        
+        day = exp.date.split()[0]
+        daily = self._daily_currency_totals.setdefault(day, {})
+        self._bump(daily, ('day_currency', day, exp.currency), exp.currency, amount, sign)
+        if not daily:
+            del self._daily_currency_totals[day]
+        
+        category_days = self._category_daily_currency_totals.setdefault(exp.category, {})
+        category_daily = category_days.setdefault(day, {})
+        self._bump(category_daily, ('category_day_currency', exp.category, day, exp.currency),
+                   exp.currency, amount, sign)
+        if not category_daily:
+            del category_days[day]
+            if not category_days:
+                del self._category_daily_currency_totals[exp.category]
+        
+        self._ledger.apply(exp, sign)
+        self._count_length('date', exp.date, sign)
+        self._count_length('description', exp.description, sign)
+        
+        if not self._expenses:
+            # Drop accumulated float drift once the trip is empty again
+            self._total = 0.0
+    
+    def _bump(self, totals, count_key, key, amount, sign):
+        """Update one running total, dropping the key when no expense remains"""
+        count = self._counts.get(count_key, 0) + sign
+        if count <= 0:
+            self._counts.pop(count_key, None)
+            totals.pop(key, None)
+            return
+        self._counts[count_key] = count
+        totals[key] = totals.get(key, 0) + amount
+    
+    def _changed(self):
+        self.version += 1
+    
+    @property
+    def etag(self):
+        """Strong entity tag of the trip's current state"""
+        return f"{self.epoch}-{self.version}"
+    
+    @property
+    def content_version(self):
+        """Hash of the trip and its expenses; unlike etag it is the same in every process and after a reload"""
+        trip = self.trip.to_dict() if self.trip else None
+        state = json.dumps([trip, len(self._expenses), self._fingerprint], sort_keys=True)
+        return hashlib.sha1(state.encode('utf-8')).hexdigest()[:20]
+    
+    def export_snapshot(self):
+        """Get (content_version, frozen copy) for exporting the trip as it is now
+        
+        The copy has its own expense list, trip and the totals the exports read, so an export
+        matches the version it is keyed by even if the trip changes while it is being written.
+        """
+        while True:
+            version = self.version
+            snapshot = copy.copy(self)
+            snapshot.trip = copy.copy(self.trip)
+            snapshot._expenses = list(self._expenses)
+            snapshot._currency_totals = dict(self._currency_totals)
+            snapshot._category_totals = dict(self._category_totals)
+            snapshot._person_totals = dict(self._person_totals)
+            snapshot._amount_keys = array('d', self._amount_keys)
+            snapshot._text_lengths = {field: dict(lengths) for field, lengths in self._text_lengths.items()}
+            content_version = self.content_version
+            # A change landing mid-copy could leave the copy half old and half new
+            if self.version == version:
+                return content_version, snapshot
+    
+    @staticmethod
+    def _expense_hash(exp):
+        digest = hashlib.blake2b(repr(exp.cache_key()).encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big')
+    
+    def _count_length(self, field, text, sign):
+        lengths = self._text_lengths.setdefault(field, {})
+        length = min(len(text), xlsx_stream.MAX_COLUMN_WIDTH)
+        count = lengths.get(length, 0) + sign
+        if count > 0:
+            lengths[length] = count
+        else:
+            lengths.pop(length, None)
+    
+    def get_longest_text(self, field):
+        """Get the length of the longest date or description, capped at the widest export column"""
+        return max(self._text_lengths.get(field, ()), default=0)
+    
     def set_trip(self, trip):
         """Set the current trip"""
         self.trip = trip
+        self._changed()
+    
+    def add_traveler(self, traveler):
+        """Add a traveler to the trip"""
+        self.trip.add_traveler(traveler)
+        self._changed()
+    
+    def _reset_indexes(self):
+        """Clear the secondary indexes used for filtering and paging"""
+        # (field, value) and day -> sequence numbers in ascending order
+        self._value_index = {}
+        self._day_index = {}
+        self._days = []
+        # Sorted by (amount, seq), kept as two parallel arrays
+        self._amount_keys = array('d')
+        self._amount_seqs = array('Q')
+    
+    def _index(self, exp, seq, sign):
+        """Add (sign=1) or remove (sign=-1) an expense from the secondary indexes"""
+        for key in (('category', exp.category), ('paid_by', exp.paid_by), ('currency', exp.currency)):
+            self._index_seq(self._value_index, key, seq, sign)
+        
+        day = exp.date.split()[0]
+        if sign > 0 and day not in self._day_index:
+            insort(self._days, day)
+        self._index_seq(self._day_index, day, seq, sign)
+        if sign < 0 and day not in self._day_index:
+            del self._days[bisect_left(self._days, day)]
+        
+        lo = bisect_left(self._amount_keys, exp.amount)
+        hi = bisect_right(self._amount_keys, exp.amount)
+        if sign > 0:
+            # Newest seq is the largest, so it goes last among equal amounts
+            self._amount_keys.insert(hi, exp.amount)
+            self._amount_seqs.insert(hi, seq)
+        else:
+            position = bisect_left(self._amount_seqs, seq, lo, hi)
+            del self._amount_keys[position]
+            del self._amount_seqs[position]
+    
+    @staticmethod
+    def _index_seq(index, key, seq, sign):
+        seqs = index.get(key)
+        if sign > 0:
+            if seqs is None:
+                seqs = index[key] = array('Q')
+            seqs.append(seq)
+            return
+        del seqs[bisect_left(seqs, seq)]
+        if not seqs:
+            del index[key]
+    
+    def _add(self, expense):
+        seq = self._next_seq
+        self._next_seq += 1
+        self._expenses.append(expense, seq)
+        self._apply_totals(expense, 1)
+        self._index(expense, seq, 1)
     
     def add_expense(self, expense):
         """Add an expense to the trip"""
-        self.expenses.append(expense)
+        self._add(expense)
+        self._changed()
+    
+    def add_expenses(self, expenses):
+        """Add many expenses to the trip as one change"""
+        for exp in expenses:
+            self._add(exp)
+        if expenses:
+            self._changed()
+    
+    def delete_expense(self, expense_id):
+        """Delete an expense by id, returning the removed expense or None"""
+        removed = self._expenses.pop_id(expense_id)
+        if removed is None:
+            return None
+        seq, exp = removed
+        self._apply_totals(exp, -1)
+        self._index(exp, seq, -1)
+        self._changed()
+        return exp
     
     def get_all_expenses(self):
         """Get all expenses"""
-        return self.expenses
+        return self._expenses
     
     def get_expenses_by_category(self, category):
         """Get expenses filtered by category"""
-        return [exp for exp in self.expenses if exp.category == category]
+        return self.query_expenses(category=category)[0]
     
     def get_expenses_by_person(self, person_name):
         """Get expenses paid by a specific person"""
-        return [exp for exp in self.expenses if exp.paid_by == person_name]
+        return self.query_expenses(paid_by=person_name)[0]
+    
+    def query_expenses(self, category=None, paid_by=None, currency=None, date_from=None, date_to=None,
+                       min_amount=None, max_amount=None, after=None, limit=None):
+        """Get (expenses, next_cursor) matching all given filters, in insertion order
+        
+        Dates are inclusive days (YYYY-MM-DD) and amounts are inclusive bounds. Pass the
+        returned cursor as after to get the next page; it is None on the last page.
+        """
+        after = -1 if after is None else after
+        date_from = date_from[:10] if date_from else None
+        date_to = date_to[:10] if date_to else None
+        
+        # Drive the scan from the smallest index that applies, and check the other filters per row
+        sources = []
+        for field, value in (('category', category), ('paid_by', paid_by), ('currency', currency)):
+            if value is not None:
+                seqs = self._value_index.get((field, value))
+                if seqs is None:
+                    return [], None
+                sources.append((len(seqs), lambda seqs=seqs: self._seqs_after(seqs, after)))
+        if date_from or date_to:
+            lo = bisect_left(self._days, date_from) if date_from else 0
+            hi = bisect_right(self._days, date_to) if date_to else len(self._days)
+            day_seqs = [self._day_index[day] for day in self._days[lo:hi]]
+            sources.append((sum(len(seqs) for seqs in day_seqs), lambda: heapq.merge(
+                *(self._seqs_after(seqs, after) for seqs in day_seqs))))
+        if min_amount is not None or max_amount is not None:
+            lo = bisect_left(self._amount_keys, min_amount) if min_amount is not None else 0
+            hi = bisect_right(self._amount_keys, max_amount) if max_amount is not None else len(self._amount_keys)
+            sources.append((hi - lo, lambda: sorted(seq for seq in self._amount_seqs[lo:hi] if seq > after)))
+        
+        if sources:
+            _, source = min(sources, key=lambda item: item[0])
+            candidates = ((seq, self._expenses.get_seq(seq)) for seq in source())
+        else:
+            candidates = self._expenses.iter_from(after)
+        
+        def matches(exp):
+            if category is not None and exp.category != category:
+                return False
+            if paid_by is not None and exp.paid_by != paid_by:
+                return False
+            if currency is not None and exp.currency != currency:
+                return False
+            if date_from or date_to:
+                day = exp.date.split()[0]
+                if (date_from and day < date_from) or (date_to and day > date_to):
+                    return False
+            if min_amount is not None and exp.amount < min_amount:
+                return False
+            if max_amount is not None and exp.amount > max_amount:
+                return False
+            return True
+        
+        page = []
+        for seq, exp in candidates:
+            if matches(exp):
+                page.append((seq, exp))
+                if limit is not None and len(page) > limit:
+                    break
+        
+        next_cursor = None
+        if limit is not None and len(page) > limit:
+            page = page[:limit]
+            next_cursor = page[-1][0]
+        return [exp for _, exp in page], next_cursor
+    
+    @staticmethod
+    def _seqs_after(seqs, after):
+        """Iterate an ascending seq array from the first entry past the cursor, without copying it"""
+        return (seqs[index] for index in range(bisect_right(seqs, after), len(seqs)))
     
     def get_total_expenses(self):
         """Calculate total expenses"""
-        return sum(exp.amount for exp in self.expenses)
+        return self._total
     
     def get_category_totals(self):
         """Get total expenses by category"""
-        categories = {}
-        for exp in self.expenses:
-            if exp.category not in categories:
-                categories[exp.category] = 0
-            categories[exp.category] += exp.amount
-        return categories
+        return dict(self._category_totals)
     
     def get_person_totals(self):
         """Get total expenses by person"""
-        people = {}
-        for exp in self.expenses:
-            if exp.paid_by not in people:
-                people[exp.paid_by] = 0
-            people[exp.paid_by] += exp.amount
-        return people
+        return dict(self._person_totals)
+    
+    def get_person_counts(self):
+        """Get number of expenses paid by each person"""
+        return {person: self._counts[('person', person)] for person in self._person_totals}
+    
+    def get_currency_totals(self):
+        """Get total expenses by original currency"""
+        return dict(self._currency_totals)
+    
+    def get_category_currency_totals(self):
+        """Get total expenses by category, broken down by original currency"""
+        return {cat: dict(totals) for cat, totals in self._category_currency_totals.items()}
+    
+    def get_daily_totals(self):
+        """Get (number of expenses, total) per day"""
+        return {day: (self._counts[('day', day)], total) for day, total in self._daily_totals.items()}
+    
+    def get_daily_currency_totals(self):
+        """Get totals per day, broken down by original currency"""
+        return {day: dict(totals) for day, totals in self._daily_currency_totals.items()}
+    
+    def get_category_daily_currency_totals(self):
+        """Get totals per category and day, broken down by original currency"""
+        return {
+            cat: {day: dict(totals) for day, totals in days.items()}
+            for cat, days in self._category_daily_currency_totals.items()
+        }
+    
+    def _traveler_names(self):
+        return [traveler.name for traveler in self.trip.travelers] if self.trip else []
+    
+    def _ledger_rate(self, converter):
+        """Get rate(currency, day) into the trip currency for the debt ledger, or None to sum as-is"""
+        if converter is None or not self.trip:
+            return None
+        to_currency = self.trip.currency
+        return lambda currency, day: converter.dated_rate(day, currency, to_currency)
+    
+    def get_paid_totals(self, converter=None):
+        """Get what each person paid, in the trip currency when given a CurrencyConverter"""
+        return self._ledger.paid(self._ledger_rate(converter))
+    
+    def get_balances(self, converter=None):
+        """Get paid minus fair share per person, honoring each expense's split_with
+        
+        With a CurrencyConverter every expense counts in the trip currency at its own date.
+        """
+        return self._ledger.balances(self._traveler_names(), self._ledger_rate(converter))
+    
+    def get_fair_shares(self, converter=None):
+        """Get each person's fair share of the expenses, honoring split_with"""
+        return self._ledger.shares(self._traveler_names(), self._ledger_rate(converter))
+    
+    def get_debts(self, converter=None):
+        """Get net pairwise debts as {(debtor, creditor): amount}"""
+        return self._ledger.debts(self._traveler_names(), self._ledger_rate(converter))
     
     def export_to_json(self, filename):
         """Export expenses to JSON"""
@@ -69,138 +419,130 @@ class ExpenseService:
             return
         
         with open(filename, 'w', newline='', encoding='utf-8') as f:
-            fieldnames = ['date', 'description', 'amount', 'currency', 
-                         'converted_amount', 'trip_currency', 'category', 'paid_by']
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            
-            writer.writeheader()
-            for exp in self.expenses:
-                row = {
-                    'date': exp.date,
-                    'description': exp.description,
-                    'amount': exp.amount,
-                    'currency': exp.currency,
-                    'converted_amount': exp.amount if self.trip and exp.currency == self.trip.currency else '',
-                    'trip_currency': self.trip.currency if self.trip else '',
-                    'category': exp.category,
-                    'paid_by': exp.paid_by
-                }
-                writer.writerow(row)
+            for chunk in self.stream_csv():
+                f.write(chunk)
+    
+    def stream_csv(self, batch_rows=1000):
+        """Yield the expenses as CSV text, the header first and then a batch of rows at a time"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_FIELDS)
+        yield buffer.getvalue()
+        
+        trip_currency = self.trip.currency if self.trip else ''
+        batch = []
+        for exp in self.expenses:
+            batch.append([
+                exp.date,
+                exp.description,
+                exp.amount,
+                exp.currency,
+                exp.amount if exp.currency == trip_currency else '',
+                trip_currency,
+                exp.category,
+                exp.paid_by
+            ])
+            if len(batch) >= batch_rows:
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(batch)
+                batch = []
+                yield buffer.getvalue()
+        
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+    
+    def stream_ndjson(self, batch_rows=1000):
+        """Yield the expenses as newline-delimited JSON, a batch of lines at a time"""
+        batch = []
+        for exp in self.expenses:
+            batch.append(codec.encode_expense(exp, remember=False))
+            if len(batch) >= batch_rows:
+                yield '\n'.join(batch) + '\n'
+                batch = []
+        if batch:
+            yield '\n'.join(batch) + '\n'
     
     def export_to_excel(self, filename):
         """Export expenses to Excel with summary"""
         if not self.expenses:
             return
         
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-        from openpyxl.utils import get_column_letter
-        
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Expenses"
-        
-        # Header style
-        header_fill = PatternFill(start_color="4F46E5", end_color="4F46E5", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=12)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # Add headers
+        with open(filename, 'wb') as f:
+            for chunk in self.stream_excel():
+                f.write(chunk)
+    
+    def stream_excel(self):
+        """Yield an Excel workbook of the expenses and a summary, written as it is sent"""
+        return xlsx_stream.stream_xlsx(self._excel_rows(), 'Expenses', self._excel_widths())
+    
+    def _excel_rows(self):
         headers = ['Date', 'Description', 'Amount', 'Currency', 'Category', 'Paid By']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-        
-        # Add expenses
-        for row_idx, exp in enumerate(self.expenses, 2):
-            ws.cell(row=row_idx, column=1, value=exp.date).border = border
-            ws.cell(row=row_idx, column=2, value=exp.description).border = border
-            ws.cell(row=row_idx, column=3, value=exp.amount).border = border
-            ws.cell(row=row_idx, column=4, value=exp.currency).border = border
-            ws.cell(row=row_idx, column=5, value=exp.category).border = border
-            ws.cell(row=row_idx, column=6, value=exp.paid_by).border = border
-        
-        # Add summary section
-        summary_row = len(self.expenses) + 3
-        
-        # Summary header
-        ws.cell(row=summary_row, column=1, value="SUMMARY").font = Font(bold=True, size=14)
-        summary_row += 2
-        
-        # Calculate totals by currency
-        currency_totals = {}
-        for exp in self.expenses:
-            if exp.currency not in currency_totals:
-                currency_totals[exp.currency] = 0
-            currency_totals[exp.currency] += exp.amount
+        yield [(header, xlsx_stream.HEADER) for header in headers]
         
-        # Add currency breakdown
-        ws.cell(row=summary_row, column=1, value="Total by Currency:").font = Font(bold=True)
-        summary_row += 1
+        # Take the totals now so the summary matches the rows even if the trip changes meanwhile
+        currency_totals = dict(self.get_currency_totals())
+        category_totals = dict(self.get_category_totals())
+        person_totals = dict(self.get_person_totals())
+        trip_currency = self.trip.currency if self.trip else None
         
-        for currency, total in sorted(currency_totals.items()):
-            ws.cell(row=summary_row, column=1, value=currency)
-            ws.cell(row=summary_row, column=2, value=total).number_format = '#,##0.00'
-            summary_row += 1
+        bordered = xlsx_stream.BORDERED
+        amount = xlsx_stream.BORDERED_AMOUNT
+        for exp in self.expenses:
+            yield [(exp.date, bordered), (exp.description, bordered), (exp.amount, amount),
+                   (exp.currency, bordered), (exp.category, bordered), (exp.paid_by, bordered)]
         
-        summary_row += 1
+        yield []
+        yield [("SUMMARY", xlsx_stream.TITLE)]
+        yield []
         
-        # Category breakdown
-        ws.cell(row=summary_row, column=1, value="Total by Category:").font = Font(bold=True)
-        summary_row += 1
+        yield [("Total by Currency:", xlsx_stream.BOLD)]
+        for currency, total in sorted(currency_totals.items()):
+            yield [currency, (total, xlsx_stream.AMOUNT)]
+        yield []
         
-        category_totals = self.get_category_totals()
+        yield [("Total by Category:", xlsx_stream.BOLD)]
         for category, total in sorted(category_totals.items()):
-            ws.cell(row=summary_row, column=1, value=category.capitalize())
-            ws.cell(row=summary_row, column=2, value=total).number_format = '#,##0.00'
-            if self.trip:
-                ws.cell(row=summary_row, column=3, value=self.trip.currency)
-            summary_row += 1
+            yield [category.capitalize(), (total, xlsx_stream.AMOUNT), trip_currency]
+        yield []
         
-        summary_row += 1
+        yield [("Total by Person:", xlsx_stream.BOLD)]
+        for person, total in sorted(person_totals.items()):
+            yield [person, (total, xlsx_stream.AMOUNT), trip_currency]
+    
+    def _excel_widths(self):
+        """Size the columns up front from the running totals, since they precede the rows"""
+        def money(value):
+            return len(f"{value:,.2f}")
         
-        # Person totals
-        ws.cell(row=summary_row, column=1, value="Total by Person:").font = Font(bold=True)
-        summary_row += 1
+        amounts = self._amount_keys
+        widest_amount = max(money(amounts[0]), money(amounts[-1])) if amounts else 0
+        widest_total = max((money(total) for totals in (self.get_currency_totals(), self.get_category_totals(),
+                                                        self.get_person_totals()) for total in totals.values()),
+                           default=0)
+        currencies = [len(currency) for currency in self.get_currency_totals()]
+        categories = [len(category) for category in self.get_category_totals()]
+        people = [len(person) for person in self.get_person_totals()]
+        trip_currency = len(self.trip.currency) if self.trip else 0
         
-        person_totals = self.get_person_totals()
-        for person, total in sorted(person_totals.items()):
-            ws.cell(row=summary_row, column=1, value=person)
-            ws.cell(row=summary_row, column=2, value=total).number_format = '#,##0.00'
-            if self.trip:
-                ws.cell(row=summary_row, column=3, value=self.trip.currency)
-            summary_row += 1
-        
-        # Auto-adjust column widths
-        for col in range(1, 7):
-            max_length = 0
-            column = get_column_letter(col)
-            for cell in ws[column]:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column].width = adjusted_width
-        
-        wb.save(filename)
+        column_width = xlsx_stream.column_width
+        return [
+            column_width(len('Total by Category:'), self.get_longest_text('date'), *currencies, *categories, *people),
+            column_width(len('Description'), self.get_longest_text('description'), widest_total),
+            column_width(len('Amount'), widest_amount, trip_currency),
+            column_width(len('Currency'), *currencies),
+            column_width(len('Category'), *categories),
+            column_width(len('Paid By'), *people)
+        ]
     
     def import_from_json(self, filename):
         """Import expenses from JSON"""
         with open(filename, 'r') as f:
-            data = json.load(f)
+            trip, expenses = codec.decode_trip(f.read())
         
-        if data.get("trip"):
-            from models.trip import Trip
-            self.trip = Trip.from_dict(data["trip"])
+        if trip:
+            self.trip = trip
         
-        self.expenses = [Expense.from_dict(exp) for exp in data.get("expenses", [])]
+        self.expenses = expenses
@@ -0,0 +1,336 @@
+"""
+Expense Stores - Hold a trip's expenses in insertion order, each tagged with a sequence number
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date as date_type
+from functools import lru_cache
+from itertools import compress
+from models.expense import Expense
+
+
+@lru_cache(maxsize=4096)
+def _day_text(day):
+    return date_type.fromordinal(day).isoformat()
+
+
+@lru_cache(maxsize=None)
+def _time_text(second):
+    hours, rest = divmod(second, 3600)
+    return f" {hours:02d}:{rest // 60:02d}:{rest % 60:02d}"
+
+
+class _Vocabulary:
+    """Dictionary-encode repeated strings (categories, payers, currencies) as small ints"""
+    
+    def __init__(self):
+        self.values = []
+        self.ids = {}
+    
+    def encode(self, value):
+        key = self.ids.get(value)
+        if key is None:
+            key = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return key
+
+
+class ExpenseList:
+    """Expenses kept as a plain list of Expense objects"""
+    
+    def __init__(self):
+        self._items = []
+        self._seqs = []
+        self._seq_by_id = {}
+    
+    def __len__(self):
+        return len(self._items)
+    
+    def __bool__(self):
+        return bool(self._items)
+    
+    def __iter__(self):
+        return iter(self._items)
+    
+    def __getitem__(self, index):
+        return self._items[index]
+    
+    def append(self, expense, seq):
+        """Add an expense as the last row; seq must be larger than any before it"""
+        self._items.append(expense)
+        self._seqs.append(seq)
+        self._seq_by_id[expense.id] = seq
+    
+    def pop_id(self, expense_id):
+        """Remove an expense by id, returning (seq, expense) or None"""
+        seq = self._seq_by_id.pop(expense_id, None)
+        if seq is None:
+            return None
+        index = bisect_left(self._seqs, seq)
+        del self._seqs[index]
+        return seq, self._items.pop(index)
+    
+    def get_seq(self, seq):
+        """Get the expense with a sequence number, or None"""
+        index = bisect_left(self._seqs, seq)
+        if index < len(self._seqs) and self._seqs[index] == seq:
+            return self._items[index]
+        return None
+    
+    def iter_from(self, after):
+        """Iterate (seq, expense) for rows added after sequence number after"""
+        seqs, items = self._seqs, self._items
+        return ((seqs[index], items[index]) for index in range(bisect_right(seqs, after), len(items)))
+
+
+class ColumnarExpenseStore:
+    """Expenses stored column by column; Expense objects are only built when rows are read
+    
+    Rows are kept in insertion order. Deleted rows are tombstoned and compacted away once
+    they make up half the store.
+    """
+    
+    def __init__(self):
+        self._seqs = array('Q')
+        self._ids = bytearray()
+        self._amounts = array('d')
+        self._currencies = array('I')
+        self._categories = array('I')
+        self._payers = array('I')
+        self._days = array('i')
+        self._seconds = array('i')
+        self._text = bytearray()
+        self._text_ends = array('Q')
+        self._alive = bytearray()
+        
+        self._currency_vocab = _Vocabulary()
+        self._category_vocab = _Vocabulary()
+        self._payer_vocab = _Vocabulary()
+        
+        # Rare values that don't fit a column, keyed by row
+        self._odd_ids = {}
+        self._odd_id_rows = {}
+        self._odd_dates = {}
+        self._splits = {}
+        
+        self._live = 0
+    
+    def __len__(self):
+        return self._live
+    
+    def __bool__(self):
+        return self._live > 0
+    
+    def __iter__(self):
+        rows = range(len(self._alive))
+        if self._live != len(self._alive):
+            rows = compress(rows, self._alive)
+        return self._materialize(rows)
+    
+    def __getitem__(self, index):
+        self._compact()
+        if isinstance(index, slice):
+            return list(self._materialize(range(*index.indices(self._live))))
+        if index < 0:
+            index += self._live
+        if not 0 <= index < self._live:
+            raise IndexError('expense index out of range')
+        return self._expense(index)
+    
+    def append(self, expense, seq):
+        """Add an expense as the last row; seq must be larger than any before it
+        
+        Every field is converted before any column grows, so a bad value raises without
+        leaving the columns out of step.
+        """
+        row = len(self._alive)
+        key = self._uuid_bytes(expense.id)
+        day, second = self._encode_date(expense.date)
+        amount = float(expense.amount)
+        text = expense.description.encode('utf-8')
+        if seq < 0 or (self._seqs and seq <= self._seqs[-1]):
+            raise ValueError(f"sequence number {seq} is not after the last row")
+        currency = self._currency_vocab.encode(expense.currency)
+        category = self._category_vocab.encode(expense.category)
+        payer = self._payer_vocab.encode(expense.paid_by)
+        
+        self._seqs.append(seq)
+        if key is not None:
+            self._ids += key
+        else:
+            self._ids += bytes(16)
+            self._odd_ids[row] = expense.id
+            self._odd_id_rows[expense.id] = row
+        if day is None:
+            self._odd_dates[row] = expense.date
+            day, second = 0, 0
+        self._amounts.append(amount)
+        self._currencies.append(currency)
+        self._categories.append(category)
+        self._payers.append(payer)
+        self._days.append(day)
+        self._seconds.append(second)
+        self._text += text
+        self._text_ends.append(len(self._text))
+        if expense.split_with:
+            self._splits[row] = expense.split_with
+        self._alive.append(1)
+        self._live += 1
+    
+    def pop_id(self, expense_id):
+        """Remove an expense by id, returning (seq, expense) or None"""
+        row = self._find(expense_id)
+        if row is None:
+            return None
+        seq = self._seqs[row]
+        expense = self._expense(row)
+        self._alive[row] = 0
+        self._live -= 1
+        if self._odd_ids:
+            self._odd_id_rows.pop(self._odd_ids.pop(row, None), None)
+        if len(self._alive) - self._live > max(self._live, 1024):
+            self._compact()
+        return seq, expense
+    
+    def get_seq(self, seq):
+        """Get the expense with a sequence number, or None"""
+        row = bisect_left(self._seqs, seq)
+        if row < len(self._seqs) and self._seqs[row] == seq and self._alive[row]:
+            return self._expense(row)
+        return None
+    
+    def iter_from(self, after):
+        """Iterate (seq, expense) for rows added after sequence number after"""
+        alive = self._alive
+        for row in range(bisect_right(self._seqs, after), len(alive)):
+            if alive[row]:
+                yield self._seqs[row], self._expense(row)
+    
+    def nbytes(self):
+        """Approximate memory held by the columns"""
+        arrays = (self._seqs, self._amounts, self._currencies, self._categories, self._payers,
+                  self._days, self._seconds, self._text_ends)
+        size = sum(column.itemsize * len(column) for column in arrays)
+        size += len(self._ids) + len(self._text) + len(self._alive)
+        # Side tables only hold the rare rows that don't fit the columns
+        size += 200 * (len(self._odd_ids) + len(self._odd_dates) + len(self._splits))
+        return size
+    
+    def _find(self, expense_id):
+        row = self._odd_id_rows.get(expense_id)
+        if row is not None:
+            return row if self._alive[row] else None
+        key = self._uuid_bytes(expense_id)
+        if key is None:
+            return None
+        # bytearray.find scans the id column at C speed; only 16-byte aligned hits are real ids
+        position = self._ids.find(key)
+        while position != -1:
+            row, offset = divmod(position, 16)
+            if not offset and self._alive[row] and row not in self._odd_ids:
+                return row
+            position = self._ids.find(key, position + 1)
+        return None
+    
+    @staticmethod
+    def _uuid_bytes(expense_id):
+        """Get the 16 bytes of a canonical (lowercase, hyphenated) UUID string, or None for any other id"""
+        if not isinstance(expense_id, str) or len(expense_id) != 36:
+            return None
+        try:
+            key = bytes.fromhex(expense_id.replace('-', ''))
+        except ValueError:
+            return None
+        return key if ColumnarExpenseStore._format_uuid(key) == expense_id else None
+    
+    @staticmethod
+    def _format_uuid(key):
+        text = key.hex()
+        return f"{text[:8]}-{text[8:12]}-{text[12:16]}-{text[16:20]}-{text[20:]}"
+    
+    def _expense(self, row):
+        return next(self._materialize((row,)))
+    
+    def _materialize(self, rows):
+        """Build Expense objects for rows, one at a time"""
+        # Bind everything locally once; this loop is what API responses pay per row
+        ids, text, text_ends, amounts = self._ids, self._text, self._text_ends, self._amounts
+        currencies, categories, payers = self._currencies, self._categories, self._payers
+        currency_values = self._currency_vocab.values
+        category_values = self._category_vocab.values
+        payer_values = self._payer_vocab.values
+        days, seconds, splits = self._days, self._seconds, self._splits
+        odd_ids, odd_dates = self._odd_ids, self._odd_dates
+        format_uuid, decode_date = self._format_uuid, self._decode_date
+        
+        for row in rows:
+            expense_id = odd_ids.get(row) if odd_ids else None
+            if expense_id is None:
+                expense_id = format_uuid(ids[row * 16:row * 16 + 16])
+            expense_date = odd_dates.get(row) if odd_dates else None
+            if expense_date is None:
+                expense_date = decode_date(days[row], seconds[row])
+            yield Expense(
+                text[text_ends[row - 1] if row else 0:text_ends[row]].decode('utf-8'),
+                amounts[row],
+                currency_values[currencies[row]],
+                category_values[categories[row]],
+                payer_values[payers[row]],
+                expense_date,
+                expense_id,
+                splits.get(row) if splits else None
+            )
+    
+    @staticmethod
+    def _encode_date(value):
+        """Get (day ordinal, second of day) for 'YYYY-MM-DD[ HH:MM:SS]'; second is -1 without a time"""
+        try:
+            if len(value) == 19 and value[10] == ' ' and value[13] == ':' and value[16] == ':':
+                second = int(value[11:13]) * 3600 + int(value[14:16]) * 60 + int(value[17:19])
+            elif len(value) == 10:
+                second = -1
+            else:
+                return None, None
+            if value[4] != '-' or value[7] != '-' or not value[:4].isdigit():
+                return None, None
+            day = date_type(int(value[:4]), int(value[5:7]), int(value[8:10])).toordinal()
+        except (TypeError, ValueError):
+            return None, None
+        # Only keep it columnar if it decodes back to exactly the same string
+        if ColumnarExpenseStore._decode_date(day, second) != value:
+            return None, None
+        return day, second
+    
+    @staticmethod
+    def _decode_date(day, second):
+        if second < 0:
+            return _day_text(day)
+        return _day_text(day) + _time_text(second)
+    
+    def _compact(self):
+        """Drop tombstoned rows, renumbering the side tables"""
+        if self._live == len(self._alive):
+            return
+        keep = [row for row, alive in enumerate(self._alive) if alive]
+        renumber = {row: new_row for new_row, row in enumerate(keep)}
+        
+        ids = bytearray()
+        text = bytearray()
+        text_ends = array('Q')
+        for row in keep:
+            ids += self._ids[row * 16:row * 16 + 16]
+            start = self._text_ends[row - 1] if row else 0
+            text += self._text[start:self._text_ends[row]]
+            text_ends.append(len(text))
+        self._ids, self._text, self._text_ends = ids, text, text_ends
+        
+        for name in ('_seqs', '_amounts', '_currencies', '_categories', '_payers', '_days', '_seconds'):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, (column[row] for row in keep)))
+        
+        self._odd_ids = {renumber[row]: value for row, value in self._odd_ids.items() if row in renumber}
+        self._odd_id_rows = {value: row for row, value in self._odd_ids.items()}
+        self._odd_dates = {renumber[row]: value for row, value in self._odd_dates.items() if row in renumber}
+        self._splits = {renumber[row]: value for row, value in self._splits.items() if row in renumber}
+        self._alive = bytearray(b'\x01') * len(keep)
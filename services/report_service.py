@@ -2,12 +2,17 @@
 Report Service - Generate reports and summaries
 """
 
-from collections import defaultdict
 from datetime import datetime
 from tabulate import tabulate
+from services.settlement_service import SettlementService
 
 
 class ReportService:
+    def __init__(self, settlement_service=None, converter=None):
+        self.settlement_service = settlement_service or SettlementService()
+        # Splits are worked out in the trip currency when a CurrencyConverter is given
+        self.converter = converter
+    
     def generate_summary(self, trip, expense_service):
         """Generate a trip summary"""
         total = expense_service.get_total_expenses()
@@ -50,6 +55,7 @@ Average per Expense: {total/num_expenses:.2f} {trip.currency if num_expenses > 0
     def per_person_summary(self, expense_service):
         """Generate per-person summary report"""
         person_totals = expense_service.get_person_totals()
+        person_counts = expense_service.get_person_counts()
         total = expense_service.get_total_expenses()
         
         if not person_totals:
@@ -59,7 +65,7 @@ Average per Expense: {total/num_expenses:.2f} {trip.currency if num_expenses > 0
         table_data = []
         for person, amount in sorted(person_totals.items(), key=lambda x: x[1], reverse=True):
             percentage = (amount / total * 100) if total > 0 else 0
-            num_expenses = len(expense_service.get_expenses_by_person(person))
+            num_expenses = person_counts[person]
             table_data.append([person, f"{amount:.2f}", num_expenses, f"{percentage:.1f}%"])
         
         return "\n" + tabulate(
@@ -70,23 +76,16 @@ Average per Expense: {total/num_expenses:.2f} {trip.currency if num_expenses > 0
     
     def daily_expenses(self, expense_service):
         """Generate daily expenses report"""
-        expenses = expense_service.get_all_expenses()
+        daily = expense_service.get_daily_totals()
         
-        if not expenses:
+        if not daily:
             return "\nNo expenses to report."
         
-        # Group by date
-        daily = defaultdict(list)
-        for exp in expenses:
-            date = exp.date.split()[0]  # Get just the date part
-            daily[date].append(exp)
-        
         # Prepare table data
         table_data = []
         for date in sorted(daily.keys()):
-            day_expenses = daily[date]
-            day_total = sum(exp.amount for exp in day_expenses)
-            table_data.append([date, len(day_expenses), f"{day_total:.2f}"])
+            day_count, day_total = daily[date]
+            table_data.append([date, day_count, f"{day_total:.2f}"])
         
         return "\n" + tabulate(
             table_data,
@@ -99,20 +98,9 @@ Average per Expense: {total/num_expenses:.2f} {trip.currency if num_expenses > 0
         if not trip.travelers:
             return "\nNo travelers to split expenses with."
         
-        person_totals = expense_service.get_person_totals()
-        total = expense_service.get_total_expenses()
-        num_people = len(trip.travelers)
-        
-        if num_people == 0:
-            return "\nNo travelers to split expenses with."
-        
-        per_person = total / num_people
-        
-        # Calculate balances
-        balances = {}
-        for traveler in trip.travelers:
-            paid = person_totals.get(traveler.name, 0)
-            balances[traveler.name] = paid - per_person
+        person_totals = expense_service.get_paid_totals(self.converter)
+        fair_shares = expense_service.get_fair_shares(self.converter)
+        balances = self.split_balances(expense_service, trip)
         
         # Prepare table data
         table_data = []
@@ -124,10 +112,40 @@ Average per Expense: {total/num_expenses:.2f} {trip.currency if num_expenses > 0
             else:
                 status = "Settled"
             
-            table_data.append([person, f"{person_totals.get(person, 0):.2f}", f"{per_person:.2f}", status])
+            table_data.append([person, f"{person_totals.get(person, 0):.2f}", f"{fair_shares.get(person, 0):.2f}", status])
         
         return "\n" + tabulate(
             table_data,
             headers=["Person", "Paid", "Fair Share", "Balance"],
             tablefmt="grid"
         )
+    
+    def split_balances(self, expense_service, trip):
+        """Get what each person paid minus their fair share; positive means they are owed"""
+        if not trip.travelers:
+            return {}
+        return expense_service.get_balances(self.converter)
+    
+    def settlement(self, expense_service, trip):
+        """Get the transfers that settle the trip"""
+        return self.settlement_service.settle(self.split_balances(expense_service, trip))
+    
+    def settlement_report(self, expense_service, trip):
+        """Generate the who-pays-whom report"""
+        if not trip.travelers:
+            return "\nNo travelers to split expenses with."
+        
+        transfers = self.settlement(expense_service, trip)['transfers']
+        if not transfers:
+            return "\nEveryone is settled up."
+        
+        table_data = [
+            [transfer['from'], transfer['to'], f"{transfer['amount']:.2f} {trip.currency}"]
+            for transfer in transfers
+        ]
+        
+        return "\n" + tabulate(
+            table_data,
+            headers=["From", "To", "Amount"],
+            tablefmt="grid"
+        )
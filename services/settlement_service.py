@@ -0,0 +1,129 @@
+"""
+Settlement Service - Work out who should pay whom to settle a trip
+"""
+
+import heapq
+import os
+import time
+
+
+class SettlementService:
+    """Turn per-person balances into a short list of transfers"""
+    
+    def __init__(self, exact_max_people=None, time_budget_ms=None):
+        self.exact_max_people = exact_max_people if exact_max_people is not None else \
+            int(os.environ.get('SETTLEMENT_EXACT_MAX_PEOPLE', 14))
+        self.time_budget_ms = time_budget_ms if time_budget_ms is not None else \
+            float(os.environ.get('SETTLEMENT_TIME_BUDGET_MS', 50))
+    
+    def settle(self, balances):
+        """Get the transfers settling {person: balance}, where positive means the person is owed money
+        
+        Small groups get the exact minimum number of transfers; large groups, or an exact
+        search that runs out of time, get the greedy plan (at most one transfer per person).
+        """
+        started = time.perf_counter()
+        cents = self._to_cents(balances)
+        people = [person for person, amount in cents.items() if amount != 0]
+        
+        transfers = None
+        method = 'greedy'
+        if len(people) <= self.exact_max_people:
+            deadline = started + self.time_budget_ms / 1000
+            transfers = self._exact(people, cents, deadline)
+            if transfers is not None:
+                method = 'exact'
+        if transfers is None:
+            transfers = self._greedy(people, cents)
+        
+        return {
+            'transfers': [
+                {'from': debtor, 'to': creditor, 'amount': amount / 100}
+                for debtor, creditor, amount in transfers
+            ],
+            'method': method,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 3)
+        }
+    
+    @staticmethod
+    def _to_cents(balances):
+        """Round balances to cents, pushing the rounding residue onto the largest balance"""
+        cents = {person: int(round(amount * 100)) for person, amount in balances.items()}
+        residue = sum(cents.values())
+        if residue and cents:
+            largest = max(cents, key=lambda person: (abs(cents[person]), person))
+            cents[largest] -= residue
+        return cents
+    
+    @staticmethod
+    def _greedy(people, cents):
+        """Repeatedly let the biggest debtor pay the biggest creditor"""
+        creditors = [(-cents[person], person) for person in people if cents[person] > 0]
+        debtors = [(cents[person], person) for person in people if cents[person] < 0]
+        heapq.heapify(creditors)
+        heapq.heapify(debtors)
+        
+        transfers = []
+        while creditors and debtors:
+            owed, creditor = heapq.heappop(creditors)
+            owes, debtor = heapq.heappop(debtors)
+            amount = min(-owed, -owes)
+            transfers.append((debtor, creditor, amount))
+            if -owed > amount:
+                heapq.heappush(creditors, (owed + amount, creditor))
+            if -owes > amount:
+                heapq.heappush(debtors, (owes + amount, debtor))
+        return transfers
+    
+    def _exact(self, people, cents, deadline):
+        """Fewest transfers: split people into the most zero-sum groups, each settled with size - 1 transfers
+        
+        Returns None when the deadline passes first.
+        """
+        count = len(people)
+        if count == 0:
+            return []
+        amounts = [cents[person] for person in people]
+        full = (1 << count) - 1
+        
+        # sums[mask] is the total balance of a subset; groups[mask] the most zero-sum groups it splits into
+        sums = [0] * (full + 1)
+        groups = [0] * (full + 1)
+        for mask in range(1, full + 1):
+            if not mask & 0x3ff and time.perf_counter() > deadline:
+                return None
+            low = mask & -mask
+            sums[mask] = sums[mask ^ low] + amounts[low.bit_length() - 1]
+            best = 0
+            rest = mask
+            while rest:
+                bit = rest & -rest
+                rest ^= bit
+                if groups[mask ^ bit] > best:
+                    best = groups[mask ^ bit]
+            groups[mask] = best + (1 if sums[mask] == 0 else 0)
+        
+        # Peel people off in an order that keeps the optimum, then cut wherever the running sum is zero
+        order = []
+        mask = full
+        while mask:
+            target = groups[mask] - (1 if sums[mask] == 0 else 0)
+            rest = mask
+            while rest:
+                bit = rest & -rest
+                rest ^= bit
+                if groups[mask ^ bit] == target:
+                    break
+            order.append(bit.bit_length() - 1)
+            mask ^= bit
+        
+        transfers = []
+        group = []
+        running = 0
+        for index in reversed(order):
+            group.append(people[index])
+            running += amounts[index]
+            if running == 0:
+                transfers.extend(self._greedy(group, cents))
+                group = []
+        return transfers
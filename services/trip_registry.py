@@ -0,0 +1,151 @@
+"""
+Trip Registry - Keep live trips in memory with LRU eviction
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+
+# Rough per-object footprints used to estimate how much memory a trip holds.
+# Measured with tracemalloc on typical expenses; cheap to apply on every access.
+TRIP_BASE_BYTES = 4096
+TRAVELER_BYTES = 512
+EXPENSE_BYTES = 600
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class TripRegistry:
+    """Registry of live trips keyed by trip_id, evicting least recently used trips"""
+
+    def __init__(self, loader, max_bytes=None):
+        if max_bytes is None:
+            max_bytes = int(os.environ.get('TRIP_REGISTRY_MAX_BYTES', DEFAULT_MAX_BYTES))
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self._trips = OrderedDict()
+        self._sizes = {}
+        # Per-trip counters only for resident trips; the totals also cover trips that never loaded
+        self._counters = {}
+        self._hits = 0
+        self._misses = 0
+        self._total_bytes = 0
+        self._evictions = 0
+        self._lock = threading.RLock()
+
+    def get(self, trip_id):
+        """Get the ExpenseService for a trip, loading it on a miss"""
+        if not trip_id:
+            return None
+
+        with self._lock:
+            service = self._trips.get(trip_id)
+            if service is not None:
+                self._hits += 1
+                self._counters[trip_id]['hits'] += 1
+                self._trips.move_to_end(trip_id)
+                self._resize(trip_id)
+                return service
+            self._misses += 1
+
+        # Load outside the lock so a slow backend doesn't block other trips
+        service = self.loader(trip_id)
+        if service is None or service.trip is None:
+            return None
+
+        with self._lock:
+            # Another request may have loaded the same trip meanwhile
+            existing = self._trips.get(trip_id)
+            if existing is not None:
+                self._counters[trip_id]['misses'] += 1
+                self._trips.move_to_end(trip_id)
+                return existing
+            self._insert(trip_id, service)
+            self._counters[trip_id]['misses'] += 1
+            return service
+
+    def put(self, service):
+        """Register an ExpenseService under its trip id"""
+        trip_id = service.trip.id
+        with self._lock:
+            counters = self._counters.get(trip_id)
+            if trip_id in self._trips:
+                self._discard(trip_id)
+            self._insert(trip_id, service)
+            if counters is not None:
+                # Replacing a resident trip keeps its history
+                self._counters[trip_id] = counters
+        return service
+
+    def touch(self, trip_id):
+        """Re-estimate a trip's footprint after it was mutated"""
+        with self._lock:
+            if trip_id in self._trips:
+                self._trips.move_to_end(trip_id)
+                self._resize(trip_id)
+
+    def evict(self, trip_id):
+        """Drop a trip from memory"""
+        with self._lock:
+            if trip_id in self._trips:
+                self._discard(trip_id)
+                return True
+        return False
+
+    def __contains__(self, trip_id):
+        with self._lock:
+            return trip_id in self._trips
+
+    def __len__(self):
+        with self._lock:
+            return len(self._trips)
+
+    def stats(self):
+        """Get registry occupancy, hit/miss totals and the counters of each resident trip"""
+        with self._lock:
+            return {
+                'live_trips': len(self._trips),
+                'estimated_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'trips': {trip_id: dict(counters) for trip_id, counters in self._counters.items()}
+            }
+
+    def _insert(self, trip_id, service):
+        self._trips[trip_id] = service
+        self._sizes[trip_id] = 0
+        self._counters[trip_id] = {'hits': 0, 'misses': 0}
+        self._resize(trip_id)
+
+    def _resize(self, trip_id):
+        size = self._estimate_bytes(self._trips[trip_id])
+        self._total_bytes += size - self._sizes[trip_id]
+        self._sizes[trip_id] = size
+        self._evict_over_budget(keep=trip_id)
+
+    def _discard(self, trip_id):
+        del self._trips[trip_id]
+        self._total_bytes -= self._sizes.pop(trip_id)
+        self._counters.pop(trip_id, None)
+
+    def _evict_over_budget(self, keep):
+        while self._total_bytes > self.max_bytes and len(self._trips) > 1:
+            oldest = next(iter(self._trips))
+            if oldest == keep:
+                # The trip in use is the only one left worth keeping
+                break
+            self._discard(oldest)
+            self._evictions += 1
+
+    @staticmethod
+    def _estimate_bytes(service):
+        trip = service.trip
+        travelers = len(trip.travelers) if trip else 0
+        if service.columnar:
+            expense_bytes = service.expenses.nbytes()
+        else:
+            expense_bytes = len(service.expenses) * EXPENSE_BYTES
+        return TRIP_BASE_BYTES + travelers * TRAVELER_BYTES + expense_bytes
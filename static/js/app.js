@@ -131,11 +131,9 @@ function setupTabs() {
             btn.classList.add('active');
             document.getElementById(tabName).classList.add('active');
             
-            // Load data for reports tab
-            if (tabName === 'reports') {
-                loadReports();
-            } else if (tabName === 'split') {
-                loadSplitReport();
+            // Reports and split come with the dashboard; refresh in case someone else changed the trip
+            if (tabName === 'reports' || tabName === 'split') {
+                refreshDashboard();
             }
         });
     });
@@ -190,8 +188,7 @@ function showDashboard() {
     // Populate expense currency dropdown with trip currency as default
     populateExpenseCurrency();
     
-    updateSummary();
-    loadTravelers();
+    refreshDashboard();
     loadExpenses();
 }
 
@@ -288,8 +285,7 @@ async function handleTravelerAdd(e) {
         
         if (data.success) {
             travelerForm.reset();
-            loadTravelers();
-            updatePaidByDropdown();
+            refreshDashboard();
             showNotification('Traveler added!', 'success');
         } else {
             showNotification('Error adding traveler: ' + data.error, 'error');
@@ -299,55 +295,42 @@ async function handleTravelerAdd(e) {
     }
 }
 
-// Load Travelers
-async function loadTravelers() {
-    try {
-        const response = await fetch('/api/travelers');
-        const data = await response.json();
-        
-        if (data.success) {
-            const travelersList = document.getElementById('travelersList');
-            
-            if (data.travelers.length === 0) {
-                travelersList.innerHTML = '<p class="empty-state">No travelers yet. Add travelers above!</p>';
-            } else {
-                travelersList.innerHTML = data.travelers.map(traveler => `
-                    <div class="traveler-item">
-                        <div class="traveler-info">
-                            <div class="traveler-name"><i class="fas fa-user"></i> ${traveler.name}</div>
-                            <div class="traveler-email">${traveler.email || 'No email provided'}</div>
-                        </div>
-                    </div>
-                `).join('');
-            }
-            
-            updatePaidByDropdown();
-            updateSummary();
-        }
-    } catch (error) {
-        console.error('Error loading travelers:', error);
+// Render Travelers
+function renderTravelers(travelers) {
+    const travelersList = document.getElementById('travelersList');
+    
+    if (travelers.length === 0) {
+        travelersList.innerHTML = '<p class="empty-state">No travelers yet. Add travelers above!</p>';
+    } else {
+        travelersList.innerHTML = travelers.map(traveler => `
+            <div class="traveler-item">
+                <div class="traveler-info">
+                    <div class="traveler-name"><i class="fas fa-user"></i> ${traveler.name}</div>
+                    <div class="traveler-email">${traveler.email || 'No email provided'}</div>
+                </div>
+            </div>
+        `).join('');
     }
+    
+    updatePaidByDropdown(travelers);
 }
 
 // Update Paid By Dropdown
-async function updatePaidByDropdown() {
-    try {
-        const response = await fetch('/api/travelers');
-        const data = await response.json();
-        
-        if (data.success) {
-            const paidBySelect = document.getElementById('paidBy');
-            paidBySelect.innerHTML = '<option value="">Select traveler...</option>';
-            
-            data.travelers.forEach(traveler => {
-                const option = document.createElement('option');
-                option.value = traveler.name;
-                option.textContent = traveler.name;
-                paidBySelect.appendChild(option);
-            });
-        }
-    } catch (error) {
-        console.error('Error updating paid by dropdown:', error);
+function updatePaidByDropdown(travelers) {
+    const paidBySelect = document.getElementById('paidBy');
+    const selected = paidBySelect.value;
+    paidBySelect.innerHTML = '<option value="">Select traveler...</option>';
+    
+    travelers.forEach(traveler => {
+        const option = document.createElement('option');
+        option.value = traveler.name;
+        option.textContent = traveler.name;
+        paidBySelect.appendChild(option);
+    });
+    
+    // Keep the choice in progress across refreshes
+    if (travelers.some(traveler => traveler.name === selected)) {
+        paidBySelect.value = selected;
     }
 }
 
@@ -387,7 +370,7 @@ async function handleExpenseAdd(e) {
         if (data.success) {
             expenseForm.reset();
             loadExpenses();
-            updateSummary();
+            refreshDashboard();
             showNotification('Expense added!', 'success');
         } else {
             showNotification('Error adding expense: ' + data.error, 'error');
@@ -397,63 +380,38 @@ async function handleExpenseAdd(e) {
     }
 }
 
-// Load Expenses
-async function loadExpenses() {
+// Load Expenses, a page at a time
+const EXPENSE_PAGE_SIZE = 100;
+let expensesCursor = null;
+
+async function loadExpenses(append = false) {
     try {
-        const response = await fetch('/api/expenses');
+        let url = `/api/expenses?limit=${EXPENSE_PAGE_SIZE}`;
+        if (append && expensesCursor !== null) {
+            url += `&cursor=${expensesCursor}`;
+        }
+        const response = await fetch(url);
         const data = await response.json();
         
         if (data.success) {
             const expensesList = document.getElementById('expensesList');
+            expensesCursor = data.next_cursor;
+            document.getElementById('loadMoreExpenses')?.remove();
             
-            if (data.expenses.length === 0) {
+            if (!append && data.expenses.length === 0) {
                 expensesList.innerHTML = '<p class="empty-state">No expenses yet. Add your first expense above!</p>';
             } else {
-                expensesList.innerHTML = data.expenses.map(expense => {
-                const categoryEmoji = {
-                    food: '🍽️',
-                    groceries: '🛒',
-                    snacks: '🍿',
-                    transport: '🚗',
-                    accommodation: '🏨',
-                    activities: '🎭',
-                    shopping: '🛍️',
-                    other: '📦'
-                };
+                const html = data.expenses.map(renderExpense).join('');
+                if (append) {
+                    expensesList.insertAdjacentHTML('beforeend', html);
+                } else {
+                    expensesList.innerHTML = html;
+                }
                 
-                // Get emoji or default for custom categories
-                const emoji = categoryEmoji[expense.category] || '📦';                    // Convert to trip currency if different
-                    let displayAmount = expense.amount;
-                    let conversionNote = '';
-                    if (expense.currency !== currentCurrency && exchangeRates[expense.currency] && exchangeRates[currentCurrency]) {
-                        const convertedAmount = (expense.amount / exchangeRates[expense.currency]) * exchangeRates[currentCurrency];
-                        conversionNote = ` (≈ ${convertedAmount.toFixed(2)} ${currentCurrency})`;
-                    }
-                    
-                    return `
-                        <div class="expense-item">
-                            <div class="expense-info">
-                                <div class="expense-title">
-                                    ${emoji} ${expense.description}
-                                </div>
-                                <div class="expense-meta">
-                                    <span class="category-badge category-${expense.category}">
-                                        ${expense.category}
-                                    </span>
-                                    Paid by ${expense.paid_by} • ${new Date(expense.date).toLocaleDateString()}
-                                </div>
-                            </div>
-                            <div class="expense-amount">
-                                ${expense.amount.toFixed(2)} ${expense.currency}${conversionNote}
-                            </div>
-                            <div class="expense-actions">
-                                <button class="icon-btn" onclick="deleteExpense('${expense.id}')">
-                                    <i class="fas fa-trash"></i>
-                                </button>
-                            </div>
-                        </div>
-                    `;
-                }).join('');
+                if (expensesCursor !== null) {
+                    expensesList.insertAdjacentHTML('beforeend',
+                        '<button id="loadMoreExpenses" class="btn btn-secondary" onclick="loadExpenses(true)">Load more</button>');
+                }
             }
         }
     } catch (error) {
@@ -461,6 +419,54 @@ async function loadExpenses() {
     }
 }
 
+function renderExpense(expense) {
+    const categoryEmoji = {
+        food: '🍽️',
+        groceries: '🛒',
+        snacks: '🍿',
+        transport: '🚗',
+        accommodation: '🏨',
+        activities: '🎭',
+        shopping: '🛍️',
+        other: '📦'
+    };
+    
+    // Get emoji or default for custom categories
+    const emoji = categoryEmoji[expense.category] || '📦';
+    
+    // Convert to trip currency if different
+    let displayAmount = expense.amount;
+    let conversionNote = '';
+    if (expense.currency !== currentCurrency && exchangeRates[expense.currency] && exchangeRates[currentCurrency]) {
+        const convertedAmount = (expense.amount / exchangeRates[expense.currency]) * exchangeRates[currentCurrency];
+        conversionNote = ` (≈ ${convertedAmount.toFixed(2)} ${currentCurrency})`;
+    }
+    
+    return `
+        <div class="expense-item">
+            <div class="expense-info">
+                <div class="expense-title">
+                    ${emoji} ${expense.description}
+                </div>
+                <div class="expense-meta">
+                    <span class="category-badge category-${expense.category}">
+                        ${expense.category}
+                    </span>
+                    Paid by ${expense.paid_by} • ${new Date(expense.date).toLocaleDateString()}
+                </div>
+            </div>
+            <div class="expense-amount">
+                ${expense.amount.toFixed(2)} ${expense.currency}${conversionNote}
+            </div>
+            <div class="expense-actions">
+                <button class="icon-btn" onclick="deleteExpense('${expense.id}')">
+                    <i class="fas fa-trash"></i>
+                </button>
+            </div>
+        </div>
+    `;
+}
+
 // Delete Expense
 async function deleteExpense(expenseId) {
     if (!confirm('Are you sure you want to delete this expense?')) {
@@ -476,7 +482,7 @@ async function deleteExpense(expenseId) {
         
         if (data.success) {
             loadExpenses();
-            updateSummary();
+            refreshDashboard();
             showNotification('Expense deleted!', 'success');
         } else {
             showNotification('Error deleting expense: ' + data.error, 'error');
@@ -486,173 +492,156 @@ async function deleteExpense(expenseId) {
     }
 }
 
-// Update Summary
-async function updateSummary() {
+// Refresh Dashboard - summary, travelers, reports and split in one request
+async function refreshDashboard() {
+    if (!currentTrip) {
+        return;
+    }
+    
     try {
-        const response = await fetch('/api/reports/summary');
+        const response = await fetch(`/api/trips/${currentTrip.id}/dashboard`);
         const data = await response.json();
         
         if (data.success) {
-            const summary = data.summary;
-            
-            // Show currency breakdown first (original currencies)
-            let totalText = '';
-            if (summary.currency_breakdown && Object.keys(summary.currency_breakdown).length > 0) {
-                const breakdown = Object.entries(summary.currency_breakdown)
-                    .map(([curr, amt]) => `${amt.toFixed(2)} ${curr}`)
-                    .join(' + ');
-                totalText = breakdown;
-            }
-            
-            // Add converted total in default currency below
-            totalText += `<br><small style="font-size: 0.8rem; opacity: 0.9; font-weight: 600;">= ${summary.total_expenses.toFixed(2)} ${summary.currency}</small>`;
-            
-            // Auto-convert to saved conversion currency
-            if (savedConversion && savedConversion.to && exchangeRates[summary.currency] && exchangeRates[savedConversion.to]) {
-                const convertedTotal = summary.total_expenses * (exchangeRates[savedConversion.to] / exchangeRates[summary.currency]);
-                const toFlag = currencies.find(c => c.code === savedConversion.to)?.flag || '';
-                totalText += `<br><small style="font-size: 0.85rem; opacity: 0.95; font-weight: 700; color: #fbbf24;">≈ ${toFlag} ${convertedTotal.toFixed(2)} ${savedConversion.to}</small>`;
-            }
-            
-            document.getElementById('totalExpenses').innerHTML = totalText;
-            document.getElementById('expenseCount').textContent = summary.num_expenses;
-        }
-        
-        // Update traveler count
-        const travelersResponse = await fetch('/api/travelers');
-        const travelersData = await travelersResponse.json();
-        if (travelersData.success) {
-            document.getElementById('travelerCount').textContent = travelersData.travelers.length;
+            renderSummary(data.summary, data.trip.travelers.length);
+            renderTravelers(data.trip.travelers);
+            renderCategoryReport(data.categories);
+            renderPeopleReport(data.people);
+            renderSplitReport(data.split);
         }
     } catch (error) {
-        console.error('Error updating summary:', error);
+        console.error('Error refreshing dashboard:', error);
     }
 }
 
-// Load Reports
-async function loadReports() {
-    await loadCategoryReport();
-    await loadPeopleReport();
+// Render Summary
+function renderSummary(summary, travelerCount) {
+    // Show currency breakdown first (original currencies)
+    let totalText = '';
+    if (summary.currency_breakdown && Object.keys(summary.currency_breakdown).length > 0) {
+        const breakdown = Object.entries(summary.currency_breakdown)
+            .map(([curr, amt]) => `${amt.toFixed(2)} ${curr}`)
+            .join(' + ');
+        totalText = breakdown;
+    }
+    
+    // Add converted total in default currency below
+    const tripTotal = summary.converted_total ?? summary.total_expenses;
+    totalText += `<br><small style="font-size: 0.8rem; opacity: 0.9; font-weight: 600;">= ${tripTotal.toFixed(2)} ${summary.currency}</small>`;
+    
+    // Auto-convert to saved conversion currency
+    if (savedConversion && savedConversion.to && exchangeRates[summary.currency] && exchangeRates[savedConversion.to]) {
+        const convertedTotal = tripTotal * (exchangeRates[savedConversion.to] / exchangeRates[summary.currency]);
+        const toFlag = currencies.find(c => c.code === savedConversion.to)?.flag || '';
+        totalText += `<br><small style="font-size: 0.85rem; opacity: 0.95; font-weight: 700; color: #fbbf24;">≈ ${toFlag} ${convertedTotal.toFixed(2)} ${savedConversion.to}</small>`;
+    }
+    
+    document.getElementById('totalExpenses').innerHTML = totalText;
+    document.getElementById('expenseCount').textContent = summary.num_expenses;
+    document.getElementById('travelerCount').textContent = travelerCount;
 }
 
 // Category Report
-async function loadCategoryReport() {
-    try {
-        const response = await fetch('/api/reports/categories');
-        const data = await response.json();
-        
-        if (data.success) {
-            const categoryReport = document.getElementById('categoryReport');
-            
-            if (data.categories.length === 0) {
-                categoryReport.innerHTML = '<p class="empty-state">No expenses to report</p>';
-            } else {
-                categoryReport.innerHTML = data.categories.map(cat => {
-                    // Build currency breakdown display
-                    let currencyBreakdown = '';
-                    if (cat.currency_breakdown && Object.keys(cat.currency_breakdown).length > 0) {
-                        const breakdown = Object.entries(cat.currency_breakdown)
-                            .map(([curr, amt]) => `${amt.toFixed(2)} ${curr}`)
-                            .join(' + ');
-                        currencyBreakdown = `<div style="font-size: 0.7rem; color: var(--text-secondary); margin-top: 0.25rem;">${breakdown}</div>`;
-                    }
-                    
-                    return `
-                        <div class="report-item">
-                            <div style="flex: 1;">
-                                <div class="report-label">${cat.category.charAt(0).toUpperCase() + cat.category.slice(1)}</div>
-                                ${currencyBreakdown}
-                                <div class="progress-bar">
-                                    <div class="progress-fill" style="width: ${cat.percentage}%"></div>
-                                </div>
-                            </div>
-                            <div style="text-align: right;">
-                                <span class="report-value">${cat.amount.toFixed(2)} ${currentTrip.currency}</span>
-                                <span class="report-percentage">${cat.percentage}%</span>
-                            </div>
-                        </div>
-                    `;
-                }).join('');
-            }
-        }
-    } catch (error) {
-        console.error('Error loading category report:', error);
+function renderCategoryReport(categories) {
+    const categoryReport = document.getElementById('categoryReport');
+    
+    if (categories.length === 0) {
+        categoryReport.innerHTML = '<p class="empty-state">No expenses to report</p>';
+        return;
     }
+    
+    categoryReport.innerHTML = categories.map(cat => {
+        // Build currency breakdown display
+        let currencyBreakdown = '';
+        if (cat.currency_breakdown && Object.keys(cat.currency_breakdown).length > 0) {
+            const breakdown = Object.entries(cat.currency_breakdown)
+                .map(([curr, amt]) => `${amt.toFixed(2)} ${curr}`)
+                .join(' + ');
+            currencyBreakdown = `<div style="font-size: 0.7rem; color: var(--text-secondary); margin-top: 0.25rem;">${breakdown}</div>`;
+        }
+        
+        return `
+            <div class="report-item">
+                <div style="flex: 1;">
+                    <div class="report-label">${cat.category.charAt(0).toUpperCase() + cat.category.slice(1)}</div>
+                    ${currencyBreakdown}
+                    <div class="progress-bar">
+                        <div class="progress-fill" style="width: ${cat.percentage}%"></div>
+                    </div>
+                </div>
+                <div style="text-align: right;">
+                    <span class="report-value">${cat.amount.toFixed(2)} ${currentTrip.currency}</span>
+                    <span class="report-percentage">${cat.percentage}%</span>
+                </div>
+            </div>
+        `;
+    }).join('');
 }
 
 // People Report
-async function loadPeopleReport() {
-    try {
-        const response = await fetch('/api/reports/people');
-        const data = await response.json();
-        
-        if (data.success) {
-            const peopleReport = document.getElementById('peopleReport');
-            
-            if (data.people.length === 0) {
-                peopleReport.innerHTML = '<p class="empty-state">No expenses to report</p>';
-            } else {
-                peopleReport.innerHTML = data.people.map(person => `
-                    <div class="report-item">
-                        <div>
-                            <div class="report-label">${person.person}</div>
-                            <div class="progress-bar">
-                                <div class="progress-fill" style="width: ${person.percentage}%"></div>
-                            </div>
-                        </div>
-                        <div>
-                            <span class="report-value">${person.amount.toFixed(2)} ${currentTrip.currency}</span>
-                            <span class="report-percentage">${person.num_expenses} expenses</span>
-                        </div>
-                    </div>
-                `).join('');
-            }
-        }
-    } catch (error) {
-        console.error('Error loading people report:', error);
+function renderPeopleReport(people) {
+    const peopleReport = document.getElementById('peopleReport');
+    
+    if (people.length === 0) {
+        peopleReport.innerHTML = '<p class="empty-state">No expenses to report</p>';
+        return;
     }
+    
+    peopleReport.innerHTML = people.map(person => `
+        <div class="report-item">
+            <div>
+                <div class="report-label">${person.person}</div>
+                <div class="progress-bar">
+                    <div class="progress-fill" style="width: ${person.percentage}%"></div>
+                </div>
+            </div>
+            <div>
+                <span class="report-value">${person.amount.toFixed(2)} ${currentTrip.currency}</span>
+                <span class="report-percentage">${person.num_expenses} expenses</span>
+            </div>
+        </div>
+    `).join('');
 }
 
 // Split Report
-async function loadSplitReport() {
-    try {
-        const response = await fetch('/api/reports/split');
-        const data = await response.json();
-        
-        const splitReport = document.getElementById('splitReport');
-        
-        if (!data.success) {
-            splitReport.innerHTML = `<p class="empty-state">${data.error}</p>`;
-            return;
-        }
+function renderSplitReport(split) {
+    const splitReport = document.getElementById('splitReport');
+    
+    if (split.balances.length === 0) {
+        splitReport.innerHTML = '<p class="empty-state">No travelers to split expenses</p>';
+        return;
+    }
+    
+    splitReport.innerHTML = split.balances.map(balance => {
+        const statusClass = balance.status === 'owed' ? 'split-owed' : 
+                          balance.status === 'owes' ? 'split-owes' : 'split-settled';
+        const statusText = balance.status === 'owed' ? `Owed ${Math.abs(balance.balance).toFixed(2)}` :
+                         balance.status === 'owes' ? `Owes ${Math.abs(balance.balance).toFixed(2)}` :
+                         'Settled';
         
-        if (data.balances.length === 0) {
-            splitReport.innerHTML = '<p class="empty-state">No travelers to split expenses</p>';
-        } else {
-            splitReport.innerHTML = data.balances.map(balance => {
-                const statusClass = balance.status === 'owed' ? 'split-owed' : 
-                                  balance.status === 'owes' ? 'split-owes' : 'split-settled';
-                const statusText = balance.status === 'owed' ? `Owed ${Math.abs(balance.balance).toFixed(2)}` :
-                                 balance.status === 'owes' ? `Owes ${Math.abs(balance.balance).toFixed(2)}` :
-                                 'Settled';
-                
-                return `
-                    <div class="split-item">
-                        <div>
-                            <div style="font-weight: 600; margin-bottom: 0.5rem;">${balance.person}</div>
-                            <div style="color: var(--text-secondary); font-size: 0.875rem;">
-                                Paid: ${balance.paid.toFixed(2)} • Fair Share: ${balance.fair_share.toFixed(2)}
-                            </div>
-                        </div>
-                        <div class="split-status ${statusClass}">
-                            ${statusText}
-                        </div>
+        return `
+            <div class="split-item">
+                <div>
+                    <div style="font-weight: 600; margin-bottom: 0.5rem;">${balance.person}</div>
+                    <div style="color: var(--text-secondary); font-size: 0.875rem;">
+                        Paid: ${balance.paid.toFixed(2)} • Fair Share: ${balance.fair_share.toFixed(2)}
                     </div>
-                `;
-            }).join('');
-        }
-    } catch (error) {
-        console.error('Error loading split report:', error);
+                </div>
+                <div class="split-status ${statusClass}">
+                    ${statusText}
+                </div>
+            </div>
+        `;
+    }).join('');
+    
+    // Who pays whom to settle up
+    if (split.transfers && split.transfers.length > 0) {
+        splitReport.innerHTML += split.transfers.map(transfer => `
+            <div class="split-item">
+                <div style="font-weight: 600;">${transfer.from} → ${transfer.to}</div>
+                <div class="split-status split-owes">${transfer.amount.toFixed(2)}</div>
+            </div>
+        `).join('');
     }
 }
 
@@ -880,30 +869,68 @@ function handleExportModalOpen() {
     exportModal.style.display = 'block';
 }
 
-// Export as Excel
+// Run an export as a background job, then download its file
+async function runExportJob(format, label) {
+    // Save first, so whichever server instance runs the job can load the trip
+    const saveResponse = await fetch('/api/save', {
+        method: 'POST'
+    });
+    const saveData = await saveResponse.json();
+    if (!saveData.success) {
+        throw new Error('Error saving trip: ' + saveData.error);
+    }
+    
+    const response = await fetch('/api/export/jobs', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ trip_id: currentTrip.id, format: format })
+    });
+    const data = await response.json();
+    if (!data.success) {
+        throw new Error(data.error);
+    }
+    
+    showNotification(`Generating ${label} file...`, 'success');
+    let job = data.job;
+    let delay = 250;
+    while (job.status === 'queued' || job.status === 'running') {
+        // Plain polling with backoff, so waiting never ties up a server worker
+        await new Promise(resolve => setTimeout(resolve, delay));
+        delay = Math.min(delay * 2, 2000);
+        const statusResponse = await fetch(`/api/export/jobs/${job.id}`);
+        const statusData = await statusResponse.json();
+        if (!statusData.success) {
+            throw new Error(statusData.error);
+        }
+        job = statusData.job;
+    }
+    
+    if (job.status !== 'done') {
+        throw new Error(job.error || `Export ${job.status}`);
+    }
+    window.location.href = `/api/export/jobs/${job.id}/download`;
+}
+
+// Export Excel
 async function exportExcel() {
+    exportModal.style.display = 'none';
     try {
-        // First save the current trip
-        const saveResponse = await fetch('/api/save', {
-            method: 'POST'
-        });
-        
-        const saveData = await saveResponse.json();
-        
-        if (saveData.success) {
-            showNotification('Generating Excel file...', 'success');
-            setTimeout(() => {
-                window.location.href = `/api/export/excel/${currentTrip.id}`;
-            }, 500);
-            exportModal.style.display = 'none';
-        } else {
-            showNotification('Error saving trip: ' + saveData.error, 'error');
-        }
+        await runExportJob('excel', 'Excel');
     } catch (error) {
         showNotification('Error exporting Excel: ' + error.message, 'error');
     }
 }
 
+// Export CSV
+async function exportCSV() {
+    exportModal.style.display = 'none';
+    try {
+        await runExportJob('csv', 'CSV');
+    } catch (error) {
+        showNotification('Error exporting CSV: ' + error.message, 'error');
+    }
+}
+
 // Export as PDF Summary
 async function exportPDF() {
     try {
@@ -935,7 +962,7 @@ async function exportPDF() {
                     </div>
                     <h2>Summary</h2>
                     <div class="summary-box">
-                        <p><strong>Total Expenses:</strong> ${data.summary.total_expenses.toFixed(2)} ${currentTrip.currency}</p>
+                        <p><strong>Total Expenses:</strong> ${(data.summary.converted_total ?? data.summary.total_expenses).toFixed(2)} ${currentTrip.currency}</p>
                         <p><strong>Number of Expenses:</strong> ${data.summary.num_expenses}</p>
                         <p><strong>Average per Expense:</strong> ${data.summary.average_expense.toFixed(2)} ${currentTrip.currency}</p>
                     </div>
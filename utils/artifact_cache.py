@@ -0,0 +1,137 @@
+"""
+Artifact Cache - Keep generated export files by (trip_id, content version, format) under a byte budget
+"""
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+STALE_PART_SECONDS = 3600
+
+
+class ArtifactCache:
+    """Export files on disk, evicted least recently used first once they exceed max_bytes
+    
+    Recency is the file's modification time, refreshed on every hit, so every process
+    sharing the directory evicts by the same order.
+    """
+    
+    def __init__(self, directory, max_bytes=None):
+        if max_bytes is None:
+            max_bytes = int(os.environ.get('EXPORT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self._bytes = 0
+        # Adopt what earlier runs left behind, so a restart doesn't lift the budget
+        self._evict_over_budget()
+    
+    def name(self, key):
+        """Get the file name an artifact is stored under"""
+        return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+    
+    def path(self, key):
+        return os.path.join(self.directory, self.name(key))
+    
+    def get(self, key):
+        """Get the path of a cached artifact, or None"""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return path
+    
+    def store(self, key, chunks):
+        """Pass chunks through while writing them to the cache; the artifact only counts once complete
+        
+        If the consumer stops early (e.g. a client disconnects), the partial file is dropped.
+        """
+        path = self.path(key)
+        partial = f"{path}.{uuid.uuid4().hex[:8]}.part"
+        completed = False
+        try:
+            with open(partial, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+                    yield chunk
+            os.replace(partial, path)
+            completed = True
+        finally:
+            if not completed and os.path.exists(partial):
+                os.remove(partial)
+        
+        self._count('stores')
+        self._evict_over_budget(keep=path)
+    
+    def fetch(self, key, chunk_size=64 * 1024):
+        """Get a cached artifact as an iterator of chunks, or None"""
+        path = self.path(key)
+        try:
+            # Open right away: once open, the file stays readable even if it is evicted
+            f = open(path, 'rb')
+            os.utime(path)
+        except OSError:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return self._read(f, chunk_size)
+    
+    @staticmethod
+    def _read(f, chunk_size):
+        with f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+    
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, bytes=self._bytes, max_bytes=self.max_bytes)
+    
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+    
+    def _evict_over_budget(self, keep=None):
+        """Delete the least recently used artifacts until the directory fits max_bytes"""
+        with self._lock:
+            entries = []
+            stale = time.time() - STALE_PART_SECONDS
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                    if name.endswith('.part'):
+                        # Still being written, unless its writer died long ago
+                        if stat.st_mtime < stale:
+                            os.remove(path)
+                        continue
+                except OSError:
+                    # Evicted by another process meanwhile
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+            
+            total = sum(size for _, _, size in entries)
+            for _, path, size in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                self._counters['evictions'] += 1
+            self._bytes = total
@@ -2,18 +2,92 @@
 Currency Converter Utility
 """
 
+import json
+import os
+import threading
 import requests
 from datetime import datetime, timedelta
+from utils.rate_history import RateHistory
 
 
 class CurrencyConverter:
-    def __init__(self):
+    def __init__(self, cache_file=None, rates_file=None):
         self.rates = {}
+        self.cross_rates = {}
         self.last_update = None
         self.base_currency = "USD"
+        # Bumped whenever rates change, so responses derived from them can be revalidated
+        self.revision = 0
+        
+        # Last good snapshot on disk, so cold starts don't wait on the provider
+        if cache_file is None:
+            default_dir = '/tmp/data' if os.environ.get('VERCEL') else 'data'
+            cache_file = os.environ.get('RATES_CACHE_FILE', os.path.join(default_dir, 'exchange_rates.json'))
+        self.cache_file = cache_file
+        
+        # A fixed rates file (e.g. for tests) disables fetching altogether
+        self.rates_file = rates_file or os.environ.get('EXCHANGE_RATES_FILE')
+        self.retry_after = timedelta(seconds=float(os.environ.get('RATES_RETRY_SECONDS', 300)))
+        
+        self.source = None
+        self.refresh_failures = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+        self._last_attempt = None
+        self._refresh_thread = None
+        self._refresh_lock = threading.Lock()
+        
+        # Rates by day, so expenses can be converted at their own dates
+        self.history = RateHistory()
+        history_file = os.environ.get('EXCHANGE_RATES_HISTORY_FILE')
+        if history_file:
+            self.load_rate_history(history_file)
+        
+        if self.rates_file:
+            self._load_snapshot(self.rates_file, 'offline')
+        else:
+            self._load_snapshot(self.cache_file, 'cache')
+    
+    def _load_snapshot(self, path, source):
+        """Load rates saved by save_snapshot (or an offline rates file)"""
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            self.base_currency = data.get("base", self.base_currency)
+            fetched_at = data.get("fetched_at")
+            self.last_update = datetime.fromisoformat(fetched_at) if fetched_at else datetime.now()
+            self._set_rates(data.get("rates", {}))
+            self.source = source
+            return True
+        except Exception as e:
+            print(f"Error loading exchange rates from {path}: {e}")
+            return False
+    
+    def save_snapshot(self):
+        """Save the current rates with their timestamp"""
+        directory = os.path.dirname(self.cache_file)
+        try:
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            tmp_file = self.cache_file + '.tmp'
+            with open(tmp_file, 'w') as f:
+                json.dump({
+                    "base": self.base_currency,
+                    "rates": self.rates,
+                    "fetched_at": self.last_update.isoformat()
+                }, f)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            print(f"Error saving exchange rates: {e}")
     
     def fetch_rates(self):
         """Fetch latest exchange rates from API"""
+        if self.rates_file:
+            return False
+        
+        self._last_attempt = datetime.now()
         try:
             # Using a free API for exchange rates
             url = f"https://api.exchangerate-api.com/v4/latest/{self.base_currency}"
@@ -21,68 +95,238 @@ class CurrencyConverter:
             
             if response.status_code == 200:
                 data = response.json()
-                self.rates = data.get("rates", {})
                 self.last_update = datetime.now()
+                self._set_rates(data.get("rates", {}))
+                self.source = 'network'
+                self.consecutive_failures = 0
+                self.save_snapshot()
                 return True
             else:
+                self._record_failure(f"HTTP {response.status_code}")
                 print(f"Failed to fetch rates: {response.status_code}")
                 return False
         except Exception as e:
+            self._record_failure(str(e))
             print(f"Error fetching exchange rates: {e}")
             return False
     
+    def _set_rates(self, rates):
+        """Swap in new rates and rebuild the cross-rate matrix"""
+        # Build complete dicts first so concurrent readers never see a partial update
+        cross_rates = {}
+        for from_currency, rate_from in rates.items():
+            if not rate_from:
+                continue
+            cross_rates[from_currency] = {
+                to_currency: rate_to / rate_from for to_currency, rate_to in rates.items()
+            }
+        self.cross_rates = cross_rates
+        self.rates = rates
+        if rates and self.last_update:
+            # The current rates also count as that day's entry in the history
+            self.history.add_rates(self.last_update.strftime("%Y-%m-%d"), rates)
+        self.revision += 1
+    
+    def _cross_rate(self, from_currency, to_currency):
+        """Get the unrounded rate; unknown currencies count as 1 like convert always did"""
+        row = self.cross_rates.get(from_currency)
+        rate = row.get(to_currency) if row is not None else None
+        if rate is None:
+            rate = self.rates.get(to_currency, 1) / (self.rates.get(from_currency, 1) or 1)
+        return rate
+    
+    def load_rate_history(self, path):
+        """Import historical rates from a CSV or JSON file"""
+        try:
+            loaded = self.history.load_file(path)
+            self.revision += 1
+            return loaded
+        except Exception as e:
+            print(f"Error loading rate history from {path}: {e}")
+            return 0
+    
+    def _record_failure(self, error):
+        self.refresh_failures += 1
+        self.consecutive_failures += 1
+        self.last_error = error
+    
     def should_update_rates(self):
         """Check if rates need to be updated (older than 1 day)"""
+        if self.rates_file:
+            return False
         if not self.last_update:
             return True
         return datetime.now() - self.last_update > timedelta(days=1)
     
+    def _ensure_rates(self, wait=True):
+        """Make rates available, refreshing stale ones in the background
+        
+        Only the very first fetch blocks, and only with wait; report paths pass wait=False and
+        make do with the history (or 1:1) until the background fetch lands.
+        """
+        if not self.should_update_rates():
+            return
+        if self._last_attempt and datetime.now() - self._last_attempt < self.retry_after:
+            # Don't hammer a failing provider on every conversion
+            return
+        
+        if not self.rates and wait:
+            # Nothing to serve yet, so this first fetch has to block
+            with self._refresh_lock:
+                if not self.rates:
+                    self.fetch_rates()
+            return
+        
+        self.refresh_in_background()
+    
+    def refresh_if_stale(self):
+        """Start fetching rates in the background if they are missing or stale, without waiting"""
+        self._ensure_rates(wait=False)
+    
+    def refresh_in_background(self):
+        """Start fetching new rates while the current snapshot keeps being served"""
+        with self._refresh_lock:
+            if self._refresh_thread and self._refresh_thread.is_alive():
+                return False
+            self._last_attempt = datetime.now()
+            self._refresh_thread = threading.Thread(target=self.fetch_rates, name='rates-refresh', daemon=True)
+            self._refresh_thread.start()
+            return True
+    
+    def stats(self):
+        """Get the age and origin of the rates being served, and refresh failures"""
+        age = (datetime.now() - self.last_update).total_seconds() if self.last_update else None
+        return {
+            'base_currency': self.base_currency,
+            'rates_available': bool(self.rates),
+            'source': self.source,
+            'last_update': self.last_update.isoformat() if self.last_update else None,
+            'rate_age_seconds': round(age, 1) if age is not None else None,
+            'stale': self.should_update_rates(),
+            'refreshing': bool(self._refresh_thread and self._refresh_thread.is_alive()),
+            'refresh_failures': self.refresh_failures,
+            'consecutive_failures': self.consecutive_failures,
+            'last_error': self.last_error,
+            'revision': self.revision,
+            'history': self.history.stats()
+        }
+    
     def convert(self, amount, from_currency, to_currency):
         """Convert amount from one currency to another"""
         if from_currency == to_currency:
             return amount
         
         # Update rates if needed
-        if self.should_update_rates():
-            self.fetch_rates()
+        self._ensure_rates()
         
         if not self.rates:
             print("Warning: No exchange rates available. Using 1:1 conversion.")
             return amount
         
         try:
-            # Convert from source currency to base currency (USD)
-            if from_currency != self.base_currency:
-                amount_in_base = amount / self.rates.get(from_currency, 1)
-            else:
-                amount_in_base = amount
-            
-            # Convert from base currency to target currency
-            if to_currency != self.base_currency:
-                result = amount_in_base * self.rates.get(to_currency, 1)
-            else:
-                result = amount_in_base
-            
-            return round(result, 2)
+            return round(amount * self._cross_rate(from_currency, to_currency), 2)
         except Exception as e:
             print(f"Error converting currency: {e}")
             return amount
     
+    def convert_batch(self, amounts, from_currencies, to_currencies):
+        """Convert many amounts at once; either currency argument may be a single code"""
+        count = len(amounts)
+        if isinstance(from_currencies, str):
+            from_currencies = [from_currencies] * count
+        if isinstance(to_currencies, str):
+            to_currencies = [to_currencies] * count
+        if len(from_currencies) != count or len(to_currencies) != count:
+            raise ValueError("amounts and currencies must have the same length")
+        
+        self._ensure_rates()
+        
+        if not self.rates:
+            print("Warning: No exchange rates available. Using 1:1 conversion.")
+            return list(amounts)
+        
+        # Look each distinct pair up once, however many amounts share it
+        pair_rates = {}
+        results = []
+        for amount, from_currency, to_currency in zip(amounts, from_currencies, to_currencies):
+            if from_currency == to_currency:
+                results.append(amount)
+                continue
+            pair = (from_currency, to_currency)
+            rate = pair_rates.get(pair)
+            if rate is None:
+                rate = pair_rates[pair] = self._cross_rate(from_currency, to_currency)
+            results.append(round(amount * rate, 2))
+        return results
+    
+    def convert_totals(self, totals, to_currency):
+        """Convert per-currency totals (e.g. ExpenseService.get_currency_totals) into one total"""
+        currencies = list(totals)
+        converted = self.convert_batch([totals[c] for c in currencies], currencies, to_currency)
+        return round(sum(converted), 2)
+    
+    def convert_expenses(self, expenses, to_currency):
+        """Convert expenses into to_currency at the rates of each expense's own date"""
+        self._ensure_rates()
+        return self.history.convert_dated(
+            ((exp.amount, exp.currency, exp.date) for exp in expenses),
+            to_currency, fallback=self._cross_rate
+        )
+    
+    def convert_dated_totals(self, daily_currency_totals, to_currency):
+        """Convert {day: {currency: total}} (e.g. ExpenseService.get_daily_currency_totals) into one total
+        
+        Used by reports, so it never waits on the network.
+        """
+        self._ensure_rates(wait=False)
+        converted = self.history.convert_dated(
+            ((total, currency, day)
+             for day, totals in daily_currency_totals.items()
+             for currency, total in totals.items()),
+            to_currency, fallback=self._cross_rate
+        )
+        return round(sum(converted), 2)
+    
+    def dated_rate(self, date, from_currency, to_currency):
+        """Get the unrounded rate in effect on a date, from the history or else the current rates
+        
+        Used by reports, so it never waits on the network.
+        """
+        if from_currency == to_currency:
+            return 1.0
+        self._ensure_rates(wait=False)
+        rate = self.history.rate_on(date, from_currency, to_currency)
+        if rate is None:
+            rate = self._cross_rate(from_currency, to_currency)
+        return rate
+    
+    def get_cross_rates(self, currencies=None):
+        """Get the cross-rate matrix, optionally limited to some currencies"""
+        self._ensure_rates()
+        
+        if currencies is None:
+            currencies = list(self.cross_rates)
+        return {
+            from_currency: {
+                to_currency: 1.0 if from_currency == to_currency
+                else round(self._cross_rate(from_currency, to_currency), 4)
+                for to_currency in currencies
+            }
+            for from_currency in currencies
+        }
+    
     def get_rate(self, from_currency, to_currency):
         """Get exchange rate between two currencies"""
         if from_currency == to_currency:
             return 1.0
         
-        if self.should_update_rates():
-            self.fetch_rates()
+        self._ensure_rates()
         
         if not self.rates:
             return 1.0
         
         try:
-            rate_from = self.rates.get(from_currency, 1)
-            rate_to = self.rates.get(to_currency, 1)
-            return round(rate_to / rate_from, 4)
+            return round(self._cross_rate(from_currency, to_currency), 4)
         except Exception as e:
             print(f"Error getting exchange rate: {e}")
             return 1.0
@@ -4,17 +4,96 @@ Database utilities for persistent storage using Supabase
 
 import os
 import json
-from typing import Optional, List, Dict
+import random
+import threading
+import time
+from typing import Any, Optional, List, Dict
 import requests
+from requests.adapters import HTTPAdapter
+
+
+# Methods that can be retried without risking a duplicate write
+IDEMPOTENT_METHODS = {'GET', 'PATCH', 'DELETE'}
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+# Expense rows fetched per request; must not exceed PostgREST's max-rows (1000 by default)
+EXPENSE_PAGE_ROWS = 1000
+# Expense ids per DELETE request, keeping the id=in.(...) query string short
+DELETE_CHUNK_IDS = 100
+
+
+class CircuitBreaker:
+    """Stop calling an unhealthy backend until a cool-down has passed"""
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._lock = threading.Lock()
+    
+    def allow_request(self) -> bool:
+        """Check whether a call may go through, letting one probe in after the cool-down"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+    
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'trips': self.trips
+            }
 
 
 class Database:
     """Database manager for trip data storage"""
     
+    name = 'Supabase'
+    
     def __init__(self):
         self.supabase_url = os.environ.get('SUPABASE_URL')
         self.supabase_key = os.environ.get('SUPABASE_KEY')
         
+        # (connect, read) timeouts in seconds so a hung backend can't block a worker
+        self.timeout = (
+            float(os.environ.get('SUPABASE_CONNECT_TIMEOUT', 3.05)),
+            float(os.environ.get('SUPABASE_READ_TIMEOUT', 10))
+        )
+        self.max_retries = int(os.environ.get('SUPABASE_MAX_RETRIES', 2))
+        self.backoff_base = float(os.environ.get('SUPABASE_BACKOFF_BASE', 0.2))
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.environ.get('SUPABASE_BREAKER_THRESHOLD', 5)),
+            reset_timeout=float(os.environ.get('SUPABASE_BREAKER_RESET', 30))
+        )
+        self._latency = {}
+        self._latency_lock = threading.Lock()
+        
         if not self.supabase_url or not self.supabase_key:
             print("Warning: Supabase credentials not configured. Using fallback mode.")
             self.enabled = False
@@ -26,46 +105,126 @@ class Database:
                 'Content-Type': 'application/json',
                 'Prefer': 'return=representation'
             }
+            
+            # Keep-alive connection pool shared by all requests of this worker
+            pool_size = int(os.environ.get('SUPABASE_POOL_SIZE', 10))
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.session = requests.Session()
+            self.session.mount('https://', adapter)
+            self.session.mount('http://', adapter)
+            self.session.headers.update(self.headers)
     
-    def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None, params: Optional[Dict] = None) -> Optional[Dict]:
+    @property
+    def healthy(self) -> bool:
+        """Whether requests are currently being sent to the backend"""
+        return self.enabled and self.breaker.state != CircuitBreaker.OPEN
+    
+    def _make_request(self, method: str, endpoint: str, data: Optional[Any] = None, params: Optional[Dict] = None,
+                      prefer: Optional[str] = None) -> Optional[Dict]:
         """Make a request to Supabase API"""
         if not self.enabled:
             return None
         
+        if not self.breaker.allow_request():
+            # Fail fast while the backend is unhealthy
+            return None
+        
+        url = f"{self.supabase_url}/rest/v1/{endpoint}"
+        headers = None
+        if prefer:
+            headers = {'Prefer': f"{self.headers['Prefer']},{prefer}"}
+        
+        # Upserts resolve conflicts on the primary key, so they are safe to repeat too
+        idempotent = method in IDEMPOTENT_METHODS or 'merge-duplicates' in (prefer or '')
+        attempts = 1 + (self.max_retries if idempotent else 0)
+        
+        # Every request that got past the breaker must report back to it, or a half-open
+        # breaker would wait for a probe result forever
+        healthy = False
         try:
-            url = f"{self.supabase_url}/rest/v1/{endpoint}"
-            
-            if method == 'GET':
-                response = requests.get(url, headers=self.headers, params=params)
-            elif method == 'POST':
-                response = requests.post(url, headers=self.headers, json=data)
-            elif method == 'PATCH':
-                response = requests.patch(url, headers=self.headers, json=data, params=params)
-            elif method == 'DELETE':
-                response = requests.delete(url, headers=self.headers, params=params)
-            else:
-                return None
-            
-            if response.status_code in [200, 201]:
-                result = response.json()
-                return result if isinstance(result, list) else result
-            else:
+            for attempt in range(attempts):
+                if attempt:
+                    # Exponential backoff with full jitter
+                    time.sleep(random.uniform(0, self.backoff_base * (2 ** attempt)))
+                
+                started = time.perf_counter()
+                try:
+                    response = self.session.request(method, url, headers=headers, json=data, params=params,
+                                                    timeout=self.timeout)
+                    result = response.json() if response.status_code in [200, 201] else None
+                except ValueError as e:
+                    # Includes a body that isn't JSON (a proxy error page, a cut-off response)
+                    self._record_latency(method, endpoint, started, error=True)
+                    print(f"Database returned an invalid response: {str(e)}")
+                    continue
+                except requests.RequestException as e:
+                    self._record_latency(method, endpoint, started, error=True)
+                    print(f"Database request failed: {str(e)}")
+                    continue
+                
+                failed = response.status_code >= 500 or response.status_code in RETRYABLE_STATUS_CODES
+                self._record_latency(method, endpoint, started, error=failed)
+                
+                if response.status_code in [200, 201]:
+                    healthy = True
+                    return result
+                
                 print(f"Database error: {response.status_code} - {response.text}")
-                return None
-        except Exception as e:
-            print(f"Database request failed: {str(e)}")
+                if not failed:
+                    # The backend answered; a client error won't get better by retrying
+                    healthy = True
+                    return None
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    break
+            
             return None
+        finally:
+            if healthy:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+    
+    def _record_latency(self, method: str, endpoint: str, started: float, error: bool = False):
+        """Accumulate per-endpoint latency counters"""
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        key = f"{method} {endpoint}"
+        with self._latency_lock:
+            counters = self._latency.get(key)
+            if counters is None:
+                counters = self._latency[key] = {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+            counters['count'] += 1
+            counters['errors'] += 1 if error else 0
+            counters['total_ms'] += elapsed_ms
+            counters['max_ms'] = max(counters['max_ms'], elapsed_ms)
+    
+    def stats(self) -> Dict:
+        """Get circuit breaker state and per-endpoint latency counters"""
+        with self._latency_lock:
+            endpoints = {
+                key: {
+                    'count': c['count'],
+                    'errors': c['errors'],
+                    'avg_ms': round(c['total_ms'] / c['count'], 2) if c['count'] else 0.0,
+                    'max_ms': round(c['max_ms'], 2)
+                }
+                for key, c in self._latency.items()
+            }
+        return {
+            'healthy': self.healthy,
+            'circuit_breaker': self.breaker.stats(),
+            'endpoints': endpoints
+        }
     
-    def save_trip(self, trip_data: Dict, expenses: List[Dict]) -> bool:
-        """Save or update a trip with its expenses"""
+    def save_trip(self, trip_data: Dict, expenses: Optional[List[Dict]] = None) -> bool:
+        """Save or update a trip; when expenses are given they become the trip's full set of rows
+        
+        Rows are upserted first, then rows of expenses no longer in the set are deleted.
+        """
         if not self.enabled:
             return False
         
         trip_id = trip_data['id']
         
-        # Check if trip exists
-        existing = self._make_request('GET', 'trips', params={'id': f'eq.{trip_id}'})
-        
         data_to_save = {
             'id': trip_id,
             'name': trip_data['name'],
@@ -74,20 +233,126 @@ class Database:
             'end_date': trip_data['end_date'],
             'currency': trip_data['currency'],
             'travelers': json.dumps(trip_data.get('travelers', [])),
-            'expenses': json.dumps(expenses),
             'created_at': trip_data.get('created_at'),
             'updated_at': trip_data.get('updated_at')
         }
+        # Let column defaults and triggers fill in missing timestamps
+        data_to_save = {key: value for key, value in data_to_save.items() if value is not None}
         
-        if existing and len(existing) > 0:
-            # Update existing trip
-            result = self._make_request('PATCH', 'trips', data=data_to_save, params={'id': f'eq.{trip_id}'})
-        else:
-            # Insert new trip
-            result = self._make_request('POST', 'trips', data=data_to_save)
+        # Insert or update in a single round trip
+        result = self._make_request('POST', 'trips', data=data_to_save, params={'on_conflict': 'id'},
+                                    prefer='resolution=merge-duplicates')
+        
+        if result is None:
+            return False
+        
+        if expenses is None:
+            return True
+        if expenses and not self._upsert_expense_rows(trip_id, expenses):
+            return False
+        return self._delete_other_expense_rows(trip_id, {exp['id'] for exp in expenses})
+    
+    def add_expense(self, trip_id: str, expense: Dict) -> bool:
+        """Insert a single expense row"""
+        if not self.enabled:
+            return False
+        
+        result = self._make_request('POST', 'expenses', data=self._expense_row(trip_id, expense))
+        return result is not None
+    
+    def delete_expense(self, trip_id: str, expense_id: str) -> bool:
+        """Delete a single expense row"""
+        if not self.enabled:
+            return False
+        
+        result = self._make_request('DELETE', 'expenses', params={
+            'id': f'eq.{expense_id}',
+            'trip_id': f'eq.{trip_id}'
+        })
+        return result is not None
+    
+    def delete_expenses(self, trip_id: str, expense_ids: List[str]) -> bool:
+        """Delete many expense rows in one request"""
+        if not self.enabled:
+            return False
+        
+        result = self._make_request('DELETE', 'expenses', params={
+            'id': f"in.({','.join(self._quote_filter_value(expense_id) for expense_id in expense_ids)})",
+            'trip_id': f'eq.{trip_id}'
+        })
+        return result is not None
+    
+    @staticmethod
+    def _quote_filter_value(value: str) -> str:
+        """Double-quote a value for a PostgREST list filter, so commas and parentheses stay inside it"""
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"')
+        return f'"{escaped}"'
+    
+    def upsert_expenses(self, trip_id: str, expenses: List[Dict]) -> bool:
+        """Insert or update many expense rows in one request"""
+        if not self.enabled:
+            return False
+        
+        return self._upsert_expense_rows(trip_id, expenses)
+    
+    def _upsert_expense_rows(self, trip_id: str, expenses: List[Dict]) -> bool:
+        """Insert or update many expense rows in one request"""
+        rows = [self._expense_row(trip_id, exp) for exp in expenses]
+        result = self._make_request('POST', 'expenses', data=rows, params={'on_conflict': 'id'},
+                                    prefer='resolution=merge-duplicates')
+        return result is not None
+    
+    @staticmethod
+    def _expense_row(trip_id: str, expense: Dict) -> Dict:
+        """Map an expense dictionary onto an expenses table row"""
+        return {
+            'id': expense['id'],
+            'trip_id': trip_id,
+            'description': expense['description'],
+            'amount': expense['amount'],
+            'currency': expense['currency'],
+            'category': expense['category'],
+            'paid_by': expense['paid_by'],
+            'date': expense['date'],
+            'split_with': json.dumps(expense.get('split_with', []))
+        }
+    
+    @staticmethod
+    def _expense_from_row(row: Dict) -> Dict:
+        """Map an expenses table row back onto an expense dictionary"""
+        return {
+            'id': row['id'],
+            'description': row['description'],
+            'amount': row['amount'],
+            'currency': row['currency'],
+            'category': row['category'],
+            'paid_by': row['paid_by'],
+            'date': row['date'],
+            'split_with': json.loads(row.get('split_with') or '[]')
+        }
+    
+    def _migrate_legacy_expenses(self, trip_id: str, legacy_expenses: List[Dict]) -> bool:
+        """Move a trip's legacy expenses blob into expense rows"""
+        if legacy_expenses and not self._upsert_expense_rows(trip_id, legacy_expenses):
+            return False
         
+        result = self._make_request('PATCH', 'trips', data={'expenses': '[]'}, params={'id': f'eq.{trip_id}'})
         return result is not None
     
+    def migrate_legacy_expenses(self) -> int:
+        """Migrate every trip still storing expenses in the blob column, returning how many were migrated"""
+        if not self.enabled:
+            return 0
+        
+        result = self._make_request('GET', 'trips', params={'select': 'id,expenses', 'expenses': 'neq.[]'})
+        
+        migrated = 0
+        for trip in result or []:
+            legacy_expenses = json.loads(trip.get('expenses') or '[]')
+            if self._migrate_legacy_expenses(trip['id'], legacy_expenses):
+                migrated += 1
+        return migrated
+    
     def load_trip(self, trip_id: str) -> Optional[Dict]:
         """Load a trip by ID"""
         if not self.enabled:
@@ -99,27 +364,72 @@ class Database:
             trip = result[0]
             # Parse JSON fields
             trip['travelers'] = json.loads(trip.get('travelers', '[]'))
-            trip['expenses'] = json.loads(trip.get('expenses', '[]'))
+            legacy_expenses = json.loads(trip.pop('expenses', None) or '[]')
+            
+            rows = self._load_expense_rows(trip_id)
+            if rows is None:
+                return None
+            expenses = [self._expense_from_row(row) for row in rows]
+            
+            if legacy_expenses:
+                # Trip predates the expenses table: migrate it on first load
+                known = {exp['id'] for exp in expenses}
+                expenses = [exp for exp in legacy_expenses if exp['id'] not in known] + expenses
+                self._migrate_legacy_expenses(trip_id, legacy_expenses)
+            
+            trip['expenses'] = expenses
             return trip
         
         return None
     
+    def _delete_other_expense_rows(self, trip_id: str, keep_ids: set) -> bool:
+        """Delete the trip's expense rows whose ids are not in keep_ids"""
+        rows = self._load_expense_rows(trip_id, select='id,seq')
+        if rows is None:
+            return False
+        stale = [row['id'] for row in rows if row['id'] not in keep_ids]
+        for start in range(0, len(stale), DELETE_CHUNK_IDS):
+            if not self.delete_expenses(trip_id, stale[start:start + DELETE_CHUNK_IDS]):
+                return False
+        return True
+    
+    def _load_expense_rows(self, trip_id: str, select: Optional[str] = None) -> Optional[List[Dict]]:
+        """Get all expense rows of a trip a page at a time, or None if any page fails"""
+        rows = []
+        last_seq = None
+        while True:
+            params = {'trip_id': f'eq.{trip_id}', 'order': 'seq.asc', 'limit': EXPENSE_PAGE_ROWS}
+            if select:
+                params['select'] = select
+            if last_seq is not None:
+                params['seq'] = f'gt.{last_seq}'
+            page = self._make_request('GET', 'expenses', params=params)
+            if page is None:
+                # Never hand back a partial trip
+                return None
+            rows.extend(page)
+            if len(page) < EXPENSE_PAGE_ROWS:
+                return rows
+            last_seq = page[-1]['seq']
+    
     def list_trips(self) -> List[Dict]:
         """List all trips"""
         if not self.enabled:
             return []
         
-        result = self._make_request('GET', 'trips', params={'order': 'created_at.desc'})
+        # Count expense rows server-side instead of downloading them
+        result = self._make_request('GET', 'trips', params={
+            'select': 'id,name,destination,start_date,end_date,currency,travelers,created_at,updated_at,'
+                      'expense_rows:expenses(count)',
+            'order': 'created_at.desc'
+        })
         
         if result:
             # Parse JSON fields for each trip
             for trip in result:
                 trip['travelers'] = json.loads(trip.get('travelers', '[]'))
-                # Don't load full expenses list for listing view
-                expense_count = len(json.loads(trip.get('expenses', '[]')))
-                trip['expense_count'] = expense_count
-                # Remove expenses to reduce payload
-                trip.pop('expenses', None)
+                expense_rows = trip.pop('expense_rows', None) or [{'count': 0}]
+                trip['expense_count'] = expense_rows[0]['count']
             return result
         
         return []
@@ -145,8 +455,13 @@ class Database:
 _db_instance = None
 
 def get_database() -> Database:
-    """Get or create database instance"""
+    """Get or create database instance, selected by the STORAGE_BACKEND environment variable"""
     global _db_instance
     if _db_instance is None:
-        _db_instance = Database()
+        backend = os.environ.get('STORAGE_BACKEND', 'supabase').lower()
+        if backend == 'sqlite':
+            from utils.sqlite_database import SQLiteDatabase
+            _db_instance = SQLiteDatabase()
+        else:
+            _db_instance = Database()
     return _db_instance
@@ -0,0 +1,232 @@
+"""
+Export Jobs - Run exports on a small worker pool and hand out the files by job id
+"""
+
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+
+
+FINISHED = ('done', 'failed')
+
+_JOB_ID = re.compile(r'[0-9a-f]{32}')
+
+
+class ExportQueueFull(Exception):
+    """Raised when too many exports are already waiting"""
+
+
+class ExportJobQueue:
+    """Bounded queue of export jobs, run by a fixed number of worker threads
+    
+    Files are written to an ArtifactCache keyed by (trip_id, version, format), so an export of
+    an unchanged trip is served from there instead of being queued again. Each job's status is
+    mirrored to a JSON file, so whichever worker process serves a status or download request
+    can answer it.
+    """
+    
+    def __init__(self, export_dir, cache, max_workers=None, max_queued=None, ttl_seconds=None):
+        self.export_dir = export_dir
+        self.cache = cache
+        self.max_workers = max_workers if max_workers is not None else \
+            int(os.environ.get('EXPORT_WORKERS', 1))
+        self.max_queued = max_queued if max_queued is not None else \
+            int(os.environ.get('EXPORT_QUEUE_SIZE', 8))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else \
+            float(os.environ.get('EXPORT_JOB_TTL_SECONDS', 3600))
+        os.makedirs(export_dir, exist_ok=True)
+        
+        self._queue = queue.Queue(maxsize=self.max_queued)
+        self._jobs = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(self._lock)
+        self._workers = []
+        self._counters = {'submitted': 0, 'cached': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+    
+    def submit(self, trip_id, version, export_format, filename, mimetype, produce):
+        """Queue an export of one trip version and get its job status; produce() returns the chunks
+        
+        A version already in the cache gets a finished job right away, and one that is still
+        queued or running is shared rather than repeated. Raises ExportQueueFull when max_queued
+        jobs are already waiting.
+        """
+        self._expire()
+        key = (trip_id, version, export_format)
+        with self._lock:
+            if key in self._inflight:
+                return dict(self._jobs[self._inflight[key]])
+            
+            now = datetime.now().isoformat()
+            job = {
+                'id': uuid.uuid4().hex,
+                'trip_id': trip_id,
+                'format': export_format,
+                'status': 'queued',
+                'cached': False,
+                'filename': filename,
+                'mimetype': mimetype,
+                'artifact': self.cache.name(key),
+                'size': None,
+                'error': None,
+                'created_at': now,
+                'started_at': None,
+                'finished_at': None
+            }
+            
+            cached = self.cache.get(key)
+            if cached is not None:
+                job.update(status='done', cached=True, size=os.path.getsize(cached),
+                           started_at=now, finished_at=now)
+                self._counters['cached'] += 1
+            else:
+                self._start_workers()
+                try:
+                    self._queue.put_nowait((job['id'], key, produce))
+                except queue.Full:
+                    self._counters['rejected'] += 1
+                    raise ExportQueueFull(f"{self.max_queued} exports are already waiting")
+                self._inflight[key] = job['id']
+                self._counters['submitted'] += 1
+            
+            self._jobs[job['id']] = job
+            self._save(job)
+            return dict(job)
+    
+    def get(self, job_id):
+        """Get a job's status, from this process or from the status file another process wrote"""
+        if not _JOB_ID.fullmatch(job_id or ''):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        try:
+            with open(self._status_path(job_id), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def wait(self, job_id, timeout):
+        """Long-poll: get the job's status once it finishes or timeout seconds have passed"""
+        deadline = time.monotonic() + timeout
+        job = self.get(job_id)
+        while job is not None and job['status'] not in FINISHED:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with self._lock:
+                if job_id in self._jobs:
+                    self._finished.wait(remaining)
+                else:
+                    # Run by another process; all we can do is re-read its status file
+                    self._finished.wait(min(remaining, 0.25))
+            job = self.get(job_id)
+        return job
+    
+    def artifact_path(self, job):
+        """Get the path of a finished job's file"""
+        return os.path.join(self.cache.directory, job['artifact'])
+    
+    def stats(self):
+        """Get queue depth, running jobs and outcome counters"""
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job['status'] == 'running')
+            return dict(
+                self._counters,
+                workers=self.max_workers,
+                max_queued=self.max_queued,
+                queued=self._queue.qsize(),
+                running=running
+            )
+    
+    def _start_workers(self):
+        # Started on first use so importing the app doesn't spin up threads
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._run, name=f'export-{len(self._workers)}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+    
+    def _run(self):
+        while True:
+            job_id, key, produce = self._queue.get()
+            try:
+                self._export(job_id, key, produce)
+            finally:
+                self._queue.task_done()
+    
+    def _export(self, job_id, key, produce):
+        with self._lock:
+            job = self._jobs[job_id]
+            job['status'] = 'running'
+            job['started_at'] = datetime.now().isoformat()
+            self._save(job)
+        
+        size = None
+        error = None
+        try:
+            for _ in self.cache.store(key, produce()):
+                pass
+            size = os.path.getsize(self.cache.path(key))
+        except Exception as e:
+            error = str(e)
+            print(f"Error running export {job_id}: {e}")
+        
+        with self._lock:
+            job['status'] = 'failed' if error else 'done'
+            job['error'] = error
+            job['size'] = size
+            job['finished_at'] = datetime.now().isoformat()
+            self._counters['failed' if error else 'completed'] += 1
+            for key in [key for key, inflight_id in self._inflight.items() if inflight_id == job_id]:
+                del self._inflight[key]
+            self._save(job)
+            self._finished.notify_all()
+    
+    def _status_path(self, job_id):
+        return os.path.join(self.export_dir, f"{job_id}.json")
+    
+    def _save(self, job):
+        """Write the status file atomically, so readers never see half of it"""
+        path = self._status_path(job['id'])
+        try:
+            with open(path + '.tmp', 'w') as f:
+                json.dump(job, f)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            print(f"Error saving export job status {job['id']}: {e}")
+    
+    def _expire(self):
+        """Forget finished jobs and delete their status files once they are older than the TTL"""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items() if job['status'] in FINISHED]:
+                try:
+                    finished = datetime.fromisoformat(self._jobs[job_id]['finished_at']).timestamp()
+                except (TypeError, ValueError):
+                    continue
+                if finished < cutoff:
+                    del self._jobs[job_id]
+        
+        try:
+            names = os.listdir(self.export_dir)
+        except OSError:
+            return
+        for name in names:
+            job_id = name.split('.')[0]
+            if not _JOB_ID.fullmatch(job_id):
+                continue
+            path = os.path.join(self.export_dir, name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                job = self.get(job_id)
+                if job is None or job['status'] in FINISHED:
+                    os.remove(path)
+            except OSError:
+                continue
@@ -0,0 +1,147 @@
+"""
+Rate History - Exchange rates by day, for converting expenses at their own dates
+"""
+
+import csv
+import json
+import threading
+from bisect import bisect_right
+
+
+class RateHistory:
+    """Daily rate sets kept in a sorted list of days, looked up with bisect"""
+    
+    def __init__(self):
+        # (sorted days, rate set of each day), swapped as one tuple so readers never see them out of step
+        self._table = ([], [])
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._table[0])
+    
+    def __bool__(self):
+        return bool(self._table[0])
+    
+    @property
+    def first_day(self):
+        days = self._table[0]
+        return days[0] if days else None
+    
+    @property
+    def last_day(self):
+        days = self._table[0]
+        return days[-1] if days else None
+    
+    def add_rates(self, day, rates):
+        """Add (or replace) the rate set of one day; rates are relative to any common base"""
+        self.add_many({day: rates})
+    
+    def add_many(self, rates_by_day):
+        """Add many days at once, re-sorting only once"""
+        with self._lock:
+            merged = dict(zip(*self._table))
+            for day, rates in rates_by_day.items():
+                merged[str(day)[:10]] = {currency: float(rate) for currency, rate in rates.items()}
+            days = sorted(merged)
+            self._table = (days, [merged[day] for day in days])
+        return len(rates_by_day)
+    
+    def load_json(self, path):
+        """Import {"rates": {day: {currency: rate}}} or a plain {day: {currency: rate}} file"""
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if isinstance(data, dict) and isinstance(data.get('rates'), dict):
+            data = data['rates']
+        if isinstance(data, list):
+            # [{"date": day, "rates": {...}}, ...]
+            data = {entry['date']: entry['rates'] for entry in data}
+        return self.add_many(data)
+    
+    def load_csv(self, path):
+        """Import a CSV with date,currency,rate rows or one column per currency"""
+        rates_by_day = {}
+        with open(path, 'r', newline='') as f:
+            reader = csv.reader(f)
+            header = [name.strip() for name in next(reader, [])]
+            columns = [name.lower() for name in header]
+            if 'date' not in columns:
+                raise ValueError(f"{path} has no date column")
+            date_col = columns.index('date')
+            long_format = 'currency' in columns and 'rate' in columns
+            for row in reader:
+                if not row:
+                    continue
+                day_rates = rates_by_day.setdefault(row[date_col].strip()[:10], {})
+                if long_format:
+                    currency = row[columns.index('currency')].strip().upper()
+                    day_rates[currency] = float(row[columns.index('rate')])
+                else:
+                    for col, value in enumerate(row):
+                        if col != date_col and value.strip():
+                            day_rates[header[col].upper()] = float(value)
+        return self.add_many(rates_by_day)
+    
+    def load_file(self, path):
+        """Import a .csv or .json rate file"""
+        if path.lower().endswith('.csv'):
+            return self.load_csv(path)
+        return self.load_json(path)
+    
+    def rates_on(self, date):
+        """Get (day, rates) in effect on a date: the latest day on or before it, else the first day"""
+        days, rates = self._table
+        if not days:
+            return None, None
+        index = max(bisect_right(days, date[:10]) - 1, 0)
+        return days[index], rates[index]
+    
+    def rate_on(self, date, from_currency, to_currency):
+        """Get the unrounded rate between two currencies on a date, or None if either is unknown"""
+        _, rates = self.rates_on(date)
+        if not rates:
+            return None
+        rate_from = rates.get(from_currency)
+        rate_to = rates.get(to_currency)
+        if not rate_from or rate_to is None:
+            return None
+        return rate_to / rate_from
+    
+    def convert_dated(self, items, to_currency, fallback=None):
+        """Convert (amount, currency, date) items into to_currency at each item's own date
+        
+        fallback(from_currency, to_currency) supplies a rate when the history has none.
+        """
+        days, rates = self._table
+        # Expenses cluster on a few days and currencies, so resolve each combination once
+        day_index = {}
+        pair_rates = {}
+        results = []
+        for amount, currency, date in items:
+            if currency == to_currency:
+                results.append(amount)
+                continue
+            day = date[:10]
+            index = day_index.get(day)
+            if index is None:
+                index = day_index[day] = max(bisect_right(days, day) - 1, 0) if days else -1
+            key = (index, currency)
+            rate = pair_rates.get(key)
+            if rate is None:
+                if index >= 0:
+                    day_rates = rates[index]
+                    rate_from = day_rates.get(currency)
+                    rate_to = day_rates.get(to_currency)
+                    if rate_from and rate_to is not None:
+                        rate = rate_to / rate_from
+                if rate is None:
+                    rate = fallback(currency, to_currency) if fallback else 1.0
+                pair_rates[key] = rate
+            results.append(round(amount * rate, 2))
+        return results
+    
+    def stats(self):
+        return {
+            'days': len(self),
+            'first_day': self.first_day,
+            'last_day': self.last_day
+        }
@@ -0,0 +1,65 @@
+"""
+Response Cache - Memoize rendered report JSON per trip version
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class ResponseCache:
+    """Rendered JSON bodies keyed by (trip_id, report), each valid for one trip version
+    
+    Only the latest version of each report is kept, so a mutation simply makes the old
+    body unreachable; least recently used entries are evicted beyond max_entries.
+    """
+    
+    def __init__(self, max_entries=None):
+        if max_entries is None:
+            max_entries = int(os.environ.get('REPORT_CACHE_ENTRIES', DEFAULT_MAX_ENTRIES))
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+    
+    def get(self, trip_id, report, version):
+        """Get the body rendered for this version, or None"""
+        key = (trip_id, report)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+    
+    def put(self, trip_id, report, version, body):
+        """Remember the body rendered for this version, replacing older versions"""
+        key = (trip_id, report)
+        with self._lock:
+            self._entries[key] = (version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body
+    
+    def get_or_render(self, trip_id, report, version, render):
+        """Get the cached body, or call render() and cache what it returns"""
+        body = self.get(trip_id, report, version)
+        if body is None:
+            body = self.put(trip_id, report, version, render())
+        return body
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self._hits,
+                'misses': self._misses
+            }
@@ -0,0 +1,300 @@
+"""
+Embedded SQLite storage with the same interface as the Supabase Database
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional, List, Dict
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trips (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    travelers TEXT DEFAULT '[]',
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS expenses (
+    id TEXT PRIMARY KEY,
+    trip_id TEXT NOT NULL REFERENCES trips(id) ON DELETE CASCADE,
+    description TEXT NOT NULL,
+    amount REAL NOT NULL,
+    currency TEXT NOT NULL,
+    category TEXT NOT NULL,
+    paid_by TEXT NOT NULL,
+    date TEXT NOT NULL,
+    split_with TEXT DEFAULT '[]',
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_trips_created_at ON trips(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_expenses_trip_id ON expenses(trip_id);
+CREATE INDEX IF NOT EXISTS idx_expenses_created_at ON expenses(created_at);
+"""
+
+# Statements are kept constant so sqlite3's statement cache reuses the prepared form
+UPSERT_TRIP = """
+INSERT INTO trips (id, name, destination, start_date, end_date, currency, travelers, created_at)
+VALUES (:id, :name, :destination, :start_date, :end_date, :currency, :travelers,
+        COALESCE(:created_at, CURRENT_TIMESTAMP))
+ON CONFLICT(id) DO UPDATE SET
+    name = excluded.name,
+    destination = excluded.destination,
+    start_date = excluded.start_date,
+    end_date = excluded.end_date,
+    currency = excluded.currency,
+    travelers = excluded.travelers,
+    updated_at = CURRENT_TIMESTAMP
+"""
+
+UPSERT_EXPENSE = """
+INSERT INTO expenses (id, trip_id, description, amount, currency, category, paid_by, date, split_with)
+VALUES (:id, :trip_id, :description, :amount, :currency, :category, :paid_by, :date, :split_with)
+ON CONFLICT(id) DO UPDATE SET
+    description = excluded.description,
+    amount = excluded.amount,
+    currency = excluded.currency,
+    category = excluded.category,
+    paid_by = excluded.paid_by,
+    date = excluded.date,
+    split_with = excluded.split_with
+"""
+
+SELECT_TRIP = "SELECT * FROM trips WHERE id = ?"
+SELECT_TRIP_EXPENSES = """
+SELECT id, description, amount, currency, category, paid_by, date, split_with
+FROM expenses WHERE trip_id = ? ORDER BY rowid
+"""
+LIST_TRIPS = """
+SELECT t.*, (SELECT COUNT(*) FROM expenses e WHERE e.trip_id = t.id) AS expense_count
+FROM trips t ORDER BY t.created_at DESC
+"""
+DELETE_TRIP = "DELETE FROM trips WHERE id = ?"
+DELETE_EXPENSE = "DELETE FROM expenses WHERE id = ? AND trip_id = ?"
+SELECT_TRIP_EXPENSE_IDS = "SELECT id FROM expenses WHERE trip_id = ?"
+TRIP_EXISTS = "SELECT 1 FROM trips WHERE id = ?"
+
+
+class SQLiteDatabase:
+    """SQLite-backed trip storage for single-node deployments"""
+
+    name = 'SQLite'
+
+    def __init__(self, path: Optional[str] = None):
+        if path is None:
+            default_dir = '/tmp/data' if os.environ.get('VERCEL') else 'data'
+            path = os.environ.get('SQLITE_PATH', os.path.join(default_dir, 'trips.db'))
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.path = path
+        self.enabled = True
+        self._local = threading.local()
+        self._latency = {}
+        self._latency_lock = threading.Lock()
+
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+
+    @property
+    def healthy(self) -> bool:
+        return True
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, cached_statements=64, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _run(self, operation: str, fn):
+        """Run fn(conn) in a transaction, recording its latency"""
+        started = time.perf_counter()
+        conn = self._connection()
+        error = False
+        try:
+            conn.execute("BEGIN IMMEDIATE" if operation.startswith('write') else "BEGIN")
+            result = fn(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            error = True
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._record_latency(operation, started, error)
+
+    def _record_latency(self, operation: str, started: float, error: bool):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._latency_lock:
+            counters = self._latency.get(operation)
+            if counters is None:
+                counters = self._latency[operation] = {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+            counters['count'] += 1
+            counters['errors'] += 1 if error else 0
+            counters['total_ms'] += elapsed_ms
+            counters['max_ms'] = max(counters['max_ms'], elapsed_ms)
+
+    def stats(self) -> Dict:
+        """Get per-operation latency counters"""
+        with self._latency_lock:
+            endpoints = {
+                key: {
+                    'count': c['count'],
+                    'errors': c['errors'],
+                    'avg_ms': round(c['total_ms'] / c['count'], 3) if c['count'] else 0.0,
+                    'max_ms': round(c['max_ms'], 3)
+                }
+                for key, c in self._latency.items()
+            }
+        return {'healthy': True, 'path': self.path, 'endpoints': endpoints}
+
+    @staticmethod
+    def _expense_row(trip_id: str, expense: Dict) -> Dict:
+        return {
+            'id': expense['id'],
+            'trip_id': trip_id,
+            'description': expense['description'],
+            'amount': expense['amount'],
+            'currency': expense['currency'],
+            'category': expense['category'],
+            'paid_by': expense['paid_by'],
+            'date': expense['date'],
+            'split_with': json.dumps(expense.get('split_with', []))
+        }
+
+    @staticmethod
+    def _expense_from_row(row: sqlite3.Row) -> Dict:
+        expense = dict(row)
+        expense['split_with'] = json.loads(expense['split_with'] or '[]')
+        return expense
+
+    def save_trip(self, trip_data: Dict, expenses: Optional[List[Dict]] = None) -> bool:
+        """Save or update a trip; when expenses are given they become the trip's full set of rows"""
+        trip_id = trip_data['id']
+        params = {
+            'id': trip_id,
+            'name': trip_data['name'],
+            'destination': trip_data['destination'],
+            'start_date': trip_data['start_date'],
+            'end_date': trip_data['end_date'],
+            'currency': trip_data['currency'],
+            'travelers': json.dumps(trip_data.get('travelers', [])),
+            'created_at': trip_data.get('created_at')
+        }
+
+        def write(conn):
+            conn.execute(UPSERT_TRIP, params)
+            if expenses is None:
+                return
+            conn.executemany(UPSERT_EXPENSE, [self._expense_row(trip_id, exp) for exp in expenses])
+            # Same transaction: rows of deleted expenses go with the save
+            keep = {exp['id'] for exp in expenses}
+            stale = [(row[0], trip_id) for row in conn.execute(SELECT_TRIP_EXPENSE_IDS, (trip_id,))
+                     if row[0] not in keep]
+            conn.executemany(DELETE_EXPENSE, stale)
+
+        try:
+            self._run('write trips', write)
+            return True
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
+
+    def add_expense(self, trip_id: str, expense: Dict) -> bool:
+        """Insert a single expense row"""
+        return self.upsert_expenses(trip_id, [expense])
+
+    def upsert_expenses(self, trip_id: str, expenses: List[Dict]) -> bool:
+        """Insert or update many expense rows in one transaction"""
+        rows = [self._expense_row(trip_id, exp) for exp in expenses]
+        try:
+            self._run('write expenses', lambda conn: conn.executemany(UPSERT_EXPENSE, rows))
+            return True
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
+
+    def delete_expense(self, trip_id: str, expense_id: str) -> bool:
+        """Delete a single expense row"""
+        return self.delete_expenses(trip_id, [expense_id])
+
+    def delete_expenses(self, trip_id: str, expense_ids: List[str]) -> bool:
+        """Delete many expense rows in one transaction"""
+        rows = [(expense_id, trip_id) for expense_id in expense_ids]
+        try:
+            self._run('write delete expenses', lambda conn: conn.executemany(DELETE_EXPENSE, rows))
+            return True
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
+
+    def load_trip(self, trip_id: str) -> Optional[Dict]:
+        """Load a trip by ID"""
+        def read(conn):
+            row = conn.execute(SELECT_TRIP, (trip_id,)).fetchone()
+            if row is None:
+                return None
+            trip = dict(row)
+            trip['travelers'] = json.loads(trip.get('travelers') or '[]')
+            trip['expenses'] = [self._expense_from_row(r) for r in conn.execute(SELECT_TRIP_EXPENSES, (trip_id,))]
+            return trip
+
+        try:
+            return self._run('read trip', read)
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return None
+
+    def list_trips(self) -> List[Dict]:
+        """List all trips"""
+        def read(conn):
+            trips = []
+            for row in conn.execute(LIST_TRIPS):
+                trip = dict(row)
+                trip['travelers'] = json.loads(trip.get('travelers') or '[]')
+                trips.append(trip)
+            return trips
+
+        try:
+            return self._run('read trips', read)
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return []
+
+    def delete_trip(self, trip_id: str) -> bool:
+        """Delete a trip and its expenses"""
+        try:
+            return self._run('write delete trip', lambda conn: conn.execute(DELETE_TRIP, (trip_id,)).rowcount > 0)
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
+
+    def trip_exists(self, trip_id: str) -> bool:
+        """Check if a trip exists"""
+        try:
+            return self._run('read trip exists',
+                             lambda conn: conn.execute(TRIP_EXISTS, (trip_id,)).fetchone() is not None)
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
+
+    def migrate_legacy_expenses(self) -> int:
+        """SQLite storage never had an expenses blob, so there is nothing to migrate"""
+        return 0
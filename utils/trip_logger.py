@@ -2,13 +2,34 @@
 Trip Logger - Log all trip activities and changes
 """
 
+import atexit
+import glob
+import gzip
 import json
 import os
-from datetime import datetime
+import queue
+import shutil
+import struct
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from itertools import islice
+
+
+# Byte offsets of the lines of a trip log, one little-endian uint64 per line
+OFFSET_FORMAT = '<Q'
+OFFSET_SIZE = struct.calcsize(OFFSET_FORMAT)
+
+# What to do with a new entry when the writer queue is full
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'spill')
+
+_STOP = object()
 
 
 class TripLogger:
-    def __init__(self, log_dir='logs'):
+    def __init__(self, log_dir='logs', batch_size=None, recent_size=None, async_writes=None,
+                 queue_size=None, overflow_policy=None):
         # Use /tmp for Vercel serverless environment
         if os.environ.get('VERCEL'):
             self.log_dir = '/tmp/logs'
@@ -18,26 +39,490 @@ class TripLogger:
         if not os.path.exists(self.log_dir):
             os.makedirs(self.log_dir)
         
-        self.log_file = os.path.join(self.log_dir, 'trip_logger.json')
-        self.activity_log = self._load_logs()
+        # In-memory indexes are guarded by _lock, log files by _io_lock
+        self._lock = threading.RLock()
+        self._io_lock = threading.RLock()
+        
+        # Most lines appended per batch by the background writer
+        if batch_size is None:
+            batch_size = int(os.environ.get('TRIP_LOG_BATCH', 256))
+        self.batch_size = max(1, batch_size)
+        
+        # Serverless instances are frozen between requests, so they write inline by default
+        if async_writes is None:
+            async_writes = os.environ.get('TRIP_LOG_ASYNC', '0' if os.environ.get('VERCEL') else '1') == '1'
+        if queue_size is None:
+            queue_size = int(os.environ.get('TRIP_LOG_QUEUE_SIZE', 10000))
+        if overflow_policy is None:
+            overflow_policy = os.environ.get('TRIP_LOG_OVERFLOW', 'spill')
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow_policy}', expected one of {OVERFLOW_POLICIES}")
+        self.overflow_policy = overflow_policy
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._spill_lock = threading.Lock()
+        self._spill_pending = False
+        self._counters = {'dropped': 0, 'spilled': 0, 'batches': 0, 'lines_written': 0,
+                          'last_batch_ms': 0.0, 'max_batch_ms': 0.0, 'total_batch_ms': 0.0}
+        
+        self.log_file = os.path.join(self.log_dir, 'trip_logger.jsonl')
+        self.summary_file = os.path.join(self.log_dir, 'activity_summaries.json')
+        self.archive_dir = os.path.join(self.log_dir, 'archive')
+        self.spill_file = os.path.join(self.log_dir, 'spill.jsonl')
+        self._migrate_legacy_logs()
+        
+        # Rotation into gzip segments and retention of those segments
+        self.max_bytes = int(os.environ.get('TRIP_LOG_MAX_BYTES', 10 * 1024 * 1024))
+        self.max_age = timedelta(hours=float(os.environ.get('TRIP_LOG_MAX_AGE_HOURS', 24 * 7)))
+        self.trip_max_bytes = int(os.environ.get('TRIP_LOG_TRIP_MAX_BYTES', 1024 * 1024))
+        self.retain_segments = int(os.environ.get('TRIP_LOG_RETAIN_SEGMENTS', 20))
+        self.retain_days = float(os.environ.get('TRIP_LOG_RETAIN_DAYS', 90))
+        self._segment_started = self._first_timestamp(self.log_file)
+        
+        # Only the most recent activities are kept in memory
+        if recent_size is None:
+            recent_size = int(os.environ.get('TRIP_LOG_RECENT', 1000))
+        self.recent = deque(self._read_tail(self.log_file, recent_size), maxlen=recent_size)
+        if len(self.recent) < recent_size:
+            # Fresh segment after a rotation: top up from the newest archived segment
+            older = self._archived_segments('trip_logger')[-1:]
+            if older:
+                tail = deque(self._read_lines(older[0]), maxlen=recent_size - len(self.recent))
+                self.recent.extendleft(reversed(tail))
+        
+        # The summary index is folded from written lines only and persisted every few seconds
+        # (and on close); on startup the lines logged after the last save are replayed
+        self.summary_save_interval = float(os.environ.get('TRIP_LOG_SUMMARY_SAVE_SECONDS', 30))
+        self._summary_dirty = False
+        self._summary_saved_at = time.monotonic()
+        self._summaries, self._summary_offset = self._load_summary_index()
+        
+        # Entries spilled before an unclean shutdown are written first
+        self._spill_pending = os.path.exists(self.spill_file)
+        self._drain_spill()
+        
+        self._writer = None
+        if async_writes:
+            self._writer = threading.Thread(target=self._run_writer, name='trip-logger', daemon=True)
+            self._writer.start()
+        atexit.register(self.close)
+    
+    def _trip_log_file(self, trip_id):
+        return os.path.join(self.log_dir, f'trip_{trip_id}.jsonl')
+    
+    def _trip_index_file(self, trip_id):
+        return os.path.join(self.log_dir, f'trip_{trip_id}.idx')
+    
+    def _migrate_legacy_logs(self):
+        """Convert JSON-array log files from older versions to line-delimited files, once
+        
+        The old files are left where they are (they may be tracked in a checkout); the existing
+        .jsonl file is what marks one as migrated.
+        """
+        legacy_files = [os.path.join(self.log_dir, 'trip_logger.json')]
+        legacy_files += glob.glob(os.path.join(self.log_dir, 'trip_*-*.json'))
+        
+        for legacy_file in legacy_files:
+            target = legacy_file[:-len('.json')] + '.jsonl'
+            if not os.path.exists(legacy_file) or os.path.exists(target):
+                continue
+            try:
+                with open(legacy_file, 'r') as f:
+                    entries = json.load(f)
+                tmp_file = target + '.tmp'
+                with open(tmp_file, 'w') as f:
+                    for entry in entries:
+                        f.write(json.dumps(entry) + '\n')
+                os.replace(tmp_file, target)
+            except Exception as e:
+                print(f"Error migrating log file {legacy_file}: {e}")
+    
+    @staticmethod
+    def _parse_lines(lines):
+        """Decode log lines, skipping damaged ones"""
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+    
+    def _read_lines(self, path, offset=0):
+        """Stream entries from a line-delimited log file or gzip segment, starting at a byte offset"""
+        if not os.path.exists(path):
+            return
+        with (gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')) as f:
+            f.seek(offset)
+            yield from self._parse_lines(f)
+    
+    def _first_timestamp(self, path):
+        """Get the time of the first entry of a log file"""
+        for entry in self._read_lines(path):
+            try:
+                return datetime.fromisoformat(entry['timestamp'])
+            except (KeyError, TypeError, ValueError):
+                return datetime.now()
+        return None
+    
+    def _archived_segments(self, prefix):
+        """Get the rotated segments of a log, oldest first"""
+        return sorted(glob.glob(os.path.join(self.archive_dir, f'{glob.escape(prefix)}.*.jsonl.gz')))
+    
+    def _rotate(self, path, prefix):
+        """Compress the active log file into an archived segment and start a new one"""
+        if not os.path.exists(self.archive_dir):
+            os.makedirs(self.archive_dir)
+        
+        stamp = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+        segment = os.path.join(self.archive_dir, f'{prefix}.{stamp}.jsonl.gz')
+        
+        # Move the file aside first so new appends go to a fresh file
+        rotating = path + '.rotating'
+        os.replace(path, rotating)
+        with open(rotating, 'rb') as src, gzip.open(segment + '.tmp', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(segment + '.tmp', segment)
+        os.remove(rotating)
+        
+        self._apply_retention(prefix)
+    
+    def _apply_retention(self, prefix):
+        """Delete archived segments beyond the retention count or age"""
+        segments = self._archived_segments(prefix)
+        expired = segments[:-self.retain_segments] if self.retain_segments > 0 else segments
+        cutoff = time.time() - self.retain_days * 86400
+        expired += [seg for seg in segments if seg not in expired and os.path.getmtime(seg) < cutoff]
+        for segment in expired:
+            try:
+                os.remove(segment)
+            except OSError as e:
+                print(f"Error removing log segment {segment}: {e}")
     
-    def _load_logs(self):
-        """Load existing logs"""
-        if os.path.exists(self.log_file):
+    def _rotate_if_needed(self, path, size):
+        """Rotate a log file that grew past its size limit, or the global log once it is too old"""
+        try:
+            if path == self.log_file:
+                too_old = self._segment_started is not None and datetime.now() - self._segment_started >= self.max_age
+                if size >= self.max_bytes or too_old:
+                    self._rotate(path, 'trip_logger')
+                    self._segment_started = None
+                    with self._lock:
+                        self._summary_offset = 0
+                    # An index still pointing into the old segment would skip lines of the new one
+                    self._save_summary_index()
+            elif size >= self.trip_max_bytes:
+                trip_id = os.path.basename(path)[len('trip_'):-len('.jsonl')]
+                self._rotate(path, f'trip_{trip_id}')
+                # Offsets are per active segment
+                if os.path.exists(self._trip_index_file(trip_id)):
+                    os.remove(self._trip_index_file(trip_id))
+        except Exception as e:
+            print(f"Error rotating log file {path}: {e}")
+    
+    def _read_tail(self, path, count, block_size=65536):
+        """Read the last count entries of a log file by scanning backwards from the end"""
+        if count <= 0 or not os.path.exists(path):
+            return []
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            data = b''
+            while position > 0 and data.count(b'\n') <= count:
+                step = min(block_size, position)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+        lines = data.splitlines()
+        if position > 0:
+            # The first line is probably cut in half
+            lines = lines[1:]
+        return list(self._parse_lines(lines[-count:]))
+    
+    def _load_summary_index(self):
+        """Load the persisted per-trip summaries and catch up on entries logged after they were saved"""
+        summaries, offset = {}, 0
+        if os.path.exists(self.summary_file):
             try:
-                with open(self.log_file, 'r') as f:
-                    return json.load(f)
-            except:
-                return []
-        return []
-    
-    def _save_logs(self):
-        """Save logs to file"""
+                with open(self.summary_file, 'r') as f:
+                    index = json.load(f)
+                summaries, offset = index['trips'], index['log_offset']
+            except Exception:
+                summaries, offset = {}, 0
+        
+        size = os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+        if offset > size:
+            # Log was replaced underneath the index, rebuild from scratch
+            summaries, offset = {}, 0
+        if offset < size:
+            self._summaries = summaries
+            for entry in self._read_lines(self.log_file, offset):
+                self._update_summary(entry)
+            self._summary_offset = size
+            self._save_summary_index()
+            return self._summaries, self._summary_offset
+        return summaries, offset
+    
+    def _save_summary_index(self):
+        """Persist the per-trip summaries together with the log position they cover"""
+        tmp_file = self.summary_file + '.tmp'
+        with self._lock:
+            payload = json.dumps({'log_offset': self._summary_offset, 'trips': self._summaries})
+            self._summary_dirty = False
+            self._summary_saved_at = time.monotonic()
         try:
-            with open(self.log_file, 'w') as f:
-                json.dump(self.activity_log, f, indent=2)
+            with open(tmp_file, 'w') as f:
+                f.write(payload)
+            os.replace(tmp_file, self.summary_file)
         except Exception as e:
-            print(f"Error saving logs: {e}")
+            print(f"Error saving log summary index: {e}")
+    
+    def _update_summary(self, entry):
+        """Fold one activity entry into the per-trip summaries"""
+        action = entry.get('action')
+        trip_id = entry.get('trip_id')
+        if action == 'trip_created':
+            if trip_id not in self._summaries:
+                self._summaries[trip_id] = {
+                    'trip_name': entry['trip_name'],
+                    'destination': entry['destination'],
+                    'created': entry['timestamp'],
+                    'expense_count': 0,
+                    'traveler_count': 0,
+                    'last_activity': entry['timestamp']
+                }
+        elif action in ('expense_added', 'traveler_added') and trip_id in self._summaries:
+            summary = self._summaries[trip_id]
+            summary['expense_count' if action == 'expense_added' else 'traveler_count'] += 1
+            summary['last_activity'] = entry['timestamp']
+        elif action == 'expenses_imported' and trip_id in self._summaries:
+            summary = self._summaries[trip_id]
+            summary['expense_count'] += entry['count']
+            summary['last_activity'] = entry['timestamp']
+    
+    def _record(self, entry):
+        """Keep an activity entry in memory and queue it for the global log"""
+        with self._lock:
+            self.recent.append(entry)
+        self._append(self.log_file, entry)
+    
+    def _append(self, path, entry):
+        """Queue one entry for appending to a log file, or write it inline without a writer thread"""
+        item = (path, (json.dumps(entry) + '\n').encode('utf-8'))
+        if self._writer is None:
+            with self._io_lock:
+                self._write_batch([item])
+            return
+        
+        if self.overflow_policy == 'block':
+            self._queue.put(item)
+            return
+        
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+            if self.overflow_policy == 'spill':
+                self._spill(item)
+                return
+            try:
+                # drop_oldest: make room by discarding the entry that waited longest
+                self._queue.get_nowait()
+                self._queue.task_done()
+                with self._lock:
+                    self._counters['dropped'] += 1
+            except queue.Empty:
+                pass
+    
+    def _spill(self, item):
+        """Park an entry on disk while the writer queue is full"""
+        path, line = item
+        with self._spill_lock:
+            try:
+                with open(self.spill_file, 'a') as f:
+                    f.write(json.dumps([path, line.decode('utf-8')]) + '\n')
+                self._spill_pending = True
+                with self._lock:
+                    self._counters['spilled'] += 1
+            except Exception as e:
+                print(f"Error spilling log entry: {e}")
+    
+    def _drain_spill(self):
+        """Write entries that were spilled to disk while the queue was full"""
+        if not self._spill_pending:
+            return
+        with self._io_lock:
+            with self._spill_lock:
+                if not os.path.exists(self.spill_file):
+                    self._spill_pending = False
+                    return
+                draining = self.spill_file + '.draining'
+                os.replace(self.spill_file, draining)
+                self._spill_pending = False
+            
+            batch = []
+            for path, line in self._read_lines(draining):
+                batch.append((path, line.encode('utf-8')))
+                if len(batch) >= self.batch_size:
+                    self._write_batch(batch)
+                    batch = []
+            if batch:
+                self._write_batch(batch)
+            os.remove(draining)
+    
+    def _run_writer(self):
+        """Drain the queue in batches until close() is called"""
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            items = [item for item in batch if item is not _STOP]
+            try:
+                with self._io_lock:
+                    if items:
+                        self._write_batch(items)
+                    self._drain_spill()
+            except Exception as e:
+                print(f"Error saving logs: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            
+            if len(items) < len(batch):
+                return
+    
+    def flush(self):
+        """Wait until every queued entry has been written"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.join()
+        self._drain_spill()
+    
+    def close(self):
+        """Write everything still queued and stop the background writer"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join(timeout=10)
+        self._drain_spill()
+        if self._summary_dirty:
+            self._save_summary_index()
+    
+    def stats(self):
+        """Get writer queue depth, drop counts and batch write latency"""
+        with self._lock:
+            counters = dict(self._counters)
+        batches = counters.pop('batches')
+        total_ms = counters.pop('total_batch_ms')
+        return {
+            'async': self._writer is not None,
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'overflow_policy': self.overflow_policy,
+            'batches': batches,
+            'avg_batch_ms': round(total_ms / batches, 3) if batches else 0.0,
+            'last_batch_ms': round(counters.pop('last_batch_ms'), 3),
+            'max_batch_ms': round(counters.pop('max_batch_ms'), 3),
+            **counters
+        }
+    
+    def _write_batch(self, items):
+        """Append (path, line) items to their files and update the indexes; caller holds _io_lock"""
+        started = time.perf_counter()
+        grouped = {}
+        for path, line in items:
+            grouped.setdefault(path, []).append(line)
+        
+        for path, lines in grouped.items():
+            try:
+                if path != self.log_file:
+                    # Trip logs get their line offsets indexed
+                    trip_id = os.path.basename(path)[len('trip_'):-len('.jsonl')]
+                    self._ensure_trip_index(trip_id)
+                # One write per file keeps each batch of lines contiguous
+                with open(path, 'ab') as f:
+                    start = f.tell()
+                    f.write(b''.join(lines))
+                    end = f.tell()
+                if path == self.log_file:
+                    # Only lines that reached the file count, so a replay never folds one twice
+                    with self._lock:
+                        for entry in self._parse_lines(lines):
+                            self._update_summary(entry)
+                        self._summary_offset = end
+                        self._summary_dirty = True
+                    if self._segment_started is None:
+                        self._segment_started = datetime.now()
+                else:
+                    self._append_offsets(trip_id, start, lines)
+                self._rotate_if_needed(path, end)
+            except Exception as e:
+                print(f"Error saving logs: {e}")
+        if self._summary_dirty and time.monotonic() - self._summary_saved_at >= self.summary_save_interval:
+            self._save_summary_index()
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._counters['batches'] += 1
+            self._counters['lines_written'] += len(items)
+            self._counters['last_batch_ms'] = elapsed_ms
+            self._counters['max_batch_ms'] = max(self._counters['max_batch_ms'], elapsed_ms)
+            self._counters['total_batch_ms'] += elapsed_ms
+    
+    def _append_offsets(self, trip_id, start, lines):
+        offsets = []
+        for line in lines:
+            offsets.append(struct.pack(OFFSET_FORMAT, start))
+            start += len(line)
+        with open(self._trip_index_file(trip_id), 'ab') as f:
+            f.write(b''.join(offsets))
+    
+    def _ensure_trip_index(self, trip_id):
+        """Make sure the offset index covers every line of a trip log, rebuilding its tail if needed"""
+        log_path = self._trip_log_file(trip_id)
+        index_path = self._trip_index_file(trip_id)
+        if not os.path.exists(log_path):
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            return
+        
+        log_size = os.path.getsize(log_path)
+        index_size = os.path.getsize(index_path) if os.path.exists(index_path) else 0
+        index_size -= index_size % OFFSET_SIZE
+        
+        # Find where the indexed lines end
+        covered = 0
+        with open(log_path, 'rb') as log:
+            if index_size:
+                with open(index_path, 'rb') as index:
+                    index.seek(index_size - OFFSET_SIZE)
+                    last_offset = struct.unpack(OFFSET_FORMAT, index.read(OFFSET_SIZE))[0]
+                if last_offset >= log_size:
+                    index_size, last_offset = 0, 0
+                else:
+                    log.seek(last_offset)
+                    log.readline()
+                    covered = log.tell()
+            if covered >= log_size:
+                return
+            
+            # Index the lines written without one (migrated files or an interrupted flush)
+            offsets = []
+            log.seek(covered)
+            position = covered
+            for line in log:
+                if line.strip():
+                    offsets.append(struct.pack(OFFSET_FORMAT, position))
+                position += len(line)
+        
+        with open(index_path, 'r+b' if index_size else 'wb') as index:
+            index.truncate(index_size)
+            index.seek(index_size)
+            index.write(b''.join(offsets))
     
     def log_trip_created(self, trip_data):
         """Log trip creation"""
@@ -51,8 +536,7 @@ class TripLogger:
             'start_date': trip_data.get('start_date'),
             'end_date': trip_data.get('end_date')
         }
-        self.activity_log.append(entry)
-        self._save_logs()
+        self._record(entry)
         self._create_trip_specific_log(trip_data['id'], 'created', trip_data)
     
     def log_trip_loaded(self, trip_id, trip_name):
@@ -63,8 +547,7 @@ class TripLogger:
             'trip_id': trip_id,
             'trip_name': trip_name
         }
-        self.activity_log.append(entry)
-        self._save_logs()
+        self._record(entry)
     
     def log_expense_added(self, trip_id, expense_data):
         """Log expense addition"""
@@ -80,10 +563,32 @@ class TripLogger:
                 'paid_by': expense_data.get('paid_by')
             }
         }
-        self.activity_log.append(entry)
-        self._save_logs()
+        self._record(entry)
         self._create_trip_specific_log(trip_id, 'expense_added', expense_data)
     
+    def log_expenses_imported(self, trip_id, expenses_data, source):
+        """Log a bulk import as one entry, with counts and totals rather than every row"""
+        totals = {}
+        for expense in expenses_data:
+            currency = expense.get('currency')
+            totals[currency] = round(totals.get(currency, 0) + expense.get('amount', 0), 2)
+        summary = {
+            'count': len(expenses_data),
+            'source': source,
+            'totals': totals,
+            'expense_ids': [expense.get('id') for expense in expenses_data]
+        }
+        entry = {
+            'timestamp': datetime.now().isoformat(),
+            'action': 'expenses_imported',
+            'trip_id': trip_id,
+            'count': summary['count'],
+            'source': source,
+            'totals': totals
+        }
+        self._record(entry)
+        self._create_trip_specific_log(trip_id, 'expenses_imported', summary)
+    
     def log_expense_deleted(self, trip_id, expense_id):
         """Log expense deletion"""
         entry = {
@@ -92,8 +597,7 @@ class TripLogger:
             'trip_id': trip_id,
             'expense_id': expense_id
         }
-        self.activity_log.append(entry)
-        self._save_logs()
+        self._record(entry)
         self._create_trip_specific_log(trip_id, 'expense_deleted', {'expense_id': expense_id})
     
     def log_traveler_added(self, trip_id, traveler_data):
@@ -107,8 +611,7 @@ class TripLogger:
                 'email': traveler_data.get('email')
             }
         }
-        self.activity_log.append(entry)
-        self._save_logs()
+        self._record(entry)
         self._create_trip_specific_log(trip_id, 'traveler_added', traveler_data)
     
     def log_trip_saved(self, trip_id, trip_name):
@@ -119,8 +622,7 @@ class TripLogger:
             'trip_id': trip_id,
             'trip_name': trip_name
         }
-        self.activity_log.append(entry)
-        self._save_logs()
+        self._record(entry)
     
     def log_trip_exported(self, trip_id, export_format):
         """Log trip export"""
@@ -130,76 +632,98 @@ class TripLogger:
             'trip_id': trip_id,
             'format': export_format
         }
-        self.activity_log.append(entry)
-        self._save_logs()
+        self._record(entry)
         self._create_trip_specific_log(trip_id, 'exported', {'format': export_format})
     
     def _create_trip_specific_log(self, trip_id, action, data):
-        """Create trip-specific log file"""
-        trip_log_file = os.path.join(self.log_dir, f'trip_{trip_id}.json')
-        
-        # Load existing trip logs
-        trip_logs = []
-        if os.path.exists(trip_log_file):
-            try:
-                with open(trip_log_file, 'r') as f:
-                    trip_logs = json.load(f)
-            except:
-                trip_logs = []
-        
-        # Add new entry
-        trip_logs.append({
+        """Append an entry to the trip-specific log file"""
+        self._append(self._trip_log_file(trip_id), {
             'timestamp': datetime.now().isoformat(),
             'action': action,
             'data': data
         })
+    
+    def iter_trip_history(self, trip_id, include_archived=False):
+        """Stream all logs for a specific trip, oldest first, optionally including rotated segments"""
+        self.flush()
+        if include_archived:
+            for segment in self._archived_segments(f'trip_{trip_id}'):
+                yield from self._read_lines(segment)
+        yield from self._read_lines(self._trip_log_file(trip_id))
+    
+    def iter_activities(self, include_archived=False):
+        """Stream the global activity log, oldest first, optionally including rotated segments"""
+        self.flush()
+        if include_archived:
+            for segment in self._archived_segments('trip_logger'):
+                yield from self._read_lines(segment)
+        yield from self._read_lines(self.log_file)
+    
+    def count_trip_history(self, trip_id):
+        """Get the number of log entries for a specific trip"""
+        self.flush()
+        with self._io_lock:
+            return self._count_indexed(trip_id)
+    
+    def _count_indexed(self, trip_id):
+        """Count a trip's indexed entries without flushing; call with _io_lock held
+        
+        Flushing waits for the writer, which needs _io_lock, so it must never happen under it.
+        """
+        self._ensure_trip_index(trip_id)
+        index_path = self._trip_index_file(trip_id)
+        return os.path.getsize(index_path) // OFFSET_SIZE if os.path.exists(index_path) else 0
+    
+    def get_trip_history(self, trip_id, limit=None, before=None, include_archived=False):
+        """Get logs for a specific trip, oldest first
         
-        # Save trip logs
+        Entries of the active segment are numbered from 0 in the order they were logged.
+        With a limit, only the newest `limit` entries numbered below `before` are returned.
+        Rotated segments are only read when include_archived is set and no page is asked for.
+        """
         try:
-            with open(trip_log_file, 'w') as f:
-                json.dump(trip_logs, f, indent=2)
-        except Exception as e:
-            print(f"Error saving trip-specific log: {e}")
+            if limit is None and before is None:
+                return list(self.iter_trip_history(trip_id, include_archived))
+            return self.get_trip_history_page(trip_id, limit, before)['history']
+        except Exception:
+            return []
     
-    def get_trip_history(self, trip_id):
-        """Get all logs for a specific trip"""
-        trip_log_file = os.path.join(self.log_dir, f'trip_{trip_id}.json')
-        if os.path.exists(trip_log_file):
-            try:
-                with open(trip_log_file, 'r') as f:
-                    return json.load(f)
-            except:
-                return []
-        return []
+    def get_trip_history_page(self, trip_id, limit=None, before=None):
+        """Get one page of a trip's logs using the byte-offset index"""
+        self.flush()
+        with self._io_lock:
+            total = self._count_indexed(trip_id)
+            end = total if before is None else max(0, min(before, total))
+            start = 0 if limit is None else max(0, end - limit)
+            
+            history = []
+            if start < end:
+                with open(self._trip_index_file(trip_id), 'rb') as index:
+                    index.seek(start * OFFSET_SIZE)
+                    raw = index.read((end - start + 1) * OFFSET_SIZE)
+                offsets = [struct.unpack_from(OFFSET_FORMAT, raw, i)[0] for i in range(0, len(raw), OFFSET_SIZE)]
+                with open(self._trip_log_file(trip_id), 'rb') as log:
+                    log.seek(offsets[0])
+                    if end < total:
+                        data = log.read(offsets[end - start] - offsets[0])
+                    else:
+                        data = log.read()
+                history = list(self._parse_lines(data.splitlines()))
+        
+        return {
+            'history': history,
+            'total': total,
+            'next_before': start if start > 0 else None
+        }
     
     def get_all_trips_summary(self):
         """Get summary of all trips"""
-        trips_summary = {}
-        for entry in self.activity_log:
-            if entry['action'] == 'trip_created':
-                trip_id = entry['trip_id']
-                if trip_id not in trips_summary:
-                    trips_summary[trip_id] = {
-                        'trip_name': entry['trip_name'],
-                        'destination': entry['destination'],
-                        'created': entry['timestamp'],
-                        'expense_count': 0,
-                        'traveler_count': 0,
-                        'last_activity': entry['timestamp']
-                    }
-            elif entry['action'] == 'expense_added':
-                trip_id = entry.get('trip_id')
-                if trip_id in trips_summary:
-                    trips_summary[trip_id]['expense_count'] += 1
-                    trips_summary[trip_id]['last_activity'] = entry['timestamp']
-            elif entry['action'] == 'traveler_added':
-                trip_id = entry.get('trip_id')
-                if trip_id in trips_summary:
-                    trips_summary[trip_id]['traveler_count'] += 1
-                    trips_summary[trip_id]['last_activity'] = entry['timestamp']
-        
-        return trips_summary
+        # Summaries follow the written log, so wait for queued entries first
+        self.flush()
+        with self._lock:
+            return {trip_id: dict(summary) for trip_id, summary in self._summaries.items()}
     
     def get_recent_activities(self, limit=20):
         """Get recent activities across all trips"""
-        return self.activity_log[-limit:][::-1]  # Return most recent first
+        with self._lock:
+            return list(islice(reversed(self.recent), max(0, limit)))  # Return most recent first
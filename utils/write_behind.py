@@ -0,0 +1,311 @@
+"""
+Write-behind persistence - Coalesce trip mutations before writing them to the database
+"""
+
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class _PendingTrip:
+    """Mutations of one trip waiting to be flushed"""
+
+    def __init__(self):
+        self.trip_data = None
+        self.upserts = OrderedDict()
+        self.deletes = set()
+        # Set by a full save: upserts then hold every expense of the trip
+        self.replace_expenses = False
+        # Failed writes so far, and when the timer may try again (time.monotonic)
+        self.attempts = 0
+        self.retry_at = 0.0
+
+    def copy(self):
+        pending = _PendingTrip()
+        pending.trip_data = self.trip_data
+        pending.upserts = OrderedDict(self.upserts)
+        pending.deletes = set(self.deletes)
+        pending.replace_expenses = self.replace_expenses
+        return pending
+
+    def apply(self, trip_data):
+        """Get trip_data (as loaded, with its 'expenses') with these mutations applied on top"""
+        base = dict(trip_data) if trip_data else None
+        if self.trip_data is not None:
+            trip = dict(self.trip_data)
+        elif base is not None:
+            trip = base
+        else:
+            return None
+        base_expenses = [] if base is None or self.replace_expenses else base.get('expenses') or []
+
+        expenses = []
+        for expense in base_expenses:
+            if expense['id'] in self.deletes:
+                continue
+            expenses.append(self.upserts.get(expense['id'], expense))
+        known = {expense['id'] for expense in base_expenses}
+        expenses += [expense for expense_id, expense in self.upserts.items() if expense_id not in known]
+        trip['expenses'] = expenses
+        return trip
+
+    def size(self):
+        return (1 if self.trip_data else 0) + len(self.upserts) + len(self.deletes)
+
+    def merge_older(self, older):
+        """Fold in mutations that were queued before this one (e.g. after a failed flush)"""
+        if self.trip_data is None:
+            self.trip_data = older.trip_data
+        if self.replace_expenses:
+            # A newer full set supersedes every older expense change
+            return
+        self.replace_expenses = older.replace_expenses
+        upserts = OrderedDict(
+            (expense_id, expense) for expense_id, expense in older.upserts.items()
+            if expense_id not in self.upserts and expense_id not in self.deletes
+        )
+        upserts.update(self.upserts)
+        self.upserts = upserts
+        for expense_id in older.deletes:
+            if expense_id not in self.upserts:
+                self.deletes.add(expense_id)
+
+
+class WriteBehindQueue:
+    """Queue trip writes and flush them as one upsert per trip on a timer or size threshold"""
+
+    def __init__(self, db, flush_interval=None, max_pending=None, wait_for_flush=None,
+                 max_attempts=None, max_backoff=None):
+        self.db = db
+        self.flush_interval = flush_interval if flush_interval is not None else \
+            float(os.environ.get('WRITE_BEHIND_INTERVAL', 0.5))
+        self.max_pending = max_pending if max_pending is not None else \
+            int(os.environ.get('WRITE_BEHIND_MAX_PENDING', 200))
+        # Failed writes are retried with exponential backoff, then parked as dead
+        self.max_attempts = max_attempts if max_attempts is not None else \
+            int(os.environ.get('WRITE_BEHIND_MAX_ATTEMPTS', 5))
+        self.max_backoff = max_backoff if max_backoff is not None else \
+            float(os.environ.get('WRITE_BEHIND_MAX_BACKOFF', 60))
+        if wait_for_flush is None:
+            # Serverless instances may be frozen right after the response, so wait there by default
+            default = '1' if os.environ.get('VERCEL') else '0'
+            wait_for_flush = os.environ.get('WRITE_BEHIND_WAIT', default) == '1'
+        self.wait_for_flush = wait_for_flush
+
+        self._pending = OrderedDict()
+        # Mutations that kept failing, kept so they are reported and never silently lost
+        self._dead = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._flushes = 0
+        self._failures = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+        self._worker = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    @property
+    def enabled(self):
+        return self.db.enabled
+
+    def save_trip(self, trip_data, expenses=None, wait=None):
+        """Queue a trip upsert, optionally with the full set of its expenses (others are deleted)"""
+        def mutate(pending):
+            pending.trip_data = trip_data
+            if expenses is not None:
+                pending.replace_expenses = True
+                pending.upserts = OrderedDict((expense['id'], expense) for expense in expenses)
+                pending.deletes.clear()
+        return self._enqueue(trip_data['id'], mutate, wait)
+
+    def add_expense(self, trip_id, expense, wait=None):
+        """Queue a single expense insert"""
+        def mutate(pending):
+            pending.upserts[expense['id']] = expense
+            pending.deletes.discard(expense['id'])
+        return self._enqueue(trip_id, mutate, wait)
+
+    def add_expenses(self, trip_id, expenses, wait=None):
+        """Queue many expense inserts, written together in one upsert"""
+        def mutate(pending):
+            for expense in expenses:
+                pending.upserts[expense['id']] = expense
+                pending.deletes.discard(expense['id'])
+        return self._enqueue(trip_id, mutate, wait)
+
+    def delete_expense(self, trip_id, expense_id, wait=None):
+        """Queue a single expense delete"""
+        def mutate(pending):
+            pending.upserts.pop(expense_id, None)
+            pending.deletes.add(expense_id)
+        return self._enqueue(trip_id, mutate, wait)
+
+    def flush(self, trip_id=None):
+        """Write pending mutations now, for one trip or all of them
+        
+        Flushing everything skips trips still backing off after a failure; flushing one trip
+        always tries. A trip's dead mutations are retried along with any newer ones, or when
+        that trip is flushed by itself. Returns False if any write failed.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if trip_id is None:
+                    now = time.monotonic()
+                    batch = [(pending_trip_id, pending) for pending_trip_id, pending in self._pending.items()
+                             if pending.retry_at <= now]
+                    for pending_trip_id, _ in batch:
+                        del self._pending[pending_trip_id]
+                elif trip_id in self._pending:
+                    batch = [(trip_id, self._pending.pop(trip_id))]
+                elif trip_id in self._dead:
+                    batch = [(trip_id, self._dead.pop(trip_id))]
+                else:
+                    batch = []
+                for pending_trip_id, pending in batch:
+                    dead = self._dead.pop(pending_trip_id, None)
+                    if dead is not None:
+                        pending.merge_older(dead)
+                        # One more failure parks them again, rather than a fresh round of retries
+                        pending.attempts = max(pending.attempts, dead.attempts - 1)
+
+            if not batch:
+                return True
+
+            started = time.perf_counter()
+            success = True
+            for pending_trip_id, pending in batch:
+                try:
+                    written = self._write(pending_trip_id, pending)
+                except Exception as e:
+                    # The batch is already off the queue; put it back rather than lose it
+                    print(f"Error writing trip {pending_trip_id}: {e}")
+                    written = False
+                if not written:
+                    success = False
+                    self._requeue(pending_trip_id, pending)
+            self._record_flush((time.perf_counter() - started) * 1000, success)
+            return success
+
+    def close(self):
+        """Stop the background flusher and write everything still queued"""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wakeup.set()
+        self._worker.join(timeout=5)
+        self.flush()
+
+    def unsaved_changes(self, trip_id):
+        """Get a trip's queued and dead mutations combined, or None if everything was written"""
+        with self._lock:
+            older = self._dead.get(trip_id)
+            newer = self._pending.get(trip_id)
+            if older is None and newer is None:
+                return None
+            if newer is None:
+                return older.copy()
+            combined = newer.copy()
+            if older is not None:
+                combined.merge_older(older)
+            return combined
+
+    def stats(self):
+        """Get queue depth, retrying and dead trips, and flush latency"""
+        with self._lock:
+            depth = sum(pending.size() for pending in self._pending.values())
+            return {
+                'queue_depth': depth,
+                'pending_trips': len(self._pending),
+                'retrying_trips': sum(1 for pending in self._pending.values() if pending.attempts),
+                'dead_trips': len(self._dead),
+                'dead_mutations': sum(pending.size() for pending in self._dead.values()),
+                'wait_for_flush': self.wait_for_flush,
+                'flushes': self._flushes,
+                'failed_flushes': self._failures,
+                'last_flush_ms': round(self._last_flush_ms, 2),
+                'max_flush_ms': round(self._max_flush_ms, 2),
+                'avg_flush_ms': round(self._total_flush_ms / self._flushes, 2) if self._flushes else 0.0
+            }
+
+    def _enqueue(self, trip_id, mutate, wait):
+        if not self.db.enabled:
+            return False
+
+        with self._lock:
+            pending = self._pending.get(trip_id)
+            if pending is None:
+                pending = self._pending[trip_id] = _PendingTrip()
+            mutate(pending)
+            depth = sum(p.size() for p in self._pending.values())
+
+        if self.wait_for_flush if wait is None else wait:
+            return self.flush(trip_id)
+
+        if depth >= self.max_pending:
+            self._wakeup.set()
+        return True
+
+    def _write(self, trip_id, pending):
+        """Write one trip's coalesced mutations: trip row first, then expense rows"""
+        if pending.replace_expenses:
+            return self.db.save_trip(pending.trip_data, list(pending.upserts.values()))
+        if pending.trip_data is not None and not self.db.save_trip(pending.trip_data):
+            return False
+        if pending.upserts and not self.db.upsert_expenses(trip_id, list(pending.upserts.values())):
+            pending.trip_data = None
+            return False
+        if pending.deletes and not self.db.delete_expenses(trip_id, sorted(pending.deletes)):
+            pending.trip_data = None
+            pending.upserts.clear()
+            return False
+        return True
+
+    def _requeue(self, trip_id, pending):
+        """Put failed mutations back for a retry with backoff, or park them once out of attempts"""
+        with self._lock:
+            attempts = pending.attempts + 1
+            if attempts >= self.max_attempts:
+                print(f"Giving up writing trip {trip_id} after {attempts} attempts; "
+                      f"{pending.size()} changes are kept as dead")
+                dead = self._dead.get(trip_id)
+                if dead is not None:
+                    pending.merge_older(dead)
+                self._dead[trip_id] = pending
+                return
+            
+            newer = self._pending.get(trip_id)
+            if newer is None:
+                self._pending[trip_id] = pending
+                self._pending.move_to_end(trip_id, last=False)
+            else:
+                newer.merge_older(pending)
+                pending = newer
+            pending.attempts = attempts
+            pending.retry_at = time.monotonic() + min(self.flush_interval * 2 ** attempts, self.max_backoff)
+
+    def _record_flush(self, elapsed_ms, success):
+        with self._lock:
+            self._flushes += 1
+            if not success:
+                self._failures += 1
+            self._last_flush_ms = elapsed_ms
+            self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopped:
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Write-behind flush failed: {e}")
@@ -0,0 +1,197 @@
+"""
+XLSX Stream - Write a one-sheet .xlsx workbook as a stream of bytes, without temp files
+"""
+
+import math
+import re
+import zipfile
+
+# Cell styles, as indexes into the cellXfs of STYLES_XML
+PLAIN = 0
+HEADER = 1
+BORDERED = 2
+BORDERED_AMOUNT = 3
+BOLD = 4
+TITLE = 5
+AMOUNT = 6
+
+MAX_COLUMN_WIDTH = 50
+MAX_CELL_TEXT = 32767
+
+_XML_HEAD = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_PACKAGE_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+CONTENT_TYPES_XML = _XML_HEAD + (
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+ROOT_RELS_XML = _XML_HEAD + (
+    f'<Relationships xmlns="{_PACKAGE_REL_NS}">'
+    f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+WORKBOOK_RELS_XML = _XML_HEAD + (
+    f'<Relationships xmlns="{_PACKAGE_REL_NS}">'
+    f'<Relationship Id="rId1" Type="{_REL_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+    f'<Relationship Id="rId2" Type="{_REL_NS}/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Fonts: regular, white bold header, bold, bold title. Number format 4 is the built-in #,##0.00.
+STYLES_XML = _XML_HEAD + (
+    f'<styleSheet xmlns="{_MAIN_NS}">'
+    '<fonts count="4">'
+    '<font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="12"/><color rgb="FFFFFFFF"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="14"/><name val="Calibri"/></font>'
+    '</fonts>'
+    '<fills count="3">'
+    '<fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="FF4F46E5"/><bgColor rgb="FF4F46E5"/></patternFill></fill>'
+    '</fills>'
+    '<borders count="2">'
+    '<border><left/><right/><top/><bottom/><diagonal/></border>'
+    '<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border>'
+    '</borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="7">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="2" borderId="1" xfId="0" applyFont="1" applyFill="1" '
+    'applyBorder="1" applyAlignment="1"><alignment horizontal="center" vertical="center"/></xf>'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="1" xfId="0" applyBorder="1"/>'
+    '<xf numFmtId="4" fontId="0" fillId="0" borderId="1" xfId="0" applyNumberFormat="1" applyBorder="1"/>'
+    '<xf numFmtId="0" fontId="2" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '<xf numFmtId="0" fontId="3" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+# Characters XML 1.0 cannot carry at all, plus lone surrogates, which UTF-8 cannot encode
+_ILLEGAL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+
+class _Sink:
+    """Unseekable file object collecting what zipfile writes until the stream takes it"""
+    
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+
+def column_letter(index):
+    """Get the letter of a 1-based column index (1 -> A, 27 -> AA)"""
+    letters = ''
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(65 + rest) + letters
+    return letters
+
+
+def column_width(*lengths):
+    """Get a column width fitting the longest text, the way the old export sized columns"""
+    return min(max(lengths, default=0) + 2, MAX_COLUMN_WIDTH)
+
+
+def _escape(text):
+    if len(text) > MAX_CELL_TEXT:
+        text = text[:MAX_CELL_TEXT]
+    if not text.isprintable():
+        # Rare, so only pay for the regex when some control character is present
+        text = _ILLEGAL_XML.sub('', text)
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _cell_xml(ref, value, style):
+    styled = f' s="{style}"' if style else ''
+    kind = type(value)
+    if kind is not str:
+        if kind is bool:
+            return f'<c r="{ref}"{styled} t="b"><v>{int(value)}</v></c>'
+        if kind in (int, float) and math.isfinite(value):
+            return f'<c r="{ref}"{styled}><v>{value!r}</v></c>'
+        value = str(value)
+    return f'<c r="{ref}"{styled} t="inlineStr"><is><t xml:space="preserve">{_escape(value)}</t></is></c>'
+
+
+def _sheet_head(widths):
+    cols = ''.join(
+        f'<col min="{index}" max="{index}" width="{width}" customWidth="1"/>'
+        for index, width in enumerate(widths or [], 1) if width
+    )
+    return _XML_HEAD + f'<worksheet xmlns="{_MAIN_NS}">' + (f'<cols>{cols}</cols>' if cols else '') + '<sheetData>'
+
+
+def stream_xlsx(rows, sheet_name='Sheet1', widths=None, batch_rows=512, flush_bytes=64 * 1024):
+    """Yield the bytes of an .xlsx workbook holding rows, as they are written
+    
+    Each row is a list of cells; a cell is a value or a (value, style) pair and None leaves it
+    empty. Column widths go in front of the rows, so they must be known before the first row.
+    """
+    sink = _Sink()
+    letters = [column_letter(index) for index in range(1, 27)]
+    
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', CONTENT_TYPES_XML)
+        archive.writestr('_rels/.rels', ROOT_RELS_XML)
+        archive.writestr('xl/workbook.xml', _XML_HEAD + (
+            f'<workbook xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}"><sheets>'
+            f'<sheet name="{_escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/>'
+            '</sheets></workbook>'))
+        archive.writestr('xl/_rels/workbook.xml.rels', WORKBOOK_RELS_XML)
+        archive.writestr('xl/styles.xml', STYLES_XML)
+        
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(_sheet_head(widths).encode('utf-8'))
+            # Hand out the first bytes right away instead of after the first batch
+            yield sink.take()
+            
+            batch = []
+            for number, row in enumerate(rows, 1):
+                cells = []
+                for index, cell in enumerate(row):
+                    value, style = cell if isinstance(cell, tuple) else (cell, PLAIN)
+                    if value is not None:
+                        letter = letters[index] if index < 26 else column_letter(index + 1)
+                        cells.append(_cell_xml(f'{letter}{number}', value, style))
+                if cells:
+                    batch.append(f'<row r="{number}">{"".join(cells)}</row>')
+                
+                if len(batch) >= batch_rows:
+                    sheet.write(''.join(batch).encode('utf-8'))
+                    batch = []
+                    if sink.size >= flush_bytes:
+                        yield sink.take()
+            
+            sheet.write((''.join(batch) + '</sheetData></worksheet>').encode('utf-8'))
+    
+    yield sink.take()